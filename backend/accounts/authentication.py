@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+
+
+# caches of one process only: a token revoked in one worker would stay valid in the others.
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                          'django.core.cache.backends.dummy.DummyCache')
+
+
+def token_cache_key(key):
+    return f'auth-token:{key}'
+
+
+def token_cache():
+    """
+        the AUTH_TOKEN_CACHE cache, None if it is not shared between the workers (tokens are not cached then).
+    """
+    alias = getattr(settings, 'AUTH_TOKEN_CACHE', 'default')
+    if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS:
+        return None
+    return caches[alias]
+
+
+def forget_token(key):
+    cache = token_cache()
+    if cache is not None:
+        cache.delete(token_cache_key(key))
+
+
+def forget_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        forget_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+        **token authentication with a cache in front of the token lookup.**
+        the (user, token) pair is cached for AUTH_TOKEN_CACHE_TTL seconds, together with the user's business,
+        so authenticated requests neither query the token nor the business of the user.
+        cached entries are dropped whenever the token is deleted (logout) or the user/business changes,
+        see accounts.signals. the cache (AUTH_TOKEN_CACHE) has to be shared by all the workers, so such a
+        revocation reaches every one of them; with a process-local cache (locmem) tokens are not cached at all.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = token_cache()
+        cached = cache.get(token_cache_key(key)) if cache is not None else None
+        if cached is not None:
+            return cached
+
+        # the business is fetched in the same query, so request.user.business does not query again.
+        try:
+            token = Token.objects.select_related('user__business').get(key=key)
+        except Token.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+
+        if cache is not None:
+            cache.set(token_cache_key(key), (token.user, token), getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300))
+        return token.user, token
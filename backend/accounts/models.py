@@ -26,3 +26,17 @@ class Business(models.Model):
 
     def __str__(self) -> str:
         return self.label
+
+
+class ShardAssignment(models.Model):
+    """
+    **the database shard holding a business's forms and responses.** see config.sharding
+    business: [one-to-one, pk] the business.
+    database: the database alias of the shard.
+    """
+    business = models.OneToOneField(Business, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='shard_assignment')
+    database = models.CharField(max_length=64)
+
+    def __str__(self) -> str:
+        return f'{self.business_id} -> {self.database}'
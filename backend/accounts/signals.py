@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import forget_token, forget_user_tokens
+from .models import Business
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_changed_user_tokens(sender, instance, **kwargs):
+    forget_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def forget_business_user_tokens(sender, instance, **kwargs):
+    forget_user_tokens(instance.user_id)
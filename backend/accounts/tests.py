@@ -1,3 +1,54 @@
-from django.test import TestCase
+import tempfile
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from .authentication import token_cache_key
 
-# Create your tests here.
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        tokens = override_settings(CACHES={**settings.CACHES, 'tokens': {**settings.CACHES['tokens'],
+                                                                         'LOCATION': self.directory.name}})
+        tokens.enable()
+        self.addCleanup(tokens.disable)
+
+        self.client = APIClient()
+        response = self.client.post('/accounts/register/', {
+            'user': {'username': 'acme', 'password': 'secret-pass-1', 'email': 'acme@x.com'}, 'label': 'acme'},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.token = self.client.post('/accounts/login/', {'username': 'acme', 'password': 'secret-pass-1'},
+                                      format='json').data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def dashboard_status(self):
+        return self.client.get('/form_builder/dashboard/').status_code
+
+    def test_tokens_are_cached_in_the_shared_tokens_cache(self):
+        self.assertEqual(settings.AUTH_TOKEN_CACHE, 'tokens')
+        self.assertEqual(self.dashboard_status(), 200)
+        user, token = caches['tokens'].get(token_cache_key(self.token))
+        self.assertEqual((user.username, token.key), ('acme', self.token))
+        # the user's business came with the token.
+        with self.assertNumQueries(0):
+            self.assertEqual(user.business.label, 'acme')
+
+    @override_settings(AUTH_TOKEN_CACHE='default')
+    def test_tokens_are_not_cached_in_process_local_caches(self):
+        self.assertEqual(self.dashboard_status(), 200)
+        self.assertIsNone(caches['default'].get(token_cache_key(self.token)))
+
+    def test_logout_revokes_the_token_for_every_worker(self):
+        self.assertEqual(self.dashboard_status(), 200)
+        # the cache as another worker sees it.
+        other_worker = FileBasedCache(self.directory.name, {})
+        self.assertIsNotNone(other_worker.get(token_cache_key(self.token)))
+
+        self.assertEqual(self.client.post('/accounts/logout/').status_code, 200)
+        self.assertIsNone(other_worker.get(token_cache_key(self.token)))
+        self.assertEqual(self.dashboard_status(), 401)
@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests under /form_builder/live/ are served by the live response feed (server-sent events, see
+form_builder.live), everything else by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once django is set up.
+from form_builder.live import PATH_PREFIX, response_feed
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(PATH_PREFIX):
+        return await response_feed(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,121 @@
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+# the end of an iterator in in_view_context.
+_END = object()
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in connections.databases
+
+
+class PrimaryReplicaRouter:
+    """
+        **sends reads of replica-enabled views to the replica database, everything else to the primary.**
+        reads only go to the replica while a view decorated with `reads_from_replica` is running,
+        so the rest of the project keeps reading its own writes from the primary (default) database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and replica_configured():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data, so objects are always allowed to relate.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+def _client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'replica-pin:user:{user.pk}'
+    return f"replica-pin:addr:{request.META.get('REMOTE_ADDR')}"
+
+
+def reads_from_replica(view_method):
+    """
+        view method decorator; the method's queries are read from the replica database,
+        unless the client has written something recently (read-your-writes stickiness).
+    """
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        # read-only POSTs (like exports) must not pin the client to the primary.
+        getattr(request, '_request', request).reads_from_replica = True
+        if cache.get(_client_key(request)):
+            return view_method(view, request, *args, **kwargs)
+
+        token = _read_from_replica.set(True)
+        try:
+            return view_method(view, request, *args, **kwargs)
+        finally:
+            _read_from_replica.reset(token)
+
+    return wrapper
+
+
+def in_view_context(iterable, request=None):
+    """
+        the body of a streamed response is iterated after the view returned, when its replica reads and shard
+        (context variables) are reset. wrapping the body with this in the view iterates it in the view's context.
+        under asgi (request is an ASGIRequest) the body is an async iterator, since django reads a sync one into a
+        list before sending it: each item is made by sync_to_async in the request's thread, which holds its database
+        connection. under wsgi it is a plain iterator.
+    """
+    # captured now; a generator would only copy the context when it is first iterated.
+    context = copy_context()
+    iterator = iter(iterable)
+
+    def step():
+        return context.run(next, iterator, _END)
+
+    def iterate():
+        while True:
+            item = step()
+            if item is _END:
+                return
+            yield item
+
+    async def aiterate():
+        next_item = sync_to_async(step)
+        while True:
+            item = await next_item()
+            if item is _END:
+                return
+            yield item
+
+    return aiterate() if isinstance(getattr(request, '_request', request), ASGIRequest) else iterate()
+
+
+class ReplicaPinningMiddleware:
+    """
+        after a successful write (non-safe method) the client is pinned to the primary database
+        for REPLICA_PIN_SECONDS, so it does not read stale data before the replica has caught up.
+        the pin is kept in the default cache, which has to be shared between workers in production.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        is_write = request.method not in self.safe_methods and not getattr(request, 'reads_from_replica', False)
+        if is_write and response.status_code < 400 and replica_configured():
+            cache.set(_client_key(request), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+        return response
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from config.sqlite3 import options as sqlite3_options
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,12 +55,15 @@ INSTALLED_APPS = INITIAL_APPS + THIRD_PARTIES + LOCAL_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'form_builder.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'form_builder.middleware.SlowRequestProfilerMiddleware',
+    'config.routers.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -85,13 +90,49 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# high concurrency sqlite mode (WAL, tuned pragmas, BEGIN IMMEDIATE transactions), see config.sqlite3
+SQLITE_HIGH_CONCURRENCY = os.environ.get('SQLITE_HIGH_CONCURRENCY') == '1'
+
+# overrides of config.sqlite3.DEFAULT_PRAGMAS
+SQLITE_PRAGMAS = {}
+SQLITE_OPTIONS = sqlite3_options(SQLITE_PRAGMAS) if SQLITE_HIGH_CONCURRENCY else {}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        # a file, so tests of concurrent requests can use several connections (threads) at once.
+        'TEST': {'NAME': BASE_DIR / 'test-db.sqlite3'},
     }
 }
 
+# read replica, used by the views decorated with config.routers.reads_from_replica.
+# locally it can be any copy of the default database, e.g. DATABASE_REPLICA_NAME=db-replica.sqlite3
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ['DATABASE_REPLICA_NAME'],
+        'OPTIONS': SQLITE_OPTIONS,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# business level sharding of the form_builder tables, see config.sharding.
+# extra shards are configured with DATABASE_SHARD_NAMES, e.g. DATABASE_SHARD_NAMES=shard-1.sqlite3,shard-2.sqlite3
+DATABASE_SHARDS = ['default']
+for number, name in enumerate(filter(None, os.environ.get('DATABASE_SHARD_NAMES', '').split(',')), start=1):
+    DATABASES[f'shard_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / name,
+        'OPTIONS': SQLITE_OPTIONS,
+    }
+    DATABASE_SHARDS.append(f'shard_{number}')
+
+DATABASE_ROUTERS = ['config.sharding.BusinessShardRouter', 'config.routers.PrimaryReplicaRouter']
+
+# seconds a client keeps reading from the primary database after a write
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -115,7 +156,7 @@ AUTH_PASSWORD_VALIDATORS = [
 # rest framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
 
@@ -124,6 +165,54 @@ REST_FRAMEWORK = {
     ]
 }
 
+# seconds an authenticated token (with its user and business) is kept in the AUTH_TOKEN_CACHE cache.
+# revoked tokens are removed from it, so it has to be shared by all the workers: the tokens cache (files) is shared
+# by the workers of one host, several hosts need a redis or memcached cache. tokens are not cached in process-local
+# (locmem) caches, see accounts.authentication
+AUTH_TOKEN_CACHE = 'tokens'
+AUTH_TOKEN_CACHE_TTL = 300
+
+# token bucket limits of response submissions, see form_builder.throttling.
+# 'form' is shared by all respondents of a form (Form.submission_burst/submission_refill_rate override it),
+# 'client' applies to each respondent of a form separately. refill_rate is in tokens per second.
+FORM_SUBMISSION_THROTTLE = {
+    'form': {'burst': 60, 'refill_rate': 5.0},
+    'client': {'burst': 10, 'refill_rate': 0.2},
+}
+
+# seconds the result of a submission sent with an Idempotency-Key header is kept for retries
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# autosaved response drafts expire this many seconds after their last save; saves within the write interval only
+# update the cache, see form_builder.drafts
+RESPONSE_DRAFT_TTL = 7 * 24 * 60 * 60
+RESPONSE_DRAFT_WRITE_INTERVAL = 10
+
+# seconds a ticket for the live response feed can be used to connect, see form_builder.live
+LIVE_FEED_TICKET_MAX_AGE = 60
+# seconds between the database polls of a live feed connection, which pick up responses submitted by other processes
+LIVE_FEED_POLL_SECONDS = 2
+
+# seconds the dashboard of a business is cached, see form_builder.dashboard
+DASHBOARD_CACHE_TTL = 60
+
+# long answers of at least this many bytes are stored zlib compressed, see form_builder.fields;
+# existing rows are compressed with `manage.py compress_long_answers`
+TEXT_COMPRESSION = True
+TEXT_COMPRESSION_THRESHOLD = 512
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # the AUTH_TOKEN_CACHE, in files shared by the workers of this host; its directory can be set with
+    # AUTH_TOKEN_CACHE_DIR.
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('AUTH_TOKEN_CACHE_DIR', BASE_DIR / 'cache' / 'tokens'),
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -146,6 +235,29 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# exports are written to memory up to this many bytes and to a temporary file beyond that
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+
+# worker processes of `manage.py export_responses` (parallel csv/jsonl exports), defaults to the number of cores
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 0)) or None
+
+# archived (cold) responses, see form_builder.archive and `manage.py archive_responses`
+RESPONSE_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+# columnar response matrices of the cross tabulations, see form_builder.matrix
+RESPONSE_MATRIX_DIR = BASE_DIR / 'matrix'
+
+# deleted forms are purged in batches of this many rows, in a background thread after the deletion unless disabled
+# (then only by `manage.py purge_deleted_forms`), see form_builder.purge
+FORM_PURGE_BATCH_SIZE = 1000
+FORM_PURGE_IN_BACKGROUND = True
+
+# slow request profiling (staff users and form owners only), see form_builder.middleware
+REQUEST_PROFILING = False
+REQUEST_PROFILING_THRESHOLD_MS = 500
+REQUEST_PROFILING_DIR = BASE_DIR / 'profiles'
+REQUEST_PROFILING_MAX_FILES = 50
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
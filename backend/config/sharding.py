@@ -0,0 +1,128 @@
+"""
+    **business level sharding.**
+    the form_builder tables of a business (forms, questions, choices, responses and answers) live on one of the
+    DATABASE_SHARDS aliases, while accounts, auth and everything else stay on the default database.
+    a business is assigned to a shard once (stable hash of its label), the assignment is stored in
+    accounts.ShardAssignment and only changes through `manage.py move_business`.
+    while a shard is active (`use_shard`), BusinessShardRouter sends the form_builder queries to it.
+"""
+
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+SHARDED_APPS = ('form_builder',)
+
+_current_shard = ContextVar('current_shard', default=None)
+
+
+def shard_aliases():
+    return getattr(settings, 'DATABASE_SHARDS', [DEFAULT_DB_ALIAS])
+
+
+def sharding_enabled():
+    return len(shard_aliases()) > 1
+
+
+def current_shard():
+    return _current_shard.get()
+
+
+@contextmanager
+def use_shard(alias):
+    """
+        routes the form_builder queries to the given shard alias; None keeps the default routing.
+    """
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def each_shard():
+    """
+        yields every shard alias while that shard is active, for commands that work on all forms.
+    """
+    for alias in shard_aliases():
+        with use_shard(alias):
+            yield alias
+
+
+def business_shard_cache_key(business_pk):
+    return f'business-shard:{business_pk}'
+
+
+def shard_for_business(business_pk):
+    if not sharding_enabled():
+        return None
+
+    key = business_shard_cache_key(business_pk)
+    alias = cache.get(key)
+    if alias is None:
+        from accounts.models import ShardAssignment
+
+        aliases = shard_aliases()
+        assignment, _ = ShardAssignment.objects.get_or_create(
+            business_id=business_pk,
+            defaults={'database': aliases[zlib.crc32(str(business_pk).encode()) % len(aliases)]})
+        alias = assignment.database
+        cache.set(key, alias, None)
+    return alias
+
+
+def form_shard_cache_key(slug):
+    return f'form-shard:{slug}'
+
+
+def shard_for_form(slug):
+    """
+        the shard holding the form with this slug; public endpoints only know the slug, so the shards are
+        asked one after the other and the answer is cached. None if no shard has such a form.
+    """
+    if not sharding_enabled():
+        return None
+
+    key = form_shard_cache_key(slug)
+    alias = cache.get(key)
+    if alias is None:
+        from form_builder.models import Form
+
+        alias = next((alias for alias in shard_aliases()
+                      if Form.objects.using(alias).filter(slug__exact=slug).exists()), None)
+        if alias is None:
+            return None
+        cache.set(key, alias, 24 * 60 * 60)
+    return alias
+
+
+class BusinessShardRouter:
+    """
+        routes the form_builder models to the active shard (or the shard their instance was loaded from).
+        returns None for everything else, so the next router decides.
+    """
+
+    @staticmethod
+    def _db(model, **hints):
+        if model._meta.app_label not in SHARDED_APPS or not sharding_enabled():
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._meta.app_label in SHARDED_APPS and instance._state.db:
+            return instance._state.db
+        return current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # a form on a shard still belongs to a business on the default database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,34 @@
+"""
+    **high concurrency sqlite mode.**
+    django's sqlite backend is configured (see `options`) to tune every new connection with the pragmas of
+    SQLITE_PRAGMAS (WAL journaling, relaxed syncs, bigger cache, memory mapping and a busy timeout), so readers do
+    not block writers and concurrent writers wait for the lock instead of failing with "database is locked", and to
+    start transactions with BEGIN IMMEDIATE: a deferred transaction that reads first and writes later can not wait
+    for the lock and fails at once if another writer got it meanwhile.
+"""
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'cache_size': -20000,  # negative values are KiB, so ~20MB
+    'mmap_size': 134217728,  # 128MB
+    'wal_autocheckpoint': 1000,  # pages
+}
+
+
+def sqlite_pragmas(overrides=None):
+    if overrides is None:
+        from django.conf import settings
+        overrides = getattr(settings, 'SQLITE_PRAGMAS', {})
+    return {**DEFAULT_PRAGMAS, **overrides}
+
+
+def options(overrides=None):
+    """
+        the OPTIONS of a sqlite database in high concurrency mode; imported by the settings, so overrides are given.
+    """
+    return {
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join(f'PRAGMA {pragma} = {value}' for pragma, value in sqlite_pragmas(overrides).items()),
+    }
@@ -1,14 +1,152 @@
+"""
+    **admin of the form builder tables.**
+    the changelists are built for large tables: the foreign keys shown are loaded with list_select_related (one
+    query per page instead of one per row), change forms use raw id inputs instead of <select>s holding every
+    response and question, the count of the pagination is estimated (see EstimatedCountPaginator) and the full
+    count of filtered changelists is not shown. list filters are only offered on small tables; responses and answers
+    are narrowed down through their indexed foreign keys in the url, e.g. ?related_form=<form id> or
+    ?related_question=<question id>.
+"""
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+from . import purge, versions
 from .models import *
 
-admin.site.register(Form)
-admin.site.register(Question)
-admin.site.register(Response)
-admin.site.register(LongAnswer)
-admin.site.register(ShortAnswer)
-admin.site.register(MultipleChoiceAnswer)
-admin.site.register(Choices)
-admin.site.register(EmailFieldAnswer)
-admin.site.register(PhoneNumberFieldAnswer)
-admin.site.register(NumberFieldAnswer)
-admin.site.register(FileFieldAnswer)
+
+class EstimatedCountPaginator(Paginator):
+    """
+        counts filtered changelists up to `exact_limit` rows (larger results are shown as exact_limit rows).
+        unfiltered changelists use the planner's estimate on postgresql and the largest id elsewhere, which are
+        only counted exactly when they are below exact_limit.
+    """
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return queryset[:self.exact_limit].count()
+
+        estimate = self.estimate(queryset)
+        if estimate < self.exact_limit:
+            return queryset.count()
+        return estimate
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # -1 (or 0) until the table was analyzed.
+            if row is not None and row[0] > 0:
+                return int(row[0])
+        # an index lookup; ids are not reused, so it is an upper bound of the rows.
+        return queryset.aggregate(last=Max('id'))['last'] or 0
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
+
+
+@admin.register(Form)
+class FormAdmin(LargeTableAdmin):
+    list_display = ('id', 'slug', 'title', 'business_id', 'form_template', 'is_closed', 'is_deleted', 'created_date')
+    list_filter = ('form_template', 'is_closed', 'is_deleted')
+    search_fields = ('^slug',)
+    # the business lives on the default database, the form possibly on another shard.
+    raw_id_fields = ('business',)
+    readonly_fields = ('slug', 'created_date', 'updated_date', 'deleted_date')
+
+    def get_queryset(self, request):
+        # deleted forms too, until they are purged.
+        return Form.all_objects.order_by(*self.get_ordering(request))
+
+    def get_deleted_objects(self, objs, request):
+        # the collector would load every response and answer of the forms, they are purged in the background.
+        return [str(form) for form in objs], {Form._meta.verbose_name_plural: len(objs)}, set(), []
+
+    def delete_model(self, request, obj):
+        purge.mark_deleted(obj)
+
+    def delete_queryset(self, request, queryset):
+        for form in queryset.filter(is_deleted=False):
+            purge.mark_deleted(form)
+
+
+class SchemaAdmin(LargeTableAdmin):
+    """
+        changing a question or choice moves its form to a new version, see form_builder.versions
+        form_lookup: the lookup of the form id from the model, e.g. 'related_question__form_id'.
+    """
+    form_lookup = None
+
+    def form_id_of(self, obj):
+        value = obj
+        for name in self.form_lookup.split('__'):
+            value = getattr(value, name)
+        return value
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        versions.bump(self.form_id_of(obj))
+
+    def delete_model(self, request, obj):
+        form_id = self.form_id_of(obj)
+        super().delete_model(request, obj)
+        versions.bump(form_id)
+
+    def delete_queryset(self, request, queryset):
+        form_ids = set(queryset.values_list(self.form_lookup, flat=True))
+        super().delete_queryset(request, queryset)
+        for form_id in form_ids:
+            versions.bump(form_id)
+
+
+@admin.register(Question)
+class QuestionAdmin(SchemaAdmin):
+    list_display = ('id', 'question_body', 'answer_type', 'is_required', 'points', 'form')
+    list_select_related = ('form',)
+    list_filter = ('answer_type', 'is_required')
+    raw_id_fields = ('form',)
+    form_lookup = 'form_id'
+
+
+@admin.register(Choices)
+class ChoicesAdmin(SchemaAdmin):
+    list_display = ('id', 'title', 'is_correct', 'related_question')
+    list_select_related = ('related_question',)
+    raw_id_fields = ('related_question',)
+    form_lookup = 'related_question__form_id'
+
+
+@admin.register(Response)
+class ResponseAdmin(LargeTableAdmin):
+    list_display = ('id', 'related_form', 'owner_email', 'sent_date', 'is_duplicate', 'score')
+    list_select_related = ('related_form',)
+    raw_id_fields = ('related_form',)
+    readonly_fields = ('sent_date', 'content_hash', 'answers_snapshot')
+
+
+class AnswerAdmin(LargeTableAdmin):
+    list_display = ('id', 'related_response_id', 'related_question', 'answer_field')
+    list_select_related = ('related_question',)
+    raw_id_fields = ('related_question', 'related_response')
+
+
+@admin.register(MultipleChoiceAnswer)
+class MultipleChoiceAnswerAdmin(AnswerAdmin):
+    list_select_related = ('related_question', 'answer_field')
+    raw_id_fields = ('related_question', 'related_response', 'answer_field')
+
+
+for answer_model in (LongAnswer, ShortAnswer, EmailFieldAnswer, PhoneNumberFieldAnswer, NumberFieldAnswer,
+                     FileFieldAnswer):
+    admin.site.register(answer_model, AnswerAdmin)
@@ -0,0 +1,145 @@
+"""
+    **cold response archive.**
+    archived responses of a form live in gzip compressed jsonl segment files under
+    RESPONSE_ARCHIVE_DIR/<database>/<form id>/, next to an index.json listing the segments in response id order:
+        {"segments": [{"name": ..., "first_id": ..., "last_id": ..., "count": ..., "last_sent_date": ...}, ...]}
+    each line of a segment is a response: {"id", "related_form_id", "owner_email", "sent_date", "is_duplicate",
+    "all_answers"} (segments written before is_duplicate was archived do not have it, it is read as false).
+    sent_date is written as an iso date and read back as a datetime. last_sent_date is the latest sent_date of a
+    segment (segments indexed before it was recorded do not have it and are read for it).
+    segments are written by `manage.py archive_responses`; listings and exports read them with `archived_responses`.
+"""
+
+import gzip, json, os
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.utils.dateparse import parse_datetime
+
+
+def archive_dir():
+    return getattr(settings, 'RESPONSE_ARCHIVE_DIR', settings.BASE_DIR / 'archive')
+
+
+def form_archive_dir(form):
+    # form ids are only unique per database (shard), so the database is part of the path.
+    return os.path.join(archive_dir(), router.db_for_write(type(form), instance=form), str(form.id))
+
+
+def segment_name(first_id, last_id):
+    return f'segment-{first_id:012d}-{last_id:012d}.jsonl.gz'
+
+
+def read_index(form):
+    try:
+        with open(os.path.join(form_archive_dir(form), 'index.json')) as index_file:
+            return json.load(index_file)
+    except FileNotFoundError:
+        return {'segments': []}
+
+
+def _replace_file(path, write, mode='w'):
+    """
+        writes a file through a temporary file, so readers never see a half written file.
+    """
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, mode) as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def _last_sent_date(records):
+    return max((record['sent_date'] for record in records if record.get('sent_date')), default=None)
+
+
+def segment_entry(records):
+    """
+        the index entry of the segment of the records (ordered by id).
+    """
+    last_sent_date = _last_sent_date(records)
+    return {'name': segment_name(records[0]['id'], records[-1]['id']),
+            'first_id': records[0]['id'], 'last_id': records[-1]['id'], 'count': len(records),
+            'last_sent_date': last_sent_date and DjangoJSONEncoder().default(last_sent_date)}
+
+
+def write_segment(form, records):
+    """
+        writes the records (ordered by id) into a new segment file and returns its index entry.
+        the segment is not visible to readers until it is added to the index with `add_to_index`.
+    """
+    os.makedirs(form_archive_dir(form), exist_ok=True)
+    entry = segment_entry(records)
+
+    def write(file):
+        with gzip.GzipFile(fileobj=file, mode='wb') as compressed:
+            for record in records:
+                compressed.write(json.dumps(record, cls=DjangoJSONEncoder).encode() + b'\n')
+
+    _replace_file(os.path.join(form_archive_dir(form), entry['name']), write, mode='wb')
+    return entry
+
+
+def read_segment(form, name):
+    with gzip.open(os.path.join(form_archive_dir(form), name), 'rt') as segment:
+        for line in segment:
+            record = json.loads(line)
+            # a datetime again, like the sent_date of live responses (older segments have str() formatted dates).
+            record['sent_date'] = parse_datetime(record['sent_date']) if record.get('sent_date') else None
+            yield record
+
+
+def add_to_index(form, entry):
+    index = read_index(form)
+    index['segments'] = sorted([segment for segment in index['segments'] if segment['name'] != entry['name']]
+                               + [entry], key=lambda segment: segment['first_id'])
+    _replace_file(os.path.join(form_archive_dir(form), 'index.json'), lambda file: json.dump(index, file))
+
+
+def unindexed_segments(form):
+    """
+        segment files that are not in the index, left behind by an interrupted archive run.
+    """
+    try:
+        names = os.listdir(form_archive_dir(form))
+    except FileNotFoundError:
+        return []
+    indexed = {segment['name'] for segment in read_index(form)['segments']}
+    return sorted(name for name in names if name.endswith('.jsonl.gz') and name not in indexed)
+
+
+def archived_count(form):
+    return sum(segment['count'] for segment in read_index(form)['segments'])
+
+
+def archived_stats(form):
+    """
+        (count, last sent_date) of the archived responses of a form, from its index.
+    """
+    count, last_sent_date = 0, None
+    for segment in read_index(form)['segments']:
+        count += segment['count']
+        if 'last_sent_date' in segment:
+            sent_date = segment['last_sent_date'] and parse_datetime(segment['last_sent_date'])
+        else:
+            sent_date = _last_sent_date(read_segment(form, segment['name']))
+        if sent_date and (last_sent_date is None or sent_date > last_sent_date):
+            last_sent_date = sent_date
+    return count, last_sent_date
+
+
+def archived_responses(form, offset=0):
+    """
+        yields the archived responses of a form, ordered by id, skipping the first `offset` responses.
+        whole segments before the offset are skipped without being read.
+    """
+    for segment in read_index(form)['segments']:
+        if offset >= segment['count']:
+            offset -= segment['count']
+            continue
+        records = read_segment(form, segment['name'])
+        for _ in range(offset):
+            next(records)
+        offset = 0
+        yield from ({'is_duplicate': False, **record} for record in records)
@@ -0,0 +1,66 @@
+"""
+    **change tokens of a form's responses, for conditional requests.**
+    the response listing and the export send an ETag and a Last-Modified header computed from the form's
+    schema_version and one aggregate over its responses (last id, count and last sent date, answered from the
+    related_form index) plus the archived count. responses edited after their submission (answers changed in the
+    admin, refreshing their snapshots, or their owner_email) keep their ids and count, so they move the form's
+    responses_version instead. a client sending the ETag back in If-None-Match gets a 304 while nothing changed,
+    without the responses and answers being loaded.
+    Last-Modified (the form's last update or newest response) is only informational: deleting or archiving
+    responses does not move it, so If-Modified-Since alone is never answered with a 304.
+"""
+
+import hashlib
+from django.db.models import Count, F, Max
+from django.db.models.signals import post_save
+from django.utils.http import http_date, parse_etags
+from rest_framework.response import Response as API_Response
+from config.sharding import use_shard
+from .archive import archived_count
+from .models import Form, Response
+
+
+def responses_edited(form_ids):
+    """
+        moves the change tokens of the forms whose responses were edited.
+    """
+    Form.all_objects.filter(id__in=list(form_ids)).update(responses_version=F('responses_version') + 1)
+
+
+class ChangeToken:
+    def __init__(self, form, *variant):
+        """
+            variant: whatever else the result depends on, e.g. the query params.
+        """
+        stats = Response.objects.filter(related_form_id=form.id).aggregate(
+            last_id=Max('id'), count=Count('id'), last_sent=Max('sent_date'))
+        state = (form.id, form.schema_version, form.responses_version, stats['last_id'], stats['count'],
+                 archived_count(form), *variant)
+        self.etag = f'W/"{hashlib.sha1(repr(state).encode()).hexdigest()}"'
+        self.last_modified = int(max(filter(None, (form.updated_date, stats['last_sent']))).timestamp())
+
+    def matches(self, request):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if not if_none_match:
+            return False
+        # weak comparison, as required for If-None-Match.
+        etags = {etag[2:] if etag.startswith('W/') else etag for etag in parse_etags(if_none_match)}
+        return '*' in etags or self.etag[2:] in etags
+
+    def set_headers(self, response):
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.last_modified)
+        return response
+
+    def not_modified(self):
+        return self.set_headers(API_Response(status=304))
+
+
+def response_saved(sender, instance, created, using, **kwargs):
+    # submissions are told apart by the last id and count already.
+    if not created:
+        with use_shard(using):
+            responses_edited([instance.related_form_id])
+
+
+post_save.connect(response_saved, sender=Response, dispatch_uid='change-token-response-save')
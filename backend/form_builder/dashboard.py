@@ -0,0 +1,73 @@
+"""
+    **dashboard of a business: the stats of all its forms at once.**
+    one grouped query counts the live responses and finds the last one of every form; the archived responses are
+    added to the counts and last response dates from the archive indexes. the payload is cached under
+    `dashboard:<business>` for DASHBOARD_CACHE_TTL seconds and dropped when a form of the business is saved or deleted
+    or a response is submitted, once the change is committed. archiving does not change the totals or last dates, so
+    it does not drop the cache.
+"""
+
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+from rest_framework.fields import DateTimeField
+from .archive import archived_stats
+from .models import Form, Response
+
+_datetime = DateTimeField()
+
+
+def cache_key(business_pk):
+    return f'dashboard:{business_pk}'
+
+
+def invalidate(business_pk):
+    cache.delete(cache_key(business_pk))
+
+
+def invalidate_on_commit(using, business_pk):
+    transaction.on_commit(partial(invalidate, business_pk), using=using)
+
+
+def build(business):
+    forms = []
+    totals = {'forms': 0, 'open_forms': 0, 'responses': 0}
+    rows = Form.objects.filter(business=business).order_by('id').values(
+        'id', 'slug', 'title', 'is_closed', 'created_date').annotate(
+        live_responses=Count('responses'), last_response_date=Max('responses__sent_date'))
+    for row in rows:
+        archived, archived_last_date = archived_stats(Form(id=row['id'], business=business))
+        responses = row.pop('live_responses') + archived
+        # every response is archived after a while, so the last one can be in the archive.
+        last_date = max(filter(None, (row.pop('last_response_date'), archived_last_date)), default=None)
+        forms.append({**row, 'responses': responses,
+                      'created_date': _datetime.to_representation(row['created_date']),
+                      'last_response_date': last_date and _datetime.to_representation(last_date)})
+        totals['forms'] += 1
+        totals['open_forms'] += not row['is_closed']
+        totals['responses'] += responses
+    return {'totals': totals, 'forms': forms}
+
+
+def dashboard_of(business):
+    payload = cache.get(cache_key(business.pk))
+    if payload is None:
+        payload = build(business)
+        cache.set(cache_key(business.pk), payload, getattr(settings, 'DASHBOARD_CACHE_TTL', 60))
+    return payload
+
+
+def form_changed(sender, instance, **kwargs):
+    invalidate_on_commit(router.db_for_write(sender, instance=instance), instance.business_id)
+
+
+def response_changed(sender, instance, **kwargs):
+    invalidate_on_commit(router.db_for_write(sender, instance=instance), instance.related_form.business_id)
+
+
+post_save.connect(form_changed, sender=Form, dispatch_uid='dashboard-form-save')
+post_delete.connect(form_changed, sender=Form, dispatch_uid='dashboard-form-delete')
+post_save.connect(response_changed, sender=Response, dispatch_uid='dashboard-response-save')
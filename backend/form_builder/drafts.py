@@ -0,0 +1,147 @@
+"""
+    **autosaved drafts of responses.**
+    the respondent's client generates a token (e.g. a random uuid kept in local storage) and saves the partial
+    answers under it as often as it likes. a draft is one ResponseDraft row with the answers as a json blob.
+    saves are coalesced: every save goes to the cache, the row is only written when its last write is more than
+    RESPONSE_DRAFT_WRITE_INTERVAL seconds ago, so a respondent typing away costs about one UPDATE per interval.
+    reads take the cached draft first and see the latest save; a save that is only in the cache is lost if the
+    cache drops it, i.e. at most an interval of typing.
+    drafts expire RESPONSE_DRAFT_TTL seconds after their last save; expired rows are removed in small batches while
+    drafts are created and by `manage.py purge_expired_drafts`.
+    submitting a draft sends its answers (without the blank ones) through ResponseSerializer, which inserts them in
+    one batch per answer table, and deletes the draft in the same transaction.
+"""
+
+import json, random, re
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, router
+from django.db.transaction import atomic
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+from . import versions
+from .models import Form, Response, ResponseDraft
+from .serializers import ResponseSerializer
+
+# the token is all a respondent needs to read the draft, so it has to be hard to guess.
+TOKEN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+MAX_ANSWERS_SIZE = 64 * 1024
+PURGE_PROBABILITY = 0.05
+PURGE_BATCH_SIZE = 500
+
+
+def ttl():
+    return getattr(settings, 'RESPONSE_DRAFT_TTL', 7 * 24 * 60 * 60)
+
+
+def write_interval():
+    return getattr(settings, 'RESPONSE_DRAFT_WRITE_INTERVAL', 10)
+
+
+def cache_key(form, token):
+    return f'draft:{router.db_for_write(Form, instance=form)}:{form.id}:{token}'
+
+
+def expired(now=None):
+    return ResponseDraft.objects.filter(updated_date__lt=(now or timezone.now()) - timedelta(seconds=ttl()))
+
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE):
+    """
+        deletes up to batch_size expired drafts, returns how many were deleted.
+    """
+    ids = list(expired().values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return 0
+    return ResponseDraft.objects.filter(id__in=ids).delete()[0]
+
+
+def _write(form, token, draft):
+    """
+        upserts the draft's row: an UPDATE, and an INSERT only for a new draft.
+    """
+    fields = {'answers': draft['answers'], 'owner_email': draft['owner_email'],
+              'form_version': draft['form_version'], 'updated_date': draft['updated_date']}
+    drafts = ResponseDraft.objects.filter(form_id=form.id, token=token)
+    if drafts.update(**fields):
+        return
+    try:
+        with atomic(using=router.db_for_write(ResponseDraft)):
+            ResponseDraft.objects.create(form_id=form.id, token=token, **fields)
+    except IntegrityError:
+        # created by a concurrent save meanwhile.
+        drafts.update(**fields)
+    if random.random() < PURGE_PROBABILITY:
+        purge_expired()
+
+
+def load(form, token):
+    """
+        the draft {answers, owner_email, form_version, updated_date}, None if there is none (or it expired).
+    """
+    entry = cache.get(cache_key(form, token))
+    if entry is not None:
+        return entry['draft']
+
+    draft = ResponseDraft.objects.filter(
+        form_id=form.id, token=token, updated_date__gte=timezone.now() - timedelta(seconds=ttl())).values(
+        'answers', 'owner_email', 'form_version', 'updated_date').first()
+    if draft is not None:
+        cache.set(cache_key(form, token), {'draft': draft, 'written_at': draft['updated_date']}, ttl())
+    return draft
+
+
+def save(form, token, answers, owner_email=None):
+    """
+        saves the draft, coalescing database writes; returns the draft and whether its row was written.
+    """
+    if len(json.dumps(answers)) > MAX_ANSWERS_SIZE:
+        raise ValidationError({'all_answers': f'a draft can hold at most {MAX_ANSWERS_SIZE} bytes of answers.'})
+
+    now = timezone.now()
+    key = cache_key(form, token)
+    entry = cache.get(key)
+    draft = {'answers': answers, 'owner_email': owner_email, 'form_version': form.schema_version,
+             'updated_date': now}
+    if entry is not None and (now - entry['written_at']).total_seconds() < write_interval():
+        cache.set(key, {'draft': draft, 'written_at': entry['written_at']}, ttl())
+        return draft, False
+
+    _write(form, token, draft)
+    cache.set(key, {'draft': draft, 'written_at': now}, ttl())
+    return draft, True
+
+
+def discard(form, token):
+    ResponseDraft.objects.filter(form_id=form.id, token=token).delete()
+    cache.delete(cache_key(form, token))
+
+
+def submit(form, token, answers=(), owner_email=None):
+    """
+        submits the draft as a response and deletes it, in one transaction.
+        answers: answers sent with the submission, replacing the draft's answers to the same questions.
+        returns the created response, raises ValidationError if there is no such draft or it is not a valid response.
+    """
+    draft = load(form, token)
+    if draft is None:
+        raise ValidationError({'token': 'there is no draft with this token.'})
+
+    submitted = {int(answer['related_question']): answer for answer in answers}
+    # answers to questions removed from the form since the draft was saved are dropped, and so are the blank answers
+    # of fields the respondent cleared, which a response does not take: the question is unanswered.
+    question_ids = {question['id'] for question in versions.questions(form)} - set(submitted)
+    all_answers = [answer for answer in draft['answers']
+                   if int(answer['related_question']) in question_ids and answer['answer_field'] != '']
+    data = {'related_form': form.pk, 'all_answers': all_answers + list(submitted.values())}
+    if (owner_email or draft['owner_email']) is not None:
+        data['owner_email'] = owner_email or draft['owner_email']
+
+    with atomic(using=router.db_for_write(Response)):
+        serializer = ResponseSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        response = serializer.save()
+        ResponseDraft.objects.filter(form_id=form.id, token=token).delete()
+    cache.delete(cache_key(form, token))
+    return response
@@ -0,0 +1,53 @@
+"""
+    **near-duplicate submissions.**
+    every response stores a hash of its normalized answers (Response.content_hash). answers are normalized by
+    trimming, collapsing whitespace and case folding, and sorted by question, so the same payload sent with
+    different spacing, casing or answer order has the same hash; owner_email is not part of it.
+    at submission a single lookup on the (related_form, content_hash, sent_date) index finds an earlier response
+    with the same hash within the form's duplicate_window, and the form's duplicate_policy decides what happens.
+"""
+
+import hashlib, json, re
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+from .models import Form, Response
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(value):
+    if value is None:
+        return ''
+    name = getattr(value, 'name', None)
+    if name is not None:
+        # uploaded files are compared by name and size.
+        return f'{name}:{getattr(value, "size", "")}'
+    return WHITESPACE.sub(' ', str(value)).strip().casefold()
+
+
+def content_hash(answers):
+    """
+        answers: the validated all_answers of a ResponseSerializer.
+    """
+    normalized = sorted([int(answer['related_question']),
+                         normalize(answer.get('answer_field', answer.get('answer_file')))] for answer in answers)
+    return hashlib.sha256(json.dumps(normalized, separators=(',', ':')).encode()).hexdigest()
+
+
+def is_duplicate(form, response_hash):
+    """
+        whether the form already has a response with this hash within its duplicate window.
+        raises a ValidationError if the form rejects duplicates.
+    """
+    if form.duplicate_policy == Form.DuplicatePolicies.ALLOW:
+        return False
+
+    earlier = Response.objects.filter(related_form_id=form.id, content_hash=response_hash)
+    if form.duplicate_window is not None:
+        earlier = earlier.filter(sent_date__gte=timezone.now() - timedelta(seconds=form.duplicate_window))
+    if not earlier.exists():
+        return False
+    if form.duplicate_policy == Form.DuplicatePolicies.REJECT:
+        raise ValidationError({'error': 'an identical response has already been submitted to this form.'})
+    return True
@@ -0,0 +1,233 @@
+"""
+    **export backends of the responses of a form.**
+    a backend is registered under its format name and writes rows (flat dicts: the response fields and one key
+    per question body) with the given columns to a binary stream the caller provides. heavy dependencies
+    (openpyxl for xlsx) are imported by the backend when it writes, never at module import, so workers and
+    commands that do not export do not pay for them; see `manage.py import_cost`.
+    csv and jsonl are concatenable: their rows can be written in parts (without header and footer) which are
+    joined afterwards, see form_builder.parallel_export, or sent while they are written, see `chunks`.
+"""
+
+import csv, html, io, json
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from .archive import archived_responses
+from .models import Response
+
+RESPONSE_COLUMNS = ('id', 'related_form_id', 'owner_email', 'sent_date', 'is_duplicate')
+
+_exporters = {}
+_encoder = DjangoJSONEncoder()
+
+
+def register(*names):
+    def decorator(exporter_class):
+        for name in names:
+            _exporters[name] = exporter_class
+        return exporter_class
+
+    return decorator
+
+
+def formats():
+    return sorted(_exporters)
+
+
+def get_exporter(name, columns):
+    """
+        an instance of the backend registered as name; raises KeyError for unknown formats.
+    """
+    return _exporters[name](columns)
+
+
+def columns_of(form):
+    return [*RESPONSE_COLUMNS, *form.questions.order_by('id').values_list('question_body', flat=True)]
+
+
+def flatten(response):
+    """
+        a response with its all_answers as a flat row.
+    """
+    answers = {answer['question']: answer['answer'] for answer in response['all_answers']}
+    return {**{column: response.get(column) for column in RESPONSE_COLUMNS}, **answers}
+
+
+def rows_of(form, response_filter, archived=True, id_range=None):
+    """
+        flat rows of the archived (only without filters) and live responses of the form, ordered by id.
+        id_range: (first id, last id) of the live responses, for rendering a part.
+    """
+    if archived and not response_filter:
+        yield from map(flatten, archived_responses(form))
+
+    responses = response_filter.apply(form.responses.all())
+    if id_range is not None:
+        responses = responses.filter(id__range=id_range)
+    responses = responses.order_by('id').values(*RESPONSE_COLUMNS)
+    yield from map(flatten, Response.iter_with_answers(responses.iterator()))
+
+
+def chunks(exporter, rows, chunk_rows=500):
+    """
+        the file of a concatenable backend as bytes chunks of chunk_rows rows, written while they are consumed;
+        for streamed downloads.
+    """
+    buffer = io.BytesIO()
+    exporter.write((), buffer, footer=False)
+    rows = iter(rows)
+    while True:
+        part = list(islice(rows, chunk_rows))
+        if not part:
+            break
+        exporter.write(part, buffer, header=False, footer=False)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    exporter.write((), buffer, header=False)
+    yield buffer.getvalue()
+
+
+def text_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (str, int, float)):
+        return value
+    try:
+        # datetimes and the like, formatted as in the json exports.
+        return _encoder.default(value)
+    except TypeError:
+        return str(value)
+
+
+class Exporter:
+    extension = None
+    content_type = 'application/octet-stream'
+    concatenable = False
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    def write(self, rows, stream, header=True, footer=True):
+        """
+            header/footer False writes a part of the file, for concatenable backends.
+        """
+        if header:
+            self.write_header(stream)
+        self.write_rows(rows, stream)
+        if footer:
+            self.write_footer(stream)
+
+    def write_header(self, stream):
+        pass
+
+    def write_rows(self, rows, stream):
+        raise NotImplementedError
+
+    def write_footer(self, stream):
+        pass
+
+
+class TextExporter(Exporter):
+    """
+        writes text to the binary stream through a utf-8 wrapper, which is detached so the stream stays open.
+    """
+
+    def text(self, stream):
+        return io.TextIOWrapper(stream, encoding='utf-8', newline='', write_through=True)
+
+    def write(self, rows, stream, header=True, footer=True):
+        text = self.text(stream)
+        try:
+            super().write(rows, text, header, footer)
+        finally:
+            text.detach()
+
+
+@register('csv')
+class CSVExporter(TextExporter):
+    extension = 'csv'
+    content_type = 'text/csv'
+    concatenable = True
+
+    def write_header(self, stream):
+        csv.writer(stream).writerow(self.columns)
+
+    def write_rows(self, rows, stream):
+        writer = csv.writer(stream)
+        for row in rows:
+            writer.writerow([text_value(row.get(column)) for column in self.columns])
+
+
+@register('jsonl')
+class JSONLinesExporter(TextExporter):
+    extension = 'jsonl'
+    content_type = 'application/jsonl'
+    concatenable = True
+
+    def write_rows(self, rows, stream):
+        for row in rows:
+            stream.write(json.dumps({column: row.get(column) for column in self.columns}, cls=DjangoJSONEncoder))
+            stream.write('\n')
+
+
+@register('json')
+class JSONExporter(TextExporter):
+    extension = 'json'
+    content_type = 'application/json'
+
+    def write_header(self, stream):
+        stream.write('[')
+
+    def write_rows(self, rows, stream):
+        separator = '\n'
+        for row in rows:
+            stream.write(separator)
+            stream.write(json.dumps({column: row.get(column) for column in self.columns}, cls=DjangoJSONEncoder))
+            separator = ',\n'
+
+    def write_footer(self, stream):
+        stream.write('\n]\n')
+
+
+@register('html')
+class HTMLExporter(TextExporter):
+    extension = 'html'
+    content_type = 'text/html'
+
+    def write_header(self, stream):
+        stream.write('<table border="1">\n<thead><tr>')
+        stream.write(''.join(f'<th>{html.escape(str(column))}</th>' for column in self.columns))
+        stream.write('</tr></thead>\n<tbody>\n')
+
+    def write_rows(self, rows, stream):
+        for row in rows:
+            stream.write('<tr>')
+            stream.write(''.join(f'<td>{html.escape(str(text_value(row.get(column))))}</td>'
+                                 for column in self.columns))
+            stream.write('</tr>\n')
+
+    def write_footer(self, stream):
+        stream.write('</tbody>\n</table>\n')
+
+
+@register('xlsx', 'excel')
+class XLSXExporter(Exporter):
+    extension = 'xlsx'
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    def write(self, rows, stream, header=True, footer=True):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(self.columns)
+        for row in rows:
+            sheet.append([self.cell(row.get(column)) for column in self.columns])
+        workbook.save(stream)
+
+    @staticmethod
+    def cell(value):
+        if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+            # excel does not support timezones.
+            return value.replace(tzinfo=None)
+        return value
@@ -0,0 +1,75 @@
+"""
+    **model fields of the form builder.**
+    CompressedTextField is a TextField whose large values are stored zlib compressed: a value of at least
+    TEXT_COMPRESSION_THRESHOLD bytes is written as MARKER + base64(zlib(utf-8 value)) when that is shorter, and
+    decompressed again whenever it is read, so models, values() and values_list() only ever see the text.
+    the column stays a text column; compression is turned off for new writes with TEXT_COMPRESSION = False, values
+    already compressed are still read. existing rows are (de)compressed by `manage.py compress_long_answers`.
+    compressed values can not be searched or compared in sql, only the equality to values below the threshold and
+    isnull work; the field is meant for answers that are only read back.
+"""
+
+import base64, binascii, zlib
+from django.conf import settings
+from django.db import models
+
+# \x01 does not occur in typed text, values starting with it are always stored compressed (see get_prep_value).
+MARKER = '\x01zlib:'
+
+
+def compression_enabled():
+    return getattr(settings, 'TEXT_COMPRESSION', True)
+
+
+def compression_threshold():
+    return getattr(settings, 'TEXT_COMPRESSION_THRESHOLD', 512)
+
+
+def compress(value):
+    return MARKER + base64.b64encode(zlib.compress(value.encode('utf-8'), 6)).decode('ascii')
+
+
+def decompress(value):
+    """
+        the text of a stored value; values which are not compressed are returned as they are.
+    """
+    if not isinstance(value, str) or not value.startswith(MARKER):
+        return value
+    try:
+        return zlib.decompress(base64.b64decode(value[len(MARKER):])).decode('utf-8')
+    except (binascii.Error, zlib.error, UnicodeDecodeError):
+        return value
+
+
+def is_compressed(value):
+    return isinstance(value, str) and value.startswith(MARKER) and decompress(value) is not value
+
+
+def stored(value, threshold):
+    """
+        the text as it is stored: compressed if it has at least threshold bytes and compressing makes it shorter.
+        threshold None never compresses, except texts starting with the marker, which would be taken for
+        compressed values when they are read.
+    """
+    if value.startswith(MARKER):
+        return compress(value)
+    size = len(value.encode('utf-8'))
+    if threshold is not None and size >= threshold:
+        compressed = compress(value)
+        if len(compressed) < size:
+            return compressed
+    return value
+
+
+class CompressedTextField(models.TextField):
+
+    # only values read from the database are decompressed: to_python also cleans typed text (and runs in
+    # get_prep_value), which has to be kept as it is, marker or not.
+    def from_db_value(self, value, expression, connection):
+        return decompress(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if not isinstance(value, str):
+            return value
+        return stored(value, compression_threshold() if compression_enabled() else None)
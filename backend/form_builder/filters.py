@@ -0,0 +1,138 @@
+import re
+from datetime import datetime, time
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.serializers import ValidationError
+from .models import (Response, LongAnswer, ShortAnswer, MultipleChoiceAnswer, EmailFieldAnswer,
+                     PhoneNumberFieldAnswer, NumberFieldAnswer, FileFieldAnswer)
+from .utils import QuestionTypes
+
+ANSWER_MODELS = {
+    QuestionTypes.Long: LongAnswer,
+    QuestionTypes.Short: ShortAnswer,
+    QuestionTypes.MultipleChoice: MultipleChoiceAnswer,
+    QuestionTypes.Email: EmailFieldAnswer,
+    QuestionTypes.Phone_Number: PhoneNumberFieldAnswer,
+    QuestionTypes.Number: NumberFieldAnswer,
+    QuestionTypes.File: FileFieldAnswer,
+}
+
+# the operators each question type supports; empty and not_empty are supported by all of them.
+OPERATORS = {
+    QuestionTypes.MultipleChoice: ('eq', 'in'),
+    QuestionTypes.Number: ('eq', 'gt', 'gte', 'lt', 'lte'),
+    QuestionTypes.Email: ('eq', 'domain'),
+    QuestionTypes.Short: ('eq',),
+    QuestionTypes.Phone_Number: ('eq',),
+    QuestionTypes.Long: (),
+    QuestionTypes.File: (),
+}
+
+QUESTION_PARAM = re.compile(r'^q(?P<question_id>\d+)(?:__(?P<operator>[a-z_]+))?$')
+DATE_PARAM = re.compile(r'^sent_date__(?P<operator>after|before|on)$')
+
+
+class ResponseFilter:
+    """
+        **filters of the response listing and export, given as query params.**
+        q<question id>[__<operator>]=<value>, e.g. ?q3=12&q7__gt=40&q5__domain=example.com&q2__empty=true
+            eq (default): choice id for multiple choice questions, the exact answer for the others.
+            in: comma separated choice ids. gt, gte, lt, lte: number questions. domain: email questions.
+            empty / not_empty (true): the question has (not) been answered.
+        sent_date__after, sent_date__before, sent_date__on=<iso date or datetime>: the response's sent date.
+        collapse_duplicates=true: only the first of the responses with the same answers (content hash).
+        each question predicate compiles to an EXISTS subquery against the typed answer table, which uses its
+        (related_question, answer_field) index. filters only apply to live (not archived) responses.
+    """
+    ignored_params = ('page', 'page_size', 'format', 'order_by')
+
+    def __init__(self, form, params):
+        self.conditions = []
+        questions = None
+        for param, value in params.items():
+            if param in self.ignored_params:
+                continue
+
+            if param == 'collapse_duplicates':
+                if value.lower() not in ('false', '0', 'no'):
+                    self.conditions.append(self.first_of_duplicates())
+                continue
+
+            date_match = DATE_PARAM.match(param)
+            if date_match:
+                self.conditions.append(self.date_condition(date_match['operator'], value))
+                continue
+
+            question_match = QUESTION_PARAM.match(param)
+            if question_match is None:
+                continue
+            if questions is None:
+                questions = dict(form.questions.values_list('id', 'answer_type'))
+            question_id = int(question_match['question_id'])
+            if question_id not in questions:
+                raise ValidationError({param: f'form {form.slug} does not have a question with id {question_id}.'})
+            self.conditions.append(self.question_condition(question_id, questions[question_id],
+                                                           question_match['operator'] or 'eq', value, param))
+
+    def __bool__(self):
+        return bool(self.conditions)
+
+    def apply(self, responses):
+        for condition in self.conditions:
+            responses = responses.filter(condition)
+        return responses
+
+    @staticmethod
+    def question_condition(question_id, answer_type, operator, value, param):
+        model = ANSWER_MODELS[answer_type]
+        answers = model.objects.filter(related_response=OuterRef('pk'), related_question_id=question_id)
+
+        if operator in ('empty', 'not_empty'):
+            answered = answers.exclude(answer_field__isnull=True)
+            if answer_type not in (QuestionTypes.MultipleChoice, QuestionTypes.Number):
+                answered = answered.exclude(answer_field='')
+            answered = Exists(answered)
+            wants_empty = (operator == 'empty') == (value.lower() not in ('false', '0', 'no'))
+            return ~answered if wants_empty else answered
+
+        if operator not in OPERATORS[answer_type]:
+            raise ValidationError({param: f'{operator} is not supported for {answer_type} questions.'})
+
+        try:
+            if operator == 'in':
+                lookup = {'answer_field_id__in': [int(choice) for choice in value.split(',')]}
+            elif operator == 'domain':
+                lookup = {'answer_field__iendswith': f"@{value.lstrip('@')}"}
+            elif answer_type == QuestionTypes.MultipleChoice:
+                lookup = {'answer_field_id': int(value)}
+            elif answer_type == QuestionTypes.Number:
+                lookup = {f'answer_field__{"exact" if operator == "eq" else operator}': int(value)}
+            else:
+                lookup = {'answer_field': value}
+        except ValueError:
+            raise ValidationError({param: f'{value} is not a valid value for {answer_type} questions.'})
+
+        return Exists(answers.filter(**lookup))
+
+    @staticmethod
+    def first_of_duplicates():
+        earlier = Response.objects.filter(related_form_id=OuterRef('related_form_id'),
+                                          content_hash=OuterRef('content_hash'), id__lt=OuterRef('pk'))
+        return Q(content_hash='') | ~Exists(earlier)
+
+    @staticmethod
+    def date_condition(operator, value):
+        try:
+            moment = parse_datetime(value) or parse_date(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise ValidationError({f'sent_date__{operator}': f'{value} is not a valid date.'})
+        if operator == 'on':
+            return Q(sent_date__date=moment.date() if isinstance(moment, datetime) else moment)
+        if not isinstance(moment, datetime):
+            moment = datetime.combine(moment, time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return Q(**{f"sent_date__{'gte' if operator == 'after' else 'lt'}": moment})
@@ -0,0 +1,87 @@
+"""
+    **idempotency keys of response submissions.**
+    a client may send an `Idempotency-Key` header with a submission and retry it with the same key. the first
+    request claims the key by inserting an IdempotencyKey row (unique per form), saves the response and stores
+    its result, all in one transaction (`submit_once`); every retry gets that stored result back without
+    submitting again.
+    a retry that arrives while the first request is still running waits for it on the unique index (the write
+    lock on sqlite) and then gets its result. a failed or crashed first request rolls back, claim included, so
+    the key can be retried at once. keys expire after IDEMPOTENCY_KEY_TTL seconds and expired rows are removed
+    in small batches while new keys are claimed, which keeps the table bounded.
+"""
+
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, router
+from django.db.transaction import atomic
+from django.utils import timezone
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+PURGE_PROBABILITY = 0.05
+PURGE_BATCH_SIZE = 500
+
+
+def ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+
+
+def expired(now=None):
+    return IdempotencyKey.objects.filter(created_date__lt=(now or timezone.now()) - timedelta(seconds=ttl()))
+
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE):
+    """
+        deletes up to batch_size expired keys, returns how many were deleted.
+    """
+    ids = list(expired().values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return 0
+    return IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+
+def claim(form, key):
+    """
+        returns (record, claimed). claimed is False if another request already used the key, then record holds its
+        result. runs in the transaction of the submission, see submit_once.
+    """
+    using = router.db_for_write(IdempotencyKey)
+    for _ in range(2):
+        try:
+            with atomic(using=using):
+                return IdempotencyKey.objects.create(form=form, key=key), True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(form=form, key=key).first()
+            if record is None:
+                # purged meanwhile, try again.
+                continue
+            # an expired key is free again, and so is a key without result: it was claimed in its own
+            # transaction before claims were made in the submission's, by a request which died.
+            if record.status_code is None or expired().filter(id=record.id).exists():
+                IdempotencyKey.objects.filter(id=record.id, created_date=record.created_date).delete()
+                continue
+            return record, False
+    raise IntegrityError(f'could not claim idempotency key {key}.')
+
+
+def complete(record, status_code, response_body):
+    record.status_code, record.response_body = status_code, response_body
+    record.save(update_fields=['status_code', 'response_body'])
+
+
+def submit_once(form, key, submit):
+    """
+        submit: saves the submission and returns its response body.
+        claims the key, submits and stores the result in one transaction, unless the key was used before.
+        returns (record, replayed); record holds the result of the submission under that key.
+    """
+    if random.random() < PURGE_PROBABILITY:
+        purge_expired()
+
+    with atomic(using=router.db_for_write(IdempotencyKey)):
+        record, claimed = claim(form, key)
+        if claimed:
+            complete(record, 200, submit())
+    return record, not claimed
@@ -0,0 +1,255 @@
+"""
+    **live feed of a form's new responses over server-sent events.**
+    GET /form_builder/live/<slug>/ (form owner only, `Authorization: Token <key>` header or ?ticket=<ticket>) keeps
+    the connection open and pushes every response of the form as an event once its transaction is committed.
+    browsers' EventSource can not send headers, so such clients first get a ticket for the form from
+    POST /form_builder/live-tickets/<slug>/: a signed (user, form) pair valid for LIVE_FEED_TICKET_MAX_AGE seconds,
+    which is all that ends up in access logs, instead of the long-lived token. a ticket is only checked when
+    connecting; clients fetch a fresh one before they reconnect.
+    the event id is the response id, so a reconnecting client (Last-Event-ID header or ?last_event_id=) first
+    gets the responses it missed from the database and then the live ones.
+    the feed is served by the ASGI application (config/asgi.py). the events are always read from the database: every
+    connection polls for the form's responses after the last one it sent every LIVE_FEED_POLL_SECONDS, so the
+    responses submitted through any process (wsgi workers, other asgi workers) reach it. a submission handled by the
+    feed's own process wakes its connections up at once (the in process `feed`), without waiting for the poll.
+"""
+
+import asyncio, json, threading
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, router
+from rest_framework.exceptions import AuthenticationFailed
+from accounts.authentication import CachedTokenAuthentication
+from config.sharding import shard_for_form, use_shard
+from .models import Form, Response
+from .permissions import is_form_owner
+
+PATH_PREFIX = '/form_builder/live/'
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+BACKFILL_CHUNK_SIZE = 500
+TICKET_SALT = 'form_builder.live'
+
+
+def ticket_max_age():
+    return getattr(settings, 'LIVE_FEED_TICKET_MAX_AGE', 60)
+
+
+def issue_ticket(user, form):
+    return signing.dumps({'user': user.pk, 'form': form.slug}, salt=TICKET_SALT)
+
+
+def ticket_user(ticket, slug):
+    """
+        the active user the ticket was issued to for the form, raises FeedError if it is invalid or expired.
+    """
+    try:
+        payload = signing.loads(ticket, salt=TICKET_SALT, max_age=ticket_max_age())
+    except signing.SignatureExpired:
+        raise FeedError(401, 'the ticket has expired.')
+    except signing.BadSignature:
+        raise FeedError(401, 'invalid ticket.')
+    user = User.objects.filter(pk=payload['user'], is_active=True).first()
+    if payload['form'] != slug or user is None:
+        raise FeedError(401, 'invalid ticket.')
+    return user
+
+
+class Subscription:
+    def __init__(self, loop):
+        self.loop = loop
+        self.woken = asyncio.Event()
+
+    def wake(self):
+        self.woken.set()
+
+
+class ResponseFeed:
+    """
+        in process wake ups of the connections watching a form, keyed by (database alias, form id).
+        publish is called from the (sync) submitting thread and wakes every subscriber in its event loop with
+        call_soon_threadsafe; the woken connections read the new responses from the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, alias, form_id):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault((alias, form_id), set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, alias, form_id, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get((alias, form_id), set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop((alias, form_id), None)
+
+    def publish(self, alias, form_id):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get((alias, form_id), ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.wake)
+            except RuntimeError:
+                # the loop of the subscriber is closed.
+                self.unsubscribe(alias, form_id, subscription)
+
+
+feed = ResponseFeed()
+
+
+def poll_seconds():
+    return getattr(settings, 'LIVE_FEED_POLL_SECONDS', 2)
+
+
+def last_response_id(alias, form_id):
+    with use_shard(alias):
+        responses = Response.objects.filter(related_form_id=form_id).order_by('-id')
+        return responses.values_list('id', flat=True).first() or 0
+
+
+def load_events(alias, form_id, after_id, limit=None):
+    """
+        (id, encoded event) of the form's responses with an id greater than after_id, ordered by id.
+    """
+    with use_shard(alias):
+        responses = Response.objects.filter(related_form_id=form_id, id__gt=after_id).order_by('id').values(
+            'id', 'related_form_id', 'owner_email', 'sent_date')
+        if limit is not None:
+            responses = responses[:limit]
+        return [(response['id'], encode_event(response)) for response in Response.iter_with_answers(responses)]
+
+
+def encode_event(response):
+    data = json.dumps({
+        "id": response['id'],
+        "related_form": response['related_form_id'],
+        "owner_email": response['owner_email'],
+        "sent_date": response['sent_date'],
+        "all_answers": response['all_answers'],
+    }, cls=DjangoJSONEncoder)
+    return f"id: {response['id']}\nevent: response\ndata: {data}\n\n".encode()
+
+
+def publish_response(alias, form_id, response_id):
+    """
+        wakes the form's connections in this process up once a response is committed, see ResponseFeed.
+    """
+    feed.publish(alias, form_id)
+
+
+class FeedError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status, self.message = status, message
+
+
+@sync_to_async
+def authorize(slug, key, ticket):
+    """
+        (database alias, form id) of the form, if the token (or ticket) belongs to its owner.
+    """
+    close_old_connections()
+    if key:
+        try:
+            user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+        except AuthenticationFailed as error:
+            raise FeedError(401, str(error.detail))
+    elif ticket:
+        user = ticket_user(ticket, slug)
+    else:
+        raise FeedError(401, 'authentication credentials were not provided.')
+
+    with use_shard(shard_for_form(slug)):
+        form = Form.objects.filter(slug__exact=slug).first()
+        if form is None:
+            raise FeedError(404, f'there is no form with this slug({slug}).')
+        if not is_form_owner(user, form):
+            raise FeedError(403, 'permission denied')
+        return router.db_for_write(Response), form.id
+
+
+async def send_error(send, error):
+    await send({'type': 'http.response.start', 'status': error.status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps({'details': error.message}).encode()})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def response_feed(scope, receive, send):
+    """
+        the ASGI application of the feed, see config/asgi.py.
+    """
+    slug = scope['path'][len(PATH_PREFIX):].strip('/')
+    headers = {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope['headers']}
+    query = {name: values[-1] for name, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+    authorization = headers.get('authorization', '').split()
+    key = authorization[1] if len(authorization) == 2 and authorization[0] == 'Token' else None
+
+    try:
+        if scope['method'] != 'GET':
+            raise FeedError(405, f'Method "{scope["method"]}" not allowed.')
+        alias, form_id = await authorize(slug, key, query.get('ticket'))
+        last_event_id = headers.get('last-event-id') or query.get('last_event_id')
+        try:
+            last_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            raise FeedError(400, f'{last_event_id} is not a valid event id.')
+    except FeedError as error:
+        await send_error(send, error)
+        return
+
+    # subscribed before the responses are read, so nothing committed meanwhile is lost.
+    subscription = feed.subscribe(alias, form_id)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    woken = None
+    loop = asyncio.get_running_loop()
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MILLISECONDS}\n\n'.encode(),
+                    'more_body': True})
+        if last_id is None:
+            last_id = await sync_to_async(last_response_id)(alias, form_id)
+
+        last_sent = loop.time()
+        while True:
+            sent = 0
+            while True:
+                events = await sync_to_async(load_events)(alias, form_id, last_id, BACKFILL_CHUNK_SIZE)
+                for response_id, event in events:
+                    await send({'type': 'http.response.body', 'body': event, 'more_body': True})
+                    last_id = response_id
+                sent += len(events)
+                if len(events) < BACKFILL_CHUNK_SIZE:
+                    break
+            if sent:
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= HEARTBEAT_SECONDS:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                last_sent = loop.time()
+
+            woken = asyncio.ensure_future(subscription.woken.wait())
+            done, _ = await asyncio.wait({woken, disconnected}, timeout=min(poll_seconds(), HEARTBEAT_SECONDS),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                return
+            woken.cancel()
+            subscription.woken.clear()
+    finally:
+        feed.unsubscribe(alias, form_id, subscription)
+        for task in (disconnected, woken):
+            if task is not None:
+                task.cancel()
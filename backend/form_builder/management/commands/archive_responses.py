@@ -0,0 +1,84 @@
+import os
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+from django.db.transaction import atomic
+from django.utils import timezone
+from config.sharding import each_shard
+from form_builder import archive, search
+from form_builder.models import Form, Response
+
+
+class Command(BaseCommand):
+    help = ('moves cold responses (older than a cutoff and/or of closed forms) out of the database '
+            'into compressed per form segment files.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, metavar='DAYS',
+                            help='archive responses sent more than DAYS days ago.')
+        parser.add_argument('--closed-forms', action='store_true', help='archive all responses of closed forms.')
+        parser.add_argument('--form', metavar='SLUG', help='only archive the responses of this form.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='responses per segment and delete transaction. default: 500')
+
+    def handle(self, *args, **options):
+        if options['older_than'] is None and not options['closed_forms']:
+            raise CommandError('either --older-than or --closed-forms is required.')
+
+        for _ in each_shard():
+            forms = Form.objects.all()
+            if options['form']:
+                forms = forms.filter(slug__exact=options['form'])
+
+            for form in forms.iterator():
+                self.archive_form(form, options)
+
+    def archive_form(self, form, options):
+        self.recover(form)
+
+        responses = Response.objects.filter(related_form_id=form.id)
+        if not (options['closed_forms'] and form.is_closed):
+            if options['older_than'] is None:
+                return
+            responses = responses.filter(sent_date__lt=timezone.now() - timedelta(days=options['older_than']))
+
+        archived = 0
+        while True:
+            ids = list(responses.order_by('id').values_list('id', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            self.archive_chunk(form, ids)
+            archived += len(ids)
+
+        if archived:
+            self.stdout.write(f'{form.slug}: archived {archived} responses.')
+
+    @staticmethod
+    def archive_chunk(form, ids):
+        answers = Response.answers_of(ids)
+        records = [{**response, 'all_answers': answers[response['id']]} for response in
+                   Response.objects.filter(id__in=ids).order_by('id').values(
+                       'id', 'related_form_id', 'owner_email', 'sent_date', 'is_duplicate')]
+
+        # segment file first, then the rows, then the index; see `recover` for interrupted runs.
+        entry = archive.write_segment(form, records)
+        using = router.db_for_write(Response)
+        with atomic(using=using):
+            Response.objects.filter(id__in=ids).delete()
+            search.remove_responses(using, ids)
+        archive.add_to_index(form, entry)
+
+    def recover(self, form):
+        """
+            a segment file without index entry was written by an interrupted run.
+            if its responses are still in the database they were not deleted, so the file is dropped;
+            otherwise only the index update was missed.
+        """
+        for name in archive.unindexed_segments(form):
+            records = list(archive.read_segment(form, name))
+            ids = [record['id'] for record in records]
+            if Response.objects.filter(id__in=ids).exists():
+                os.remove(os.path.join(archive.form_archive_dir(form), name))
+            else:
+                archive.add_to_index(form, archive.segment_entry(records))
+                self.stdout.write(f'{form.slug}: recovered segment {name}.')
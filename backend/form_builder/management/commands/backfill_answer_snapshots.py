@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import router
+from django.db.transaction import atomic
+from config.sharding import each_shard
+from form_builder import snapshots
+from form_builder.models import Response
+
+
+class Command(BaseCommand):
+    help = 'writes the answers snapshot of the responses which do not have one yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='rewrite the snapshots of all responses.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='responses per transaction. default: 500')
+
+    def handle(self, *args, **options):
+        for _ in each_shard():
+            using = router.db_for_write(Response)
+            responses = Response.objects.all()
+            if not options['all']:
+                responses = responses.filter(answers_snapshot__isnull=True)
+
+            written, last_id = 0, 0
+            while True:
+                ids = list(responses.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', flat=True)[:options['chunk_size']])
+                if not ids:
+                    break
+                with atomic(using=using):
+                    written += snapshots.refresh(using, ids)
+                last_id = ids[-1]
+            self.stdout.write(f'{using}: wrote {written} snapshots.')
@@ -0,0 +1,56 @@
+import hashlib, os, tempfile, time
+from django.core.management.base import BaseCommand, CommandError
+from config.sharding import shard_for_form, use_shard
+from form_builder import parallel_export
+from form_builder.models import Form
+
+
+class Command(BaseCommand):
+    help = 'benchmarks the parallel export of a form with an increasing number of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('form', metavar='SLUG')
+        parser.add_argument('--format', default='csv', choices=('csv', 'jsonl'))
+        parser.add_argument('--workers', type=int, nargs='+',
+                            help='worker counts to compare. default: 1, 2, 4, ... up to the number of cores')
+        parser.add_argument('--repeat', type=int, default=1, help='runs per worker count, the best is kept.')
+
+    def handle(self, *args, **options):
+        worker_counts = options['workers'] or self.default_worker_counts()
+        with use_shard(shard_for_form(options['form'])):
+            form = Form.objects.filter(slug__exact=options['form']).first()
+            if form is None:
+                raise CommandError(f'there is no form with this slug({options["form"]}).')
+            responses = form.responses.count()
+
+            baseline, digests = None, set()
+            for worker_count in worker_counts:
+                best = None
+                for _ in range(options['repeat']):
+                    elapsed, digest = self.run(form, options['format'], worker_count)
+                    best = elapsed if best is None else min(best, elapsed)
+                    digests.add(digest)
+                baseline = baseline or best
+                self.stdout.write(f'{worker_count:>3} workers: {best:.2f}s, {responses / best:.0f} responses/s, '
+                                  f'speedup {baseline / best:.2f}x')
+
+        # every run has to produce the very same file.
+        self.stdout.write('outputs identical' if len(digests) == 1 else 'outputs differ!')
+
+    @staticmethod
+    def default_worker_counts():
+        cores, counts = os.cpu_count() or 1, [1]
+        while counts[-1] * 2 <= cores:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cores:
+            counts.append(cores)
+        return counts
+
+    @staticmethod
+    def run(form, export_format, worker_count):
+        with tempfile.TemporaryFile() as stream:
+            started = time.perf_counter()
+            parallel_export.export(form, export_format, stream, worker_count=worker_count)
+            elapsed = time.perf_counter() - started
+            stream.seek(0)
+            return elapsed, hashlib.sha256(stream.read()).hexdigest()
@@ -0,0 +1,88 @@
+import os, sqlite3, tempfile, threading, time
+from django.core.management.base import BaseCommand
+from config.sqlite3 import sqlite_pragmas
+
+SCHEMA = """
+    CREATE TABLE response (id INTEGER PRIMARY KEY AUTOINCREMENT, related_form_id INTEGER, owner_email TEXT, sent_date TEXT);
+    CREATE TABLE answer (id INTEGER PRIMARY KEY AUTOINCREMENT, related_response_id INTEGER, related_question_id INTEGER,
+                         answer_field TEXT);
+    CREATE INDEX answer_response ON answer (related_response_id);
+    CREATE TABLE question (id INTEGER PRIMARY KEY, form_id INTEGER, is_required BOOLEAN);
+"""
+
+
+class Command(BaseCommand):
+    help = ('benchmarks concurrent response submissions against the default sqlite setup and the high '
+            'concurrency mode (WAL, tuned pragmas, BEGIN IMMEDIATE).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='concurrent writer threads. default: 8')
+        parser.add_argument('--submissions', type=int, default=200, help='submissions per writer. default: 200')
+        parser.add_argument('--answers', type=int, default=7, help='answers per submission. default: 7')
+        parser.add_argument('--timeout', type=float, default=5.0, help='sqlite busy timeout in seconds. default: 5')
+
+    def handle(self, *args, **options):
+        for mode in ('default', 'high-concurrency'):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                with sqlite3.connect(path) as conn:
+                    conn.executescript(SCHEMA)
+                    conn.executemany('INSERT INTO question VALUES (?, 1, 0)',
+                                     [(i,) for i in range(options['answers'])])
+                result = self.run(path, mode == 'high-concurrency', options)
+
+            self.stdout.write(
+                f"{mode:>16}: {result['ok']} submitted, {result['locked']} 'database is locked' errors, "
+                f"{result['elapsed']:.2f}s, {result['ok'] / result['elapsed']:.0f} submissions/s, "
+                f"p99 latency {result['p99'] * 1000:.1f}ms")
+
+    def run(self, path, tuned, options):
+        counters = {'ok': 0, 'locked': 0}
+        latencies = []
+        lock = threading.Lock()
+
+        def writer():
+            # same connection setup as django's sqlite backend: autocommit mode and explicit BEGINs.
+            conn = sqlite3.connect(path, timeout=options['timeout'], isolation_level=None,
+                                   check_same_thread=False)
+            if tuned:
+                for pragma, value in sqlite_pragmas().items():
+                    conn.execute(f'PRAGMA {pragma} = {value}')
+
+            for _ in range(options['submissions']):
+                started = time.perf_counter()
+                try:
+                    conn.execute('BEGIN IMMEDIATE' if tuned else 'BEGIN')
+                    # the submission path reads the form's questions before writing the answers.
+                    conn.execute('SELECT id FROM question WHERE form_id = 1 AND is_required = 1').fetchall()
+                    response_id = conn.execute(
+                        "INSERT INTO response (related_form_id, owner_email, sent_date) "
+                        "VALUES (1, 'bench@example.com', datetime('now'))").lastrowid
+                    conn.executemany(
+                        'INSERT INTO answer (related_response_id, related_question_id, answer_field) VALUES (?, ?, ?)',
+                        [(response_id, question, 'x' * 64) for question in range(options['answers'])])
+                    conn.execute('COMMIT')
+                except sqlite3.OperationalError as error:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    if 'locked' not in str(error):
+                        raise
+                    with lock:
+                        counters['locked'] += 1
+                else:
+                    with lock:
+                        counters['ok'] += 1
+                        latencies.append(time.perf_counter() - started)
+            conn.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(options['writers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+        return {**counters, 'elapsed': elapsed, 'p99': p99}
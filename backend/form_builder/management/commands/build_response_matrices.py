@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from config.sharding import each_shard
+from form_builder import matrix
+from form_builder.models import Form
+
+
+class Command(BaseCommand):
+    help = ('builds or extends the response matrices of the cross tabulations ahead of the first request, '
+            'see form_builder.matrix.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', metavar='SLUG', help='only this form.')
+
+    def handle(self, *args, **options):
+        for _ in each_shard():
+            forms = Form.objects.all()
+            if options['form']:
+                forms = forms.filter(slug__exact=options['form'])
+
+            for form in forms.iterator():
+                self.stdout.write(f'{form.slug}: {matrix.load(form).count} responses.')
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+from config.sharding import each_shard
+from form_builder import snapshots
+from form_builder.models import Form, Response
+
+
+def normalized(snapshot):
+    return sorted(snapshot, key=lambda answer: (answer[0], str(answer[1])))
+
+
+class Command(BaseCommand):
+    help = 'compares the answers snapshots of the responses with their answer tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', metavar='SLUG', help='only check the responses of this form.')
+        parser.add_argument('--fix', action='store_true', help='rewrite the snapshots which do not match.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        inconsistent_total = 0
+        for _ in each_shard():
+            using = router.db_for_write(Response)
+            responses = Response.objects.all()
+            if options['form']:
+                form = Form.objects.filter(slug__exact=options['form']).first()
+                if form is None:
+                    continue
+                responses = responses.filter(related_form_id=form.id)
+
+            checked, inconsistent, missing, last_id = 0, [], 0, 0
+            while True:
+                chunk = list(responses.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', 'answers_snapshot')[:options['chunk_size']])
+                if not chunk:
+                    break
+                last_id = chunk[-1][0]
+                tables = Response.answers_from_tables([response_id for response_id, _ in chunk])
+                for response_id, snapshot in chunk:
+                    checked += 1
+                    if snapshot is None:
+                        missing += 1
+                    elif normalized(snapshot) != normalized(snapshots.snapshot_of(tables[response_id])):
+                        inconsistent.append(response_id)
+
+            if options['fix'] and inconsistent:
+                snapshots.refresh(using, inconsistent)
+            self.stdout.write(f'{using}: checked {checked} responses, {len(inconsistent)} inconsistent '
+                              f'{"(fixed) " if options["fix"] else ""}and {missing} without snapshot.')
+            if inconsistent and not options['fix']:
+                self.stdout.write(f'inconsistent responses: {", ".join(map(str, inconsistent[:50]))}')
+                inconsistent_total += len(inconsistent)
+
+        if inconsistent_total:
+            raise CommandError(f'{inconsistent_total} snapshots do not match their answers, run with --fix.')
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'checkpoints the WAL file of a sqlite database; run it periodically (cron) or with --interval.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--mode', default='PASSIVE', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'])
+        parser.add_argument('--interval', type=int, default=0,
+                            help='seconds between checkpoints. checkpoints once if omitted.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"database {options['database']} is not a sqlite database.")
+
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA wal_checkpoint({options['mode']})")
+                busy, wal_pages, checkpointed_pages = cursor.fetchone()
+            self.stdout.write(f'busy={busy} wal_pages={wal_pages} checkpointed_pages={checkpointed_pages}')
+
+            if not options['interval']:
+                return
+            connection.close()
+            time.sleep(options['interval'])
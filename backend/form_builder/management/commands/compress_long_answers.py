@@ -0,0 +1,62 @@
+from django.db import router
+from django.db.models import TextField, Value
+from django.db.models.functions import Length
+from django.db.transaction import atomic
+from django.core.management.base import BaseCommand
+from config.sharding import each_shard
+from form_builder.fields import MARKER, compress, compression_threshold, stored
+from form_builder.models import LongAnswer
+
+
+class Command(BaseCommand):
+    help = ('compresses the stored long answers of at least TEXT_COMPRESSION_THRESHOLD bytes (see '
+            'form_builder.fields), or decompresses them all with --decompress. rows are rewritten in batches, '
+            'each in its own transaction, so it can run while the site is up and be interrupted at any time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='rows per update. default: 1000')
+        parser.add_argument('--threshold', type=int, default=None,
+                            help='compress answers of at least this many bytes. default: TEXT_COMPRESSION_THRESHOLD')
+        parser.add_argument('--decompress', action='store_true', help='store the compressed answers as text again.')
+
+    def handle(self, *args, **options):
+        threshold = None if options['decompress'] else (options['threshold'] or compression_threshold())
+        for using in each_shard():
+            answers = LongAnswer.objects.using(router.db_for_write(LongAnswer)).exclude(answer_field__isnull=True)
+            if threshold is None:
+                answers = answers.filter(answer_field__startswith=MARKER)
+            else:
+                # a character is at most 4 bytes, shorter answers are below the threshold anyway.
+                answers = answers.exclude(answer_field__startswith=MARKER).annotate(
+                    length=Length('answer_field')).filter(length__gte=threshold // 4)
+
+            rewritten, before, after, last_id = 0, 0, 0, 0
+            while True:
+                rows = list(answers.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', 'answer_field')[:options['batch_size']])
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                changed = []
+                for answer_id, text in rows:
+                    value = stored(text, threshold)
+                    if threshold is None:
+                        # texts starting with the marker stay compressed.
+                        if value != text:
+                            continue
+                        before += len(compress(text))
+                    elif value == text:
+                        continue
+                    else:
+                        before += len(text.encode('utf-8'))
+                    after += len(value.encode('utf-8'))
+                    # an expression is written as it is, without the field compressing it (again).
+                    changed.append(LongAnswer(id=answer_id, answer_field=Value(value, output_field=TextField())))
+                if changed:
+                    with atomic(using=answers.db):
+                        LongAnswer.objects.using(answers.db).bulk_update(changed, ['answer_field'])
+                    rewritten += len(changed)
+
+            action = 'decompressed' if threshold is None else 'compressed'
+            self.stdout.write(f'{using}: {action} {rewritten} long answers, {before} -> {after} bytes.')
@@ -0,0 +1,48 @@
+import sys, time
+from django.core.management.base import BaseCommand, CommandError
+from config.sharding import shard_for_form, use_shard
+from form_builder import exporters, parallel_export
+from form_builder.filters import ResponseFilter
+from form_builder.models import Form
+
+
+class Command(BaseCommand):
+    help = ('exports the responses of a form to a file, rendering the csv/jsonl parts in parallel worker '
+            'processes. other formats are written by this process.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('form', metavar='SLUG')
+        parser.add_argument('--format', default='csv', help=f'one of {", ".join(exporters.formats())}. default: csv')
+        parser.add_argument('--output', '-o', help='output file, default: <slug>.<extension>; - for stdout.')
+        parser.add_argument('--workers', type=int, help='worker processes. default: EXPORT_WORKERS or the cores')
+        parser.add_argument('--parts', type=int, help='id ranges the responses are split into. default: 4 per worker')
+        parser.add_argument('--filter', action='append', default=[], metavar='PARAM=VALUE',
+                            help='a response filter, as in the listing query params (e.g. q3__gt=10).')
+
+    def handle(self, *args, **options):
+        params = dict(param.split('=', 1) for param in options['filter'])
+        with use_shard(shard_for_form(options['form'])):
+            form = Form.objects.filter(slug__exact=options['form']).first()
+            if form is None:
+                raise CommandError(f'there is no form with this slug({options["form"]}).')
+            try:
+                exporter = exporters.get_exporter(options['format'], ())
+            except KeyError:
+                raise CommandError(f'{options["format"]} is not one of {", ".join(exporters.formats())}.')
+
+            output = options['output'] or f'{form.slug}.{exporter.extension}'
+            started = time.perf_counter()
+            stream = sys.stdout.buffer if output == '-' else open(output, 'wb')
+            try:
+                if exporter.concatenable:
+                    parallel_export.export(form, options['format'], stream, params, options['workers'],
+                                           options['parts'])
+                else:
+                    exporter = exporters.get_exporter(options['format'], exporters.columns_of(form))
+                    exporter.write(exporters.rows_of(form, ResponseFilter(form, params)), stream)
+            finally:
+                if stream is not sys.stdout.buffer:
+                    stream.close()
+
+        if output != '-':
+            self.stderr.write(f'exported {form.slug} to {output} in {time.perf_counter() - started:.2f}s.')
@@ -0,0 +1,60 @@
+import os, subprocess, sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# modules a worker imports to serve requests.
+REQUEST_PATH_MODULES = ('config.urls', 'form_builder.views', 'form_builder.serializers', 'accounts.views')
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+
+class Command(BaseCommand):
+    help = ('measures the import time of the request path (django setup and the url conf with its views) in a '
+            'fresh interpreter with `python -X importtime`, and which heavy modules it loads.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', default=REQUEST_PATH_MODULES,
+                            help=f'modules to import after django.setup(). default: {" ".join(REQUEST_PATH_MODULES)}')
+        parser.add_argument('--top', type=int, default=10, help='number of the slowest imports listed. default: 10')
+        parser.add_argument('--compare', nargs='*', default=['pandas'], metavar='MODULE',
+                            help='also measure importing these modules on their own. default: pandas')
+
+    def handle(self, *args, **options):
+        code = f'import django; django.setup(); import {", ".join(options["modules"])}'
+        total, imports = self.measure(code)
+        self.stdout.write(f'request path: {total / 1000:.1f} ms for {len(imports)} modules')
+        for name, cumulative in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+        loaded = [module for module in HEAVY_MODULES if module in imports]
+        self.stdout.write(f'heavy modules loaded: {", ".join(loaded) if loaded else "none"}')
+
+        for module in options['compare']:
+            try:
+                module_total, _ = self.measure(f'import {module}')
+            except CommandError as error:
+                self.stdout.write(f'{module}: {error}')
+                continue
+            self.stdout.write(f'importing {module} alone: {module_total / 1000:.1f} ms')
+
+    @staticmethod
+    def measure(code):
+        """
+            (total microseconds, {top level module: cumulative microseconds}) of running code in a new interpreter.
+        """
+        environment = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get(
+            'DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)}
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                                cwd=settings.BASE_DIR, env=environment)
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        imports, total = {}, 0
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not name.startswith('  '):
+                # a module imported at top level (not by another module), its cumulative time counts once.
+                total += int(cumulative)
+            imports[name.strip()] = int(cumulative)
+        return total, imports
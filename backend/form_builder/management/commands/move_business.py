@@ -0,0 +1,115 @@
+import os
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.db.transaction import atomic
+from accounts.models import Business, ShardAssignment
+from config.sharding import (shard_aliases, sharding_enabled, shard_for_business, business_shard_cache_key,
+                             form_shard_cache_key)
+from form_builder import archive, search, versions
+from form_builder.models import *
+
+# (model, lookup of the business, remapped foreign keys), in insert order.
+# ids are only unique per shard, so copied forms, questions, choices and responses get new ids on the target.
+ANSWER_KEYS = {'related_question_id': Question, 'related_response_id': Response}
+ANSWERS_OF_BUSINESS = 'related_question__form__business_id'
+COPY_PLAN = (
+    (Form, 'business_id', {}),
+    (Question, 'form__business_id', {'form_id': Form}),
+    (Choices, 'related_question__form__business_id', {'related_question_id': Question}),
+    (FormVersion, 'form__business_id', {'form_id': Form}),
+    (Response, 'related_form__business_id', {'related_form_id': Form}),
+    (IdempotencyKey, 'form__business_id', {'form_id': Form}),
+    (LongAnswer, ANSWERS_OF_BUSINESS, ANSWER_KEYS),
+    (ShortAnswer, ANSWERS_OF_BUSINESS, ANSWER_KEYS),
+    (MultipleChoiceAnswer, ANSWERS_OF_BUSINESS, {**ANSWER_KEYS, 'answer_field_id': Choices}),
+    (EmailFieldAnswer, ANSWERS_OF_BUSINESS, ANSWER_KEYS),
+    (PhoneNumberFieldAnswer, ANSWERS_OF_BUSINESS, ANSWER_KEYS),
+    (NumberFieldAnswer, ANSWERS_OF_BUSINESS, ANSWER_KEYS),
+    (FileFieldAnswer, ANSWERS_OF_BUSINESS, ANSWER_KEYS),
+)
+REMAPPED_MODELS = (Form, Question, Choices, Response)
+
+
+class Command(BaseCommand):
+    help = 'moves the forms and responses of a business to another database shard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('business', help='label of the business.')
+        parser.add_argument('shard', help='database alias of the target shard.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        label, target = options['business'], options['shard']
+        if not sharding_enabled():
+            raise CommandError('sharding is not enabled, DATABASE_SHARDS has a single database.')
+        if target not in shard_aliases():
+            raise CommandError(f'{target} is not one of the shards {shard_aliases()}.')
+        if not Business.objects.filter(label__exact=label).exists():
+            raise CommandError(f'business {label} does not exist.')
+
+        source = shard_for_business(label)
+        if source == target:
+            self.stdout.write(f'{label} is already on {target}.')
+            return
+
+        # the business should not receive writes meanwhile, e.g. close its forms first.
+        with atomic(using=target):
+            id_maps = self.copy(label, source, target, options['batch_size'])
+        ShardAssignment.objects.update_or_create(business_id=label, defaults={'database': target})
+
+        # from now on the business is served from the target shard.
+        cache.delete(business_shard_cache_key(label))
+        for old_id, new_id in id_maps[Form].items():
+            form = Form.all_objects.using(target).get(id=new_id)
+            cache.delete(form_shard_cache_key(form.slug))
+            self.move_archive(Form.all_objects.using(source).get(id=old_id), form)
+            search.rebuild(target, new_id)
+            search.remove_form(source, old_id)
+
+        with atomic(using=source):
+            # drafts are not moved, their respondents start over.
+            ResponseDraft._base_manager.using(source).filter(form__business_id=label)._raw_delete(source)
+            for model, lookup, _ in reversed(COPY_PLAN):
+                model._base_manager.using(source).filter(**{lookup: label})._raw_delete(source)
+
+        self.stdout.write(f'moved {label} from {source} to {target}: '
+                          + ', '.join(f'{len(ids)} {model.__name__}' for model, ids in id_maps.items()))
+
+    @staticmethod
+    def copy(label, source, target, batch_size):
+        id_maps = {}
+        for model, lookup, foreign_keys in COPY_PLAN:
+            # deleted forms (hidden from Form.objects) are moved too, they are purged on the target.
+            rows = model._base_manager.using(source).filter(**{lookup: label}).order_by('id').values()
+            remaps_ids = model in REMAPPED_MODELS
+            next_id = (model.objects.using(target).aggregate(last=Max('id'))['last'] or 0) + 1
+            id_map = id_maps.setdefault(model, {}) if remaps_ids else None
+
+            batch = []
+            for row in rows.iterator():
+                old_id = row.pop('id')
+                if remaps_ids:
+                    id_map[old_id] = row['id'] = next_id
+                    next_id += 1
+                for field, related_model in foreign_keys.items():
+                    if row[field] is not None:
+                        row[field] = id_maps[related_model][row[field]]
+                if model is Response and row['answers_snapshot'] is not None:
+                    row['answers_snapshot'] = [[id_maps[Question][question_id], answer]
+                                               for question_id, answer in row['answers_snapshot']]
+                if model is FormVersion:
+                    row['questions'] = versions.remap(row['questions'], id_maps[Question], id_maps[Choices])
+                batch.append(model(**row))
+                if len(batch) >= batch_size:
+                    model.objects.using(target).bulk_create(batch)
+                    batch = []
+            model.objects.using(target).bulk_create(batch)
+        return id_maps
+
+    @staticmethod
+    def move_archive(old_form, new_form):
+        old_dir, new_dir = archive.form_archive_dir(old_form), archive.form_archive_dir(new_form)
+        if os.path.isdir(old_dir):
+            os.makedirs(os.path.dirname(new_dir), exist_ok=True)
+            os.replace(old_dir, new_dir)
@@ -0,0 +1,43 @@
+import io, json, os, pstats
+from django.core.management.base import BaseCommand, CommandError
+from form_builder.middleware import captured_profiles, profiles_dir
+
+
+class Command(BaseCommand):
+    help = 'lists the captured slow request profiles, or summarizes one of them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help='profile name to summarize. lists all profiles if omitted.')
+        parser.add_argument('--sort', default='cumulative', help='pstats sort key. default: cumulative')
+        parser.add_argument('--limit', type=int, default=25, help='amount of functions to print. default: 25')
+
+    def handle(self, *args, **options):
+        names = captured_profiles()
+        if options['name'] is None:
+            if not names:
+                self.stdout.write('no profiles captured yet.')
+            for name in names:
+                meta = self.meta(name)
+                self.stdout.write(f"{name}  {meta.get('method', '?')} {meta.get('path', '?')} "
+                                  f"status={meta.get('status', '?')} {meta.get('elapsed_ms', '?')}ms "
+                                  f"user={meta.get('user', '?')}")
+            return
+
+        name = options['name']
+        if name not in names:
+            raise CommandError(f'profile {name} does not exist.')
+
+        meta = self.meta(name)
+        self.stdout.write(f"{meta.get('method', '?')} {meta.get('path', '?')} took {meta.get('elapsed_ms', '?')}ms")
+        output = io.StringIO()
+        stats = pstats.Stats(os.path.join(profiles_dir(), f'{name}.prof'), stream=output)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(output.getvalue())
+
+    @staticmethod
+    def meta(name):
+        try:
+            with open(os.path.join(profiles_dir(), f'{name}.json')) as meta_file:
+                return json.load(meta_file)
+        except (FileNotFoundError, ValueError):
+            return {}
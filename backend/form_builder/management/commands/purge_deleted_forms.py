@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import router
+from django.utils import timezone
+from config.sharding import each_shard
+from form_builder import purge
+from form_builder.models import Form
+
+
+class Command(BaseCommand):
+    help = ('purges the rows, files, search index entries, archive and response matrix of deleted forms, '
+            'in batches. see form_builder.purge')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deleted-before', type=int, metavar='MINUTES',
+                            help='only forms deleted more than MINUTES minutes ago, e.g. to leave the recent ones '
+                                 'to the background purge.')
+
+    def handle(self, *args, **options):
+        for _ in each_shard():
+            forms = Form.all_objects.filter(is_deleted=True)
+            if options['deleted_before'] is not None:
+                forms = forms.filter(deleted_date__lt=timezone.now() - timedelta(minutes=options['deleted_before']))
+
+            for form_id, slug in list(forms.order_by('id').values_list('id', 'slug')):
+                deleted = purge.purge_form(router.db_for_write(Form), form_id)
+                self.stdout.write(f'{slug}: purged {deleted} rows.')
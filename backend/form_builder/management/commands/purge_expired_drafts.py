@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from config.sharding import each_shard
+from form_builder import drafts
+
+
+class Command(BaseCommand):
+    help = 'deletes the response drafts not saved for RESPONSE_DRAFT_TTL seconds, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=drafts.PURGE_BATCH_SIZE,
+                            help=f'drafts per delete. default: {drafts.PURGE_BATCH_SIZE}')
+
+    def handle(self, *args, **options):
+        for using in each_shard():
+            deleted = 0
+            while True:
+                batch = drafts.purge_expired(options['batch_size'])
+                if not batch:
+                    break
+                deleted += batch
+            self.stdout.write(f'{using}: deleted {deleted} expired drafts.')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import router
+from config.sharding import each_shard
+from form_builder import search
+from form_builder.models import Form, Response
+
+
+class Command(BaseCommand):
+    help = 'rebuilds the full text search index of the text answers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', metavar='SLUG', help='only rebuild the index of this form.')
+
+    def handle(self, *args, **options):
+        for _ in each_shard():
+            using = router.db_for_write(Response)
+            if options['form']:
+                form = Form.objects.filter(slug__exact=options['form']).first()
+                if form is None:
+                    continue
+                indexed = search.rebuild(using, form.id)
+            else:
+                indexed = search.rebuild(using)
+            self.stdout.write(f'{using}: indexed {indexed} answers.')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+from django.db.transaction import atomic
+from config.sharding import shard_for_form, use_shard
+from form_builder import quiz
+from form_builder.models import Form, Response
+
+
+class Command(BaseCommand):
+    help = ('rescores the responses of a quiz form, e.g. after its answer key or points changed. the key is read '
+            'from the current version of the form, see form_builder.versions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='slug of the quiz form.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='responses per update query. default: 1000')
+
+    def handle(self, *args, **options):
+        with use_shard(shard_for_form(options['slug'])):
+            try:
+                form = Form.objects.get(slug__exact=options['slug'])
+            except Form.DoesNotExist:
+                raise CommandError(f'there is no form with the slug {options["slug"]}.')
+            if not quiz.is_quiz(form):
+                raise CommandError(f'{form.slug} is not a quiz.')
+
+            with atomic(using=router.db_for_write(Response)):
+                regraded = quiz.regrade(form, options['batch_size'])
+        self.stdout.write(f'{form.slug}: regraded {regraded} responses, max score {quiz.max_score(quiz.answer_key(form))}.')
@@ -0,0 +1,269 @@
+"""
+    **columnar response matrix of a form, for cross tabulations.**
+    the live responses of a form as one column per multiple choice and number question, in raw binary files under
+    RESPONSE_MATRIX_DIR/<database>/<form id>/ which are memory mapped when read:
+        <generation>.ids: the response ids (int64, ascending).
+        <generation>.q<question id>: int32 codes of the chosen choices (0: not answered, i: the i-th choice id in
+        meta.json's choices list of the question) or float64 numbers (nan: not answered).
+        meta.json: {"generation", "schema_version", "count", "last_id", "columns": {question id: answer type},
+        "choices": {question id: [choice id, ...]}}
+    the matrix is built on the first read and extended with the responses sent since on the following ones: only
+    responses with an id above last_id are queried and appended to the files. it is rebuilt into a new generation
+    when the form's schema_version changed or responses up to last_id were deleted (or archived).
+    the meta file is replaced after the columns are appended, so a reader only maps `count` rows of the files.
+"""
+
+import fcntl, json, math, os, uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import router
+from .models import Question, Choices, Response, MultipleChoiceAnswer, NumberFieldAnswer
+from .utils import QuestionTypes
+
+COLUMN_TYPES = {QuestionTypes.MultipleChoice: 'int32', QuestionTypes.Number: 'float64'}
+ANSWER_MODELS = {QuestionTypes.MultipleChoice: MultipleChoiceAnswer, QuestionTypes.Number: NumberFieldAnswer}
+
+
+def matrix_dir():
+    return getattr(settings, 'RESPONSE_MATRIX_DIR', settings.BASE_DIR / 'matrix')
+
+
+def form_matrix_dir(form):
+    # form ids are only unique per database (shard), so the database is part of the path.
+    return os.path.join(matrix_dir(), router.db_for_write(type(form), instance=form), str(form.id))
+
+
+def _path(directory, meta, name):
+    return os.path.join(directory, f'{meta["generation"]}.{name}')
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as meta_file:
+            return json.load(meta_file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(directory, meta):
+    path = os.path.join(directory, 'meta.json')
+    with open(f'{path}.tmp', 'w') as meta_file:
+        json.dump(meta, meta_file)
+        meta_file.flush()
+        os.fsync(meta_file.fileno())
+    os.replace(f'{path}.tmp', path)
+
+
+@contextmanager
+def _locked(directory):
+    """
+        one writer per form matrix, across processes.
+    """
+    with open(os.path.join(directory, 'lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _files(meta):
+    return {'ids': 'int64', **{f'q{question_id}': COLUMN_TYPES[answer_type]
+                               for question_id, answer_type in meta['columns'].items()}}
+
+
+def _is_current(form, meta):
+    if meta is None or meta['schema_version'] != form.schema_version:
+        return False
+    return Response.objects.filter(related_form_id=form.id, id__lte=meta['last_id']).count() == meta['count']
+
+
+def _build(form, directory, old_meta):
+    columns = dict(Question.objects.filter(form_id=form.id, answer_type__in=COLUMN_TYPES).values_list(
+        'id', 'answer_type'))
+    meta = {'generation': uuid.uuid4().hex, 'schema_version': form.schema_version, 'count': 0, 'last_id': 0,
+            'columns': {str(question_id): answer_type for question_id, answer_type in columns.items()},
+            'choices': {str(question_id): [] for question_id, answer_type in columns.items()
+                        if answer_type == QuestionTypes.MultipleChoice}}
+    for name in _files(meta):
+        open(_path(directory, meta, name), 'wb').close()
+    meta = _extend(form, directory, meta)
+    # _extend only writes the meta when there were responses.
+    _write_meta(directory, meta)
+
+    if old_meta is not None:
+        # readers which mapped the old generation keep their mappings after the files are removed.
+        for name in _files(old_meta):
+            try:
+                os.remove(_path(directory, old_meta, name))
+            except FileNotFoundError:
+                pass
+    return meta
+
+
+def _extend(form, directory, meta):
+    """
+        appends the responses with an id above meta's last_id to the columns and returns the new meta.
+    """
+    import numpy
+
+    ids = numpy.fromiter(Response.objects.filter(related_form_id=form.id, id__gt=meta['last_id']).order_by(
+        'id').values_list('id', flat=True).iterator(), dtype=numpy.int64)
+    if not ids.size:
+        return meta
+
+    meta = {**meta, 'choices': {question_id: list(choices) for question_id, choices in meta['choices'].items()}}
+    # choices added since the last extension get the next codes, the codes of the others do not change.
+    for question_id, choice_id in Choices.objects.filter(related_question_id__in=list(meta['choices'])).order_by(
+            'id').values_list('related_question_id', 'id'):
+        if choice_id not in meta['choices'][str(question_id)]:
+            meta['choices'][str(question_id)].append(choice_id)
+
+    columns = {}
+    for question_id, answer_type in meta['columns'].items():
+        if answer_type == QuestionTypes.MultipleChoice:
+            columns[question_id] = numpy.zeros(ids.size, dtype=numpy.int32)
+        else:
+            columns[question_id] = numpy.full(ids.size, numpy.nan, dtype=numpy.float64)
+
+    for answer_type, model in ANSWER_MODELS.items():
+        question_ids = [int(question_id) for question_id, column_type in meta['columns'].items()
+                        if column_type == answer_type]
+        if not question_ids:
+            continue
+        # responses sent after the ids were read are left for the next extension.
+        answers = model.objects.filter(related_question_id__in=question_ids, related_response_id__gte=ids[0],
+                                       related_response_id__lte=ids[-1])
+        for question_id in question_ids:
+            rows = numpy.array(list(answers.filter(related_question_id=question_id).values_list(
+                'related_response_id', 'answer_field').iterator()), dtype=numpy.int64).reshape(-1, 2)
+            if not rows.size:
+                continue
+            row_index = numpy.searchsorted(ids, rows[:, 0])
+            column = columns[str(question_id)]
+            if answer_type == QuestionTypes.MultipleChoice:
+                choice_ids = numpy.array(meta['choices'][str(question_id)], dtype=numpy.int64)
+                order = numpy.argsort(choice_ids)
+                codes = order[numpy.searchsorted(choice_ids, rows[:, 1], sorter=order)] + 1
+                column[row_index] = codes
+            else:
+                column[row_index] = rows[:, 1]
+
+    arrays = {'ids': ids, **{f'q{question_id}': column for question_id, column in columns.items()}}
+    for name, dtype in _files(meta).items():
+        with open(_path(directory, meta, name), 'r+b') as column_file:
+            # bytes past `count` rows were appended by an interrupted extension.
+            column_file.truncate(meta['count'] * numpy.dtype(dtype).itemsize)
+            column_file.seek(0, os.SEEK_END)
+            column_file.write(arrays[name].astype(dtype).tobytes())
+            column_file.flush()
+            os.fsync(column_file.fileno())
+
+    meta = {**meta, 'count': meta['count'] + int(ids.size), 'last_id': int(ids[-1])}
+    _write_meta(directory, meta)
+    return meta
+
+
+def as_list(table):
+    """
+        a table of `ResponseMatrix.counts` or `.stats` as nested lists for json, nan as None.
+    """
+    if table.ndim > 1:
+        return [as_list(row) for row in table]
+    return [None if isinstance(value, float) and math.isnan(value) else value for value in table.tolist()]
+
+
+class ResponseMatrix:
+    """
+        a form's matrix as returned by `load`. ids and columns ({question id: array}) are read only memory maps;
+        choices is {question id: [choice id, ...]} where the choice id of code i is at index i - 1.
+    """
+
+    def __init__(self, directory, meta):
+        import numpy
+
+        self.count = meta['count']
+        self.choices = {int(question_id): choices for question_id, choices in meta['choices'].items()}
+        arrays = {}
+        for name, dtype in _files(meta).items():
+            if self.count:
+                arrays[name] = numpy.memmap(_path(directory, meta, name), dtype=dtype, mode='r', shape=(self.count,))
+            else:
+                arrays[name] = numpy.empty(0, dtype=dtype)
+        self.ids = arrays['ids']
+        self.columns = {int(question_id): arrays[f'q{question_id}'] for question_id in meta['columns']}
+
+    def is_categorical(self, question_id):
+        return question_id in self.choices
+
+    def is_numeric(self, question_id):
+        return question_id in self.columns and question_id not in self.choices
+
+    def groups(self, rows, columns=None):
+        """
+            (group of every response, shape of the table) for grouping by the codes of the rows question,
+            and of the columns question if given.
+        """
+        import numpy
+
+        groups = self.columns[rows].astype(numpy.int64)
+        shape = (len(self.choices[rows]) + 1,)
+        if columns is not None:
+            width = len(self.choices[columns]) + 1
+            groups = groups * width + self.columns[columns]
+            shape += (width,)
+        return groups, shape
+
+    def counts(self, rows, columns=None):
+        """
+            the contingency table (number of responses per code of rows, x code of columns).
+        """
+        import numpy
+
+        groups, shape = self.groups(rows, columns)
+        return numpy.bincount(groups, minlength=int(numpy.prod(shape))).reshape(shape)
+
+    def stats(self, values, rows, columns=None):
+        """
+            {count, mean, std, min, max} tables of the answers to the number question values, grouped like `counts`.
+            groups without answers have a nan mean, std, min and max.
+        """
+        import numpy
+
+        groups, shape = self.groups(rows, columns)
+        size = int(numpy.prod(shape))
+        numbers = numpy.asarray(self.columns[values])
+        answered = ~numpy.isnan(numbers)
+        groups, numbers = groups[answered], numbers[answered]
+
+        count = numpy.bincount(groups, minlength=size)
+        total = numpy.bincount(groups, weights=numbers, minlength=size)
+        squares = numpy.bincount(groups, weights=numbers * numbers, minlength=size)
+        minimum = numpy.full(size, numpy.inf)
+        maximum = numpy.full(size, -numpy.inf)
+        numpy.minimum.at(minimum, groups, numbers)
+        numpy.maximum.at(maximum, groups, numbers)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            mean = total / count
+            std = numpy.sqrt(numpy.maximum(squares / count - mean * mean, 0))
+        empty = count == 0
+        minimum[empty], maximum[empty] = numpy.nan, numpy.nan
+        return {name: table.reshape(shape) for name, table in
+                (('count', count), ('mean', mean), ('std', std), ('min', minimum), ('max', maximum))}
+
+
+def load(form):
+    """
+        the up to date matrix of the form's live responses, built or extended first if needed.
+    """
+    directory = form_matrix_dir(form)
+    os.makedirs(directory, exist_ok=True)
+    with _locked(directory):
+        meta = _read_meta(directory)
+        if _is_current(form, meta):
+            meta = _extend(form, directory, meta)
+        else:
+            meta = _build(form, directory, meta)
+        # mapped while locked, so a concurrent rebuild can not remove the files in between.
+        return ResponseMatrix(directory, meta)
@@ -0,0 +1,147 @@
+import cProfile, json, os, time
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.urls import Resolver404, resolve
+from django.utils.text import slugify
+from rest_framework.exceptions import AuthenticationFailed
+from accounts.authentication import CachedTokenAuthentication
+from config.sharding import shard_for_form, use_shard
+from .models import Form
+
+
+class SlowRequestProfilerMiddleware:
+    """
+        **opt-in profiler for slow requests.**
+        whenever REQUEST_PROFILING is enabled, requests sent by a staff user or by the owner of the form in the url
+        run under cProfile; the caller is resolved before the view runs, so no other request pays for the profiler.
+        if a profiled request takes longer than REQUEST_PROFILING_THRESHOLD_MS, the profile is dumped into
+        REQUEST_PROFILING_DIR.
+        the directory is a ring buffer: only the newest REQUEST_PROFILING_MAX_FILES profiles are kept.
+        captured profiles can be listed and summarized with `manage.py profiles`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'REQUEST_PROFILING', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        user = self.allowed_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active in this thread, so just serve the request.
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= getattr(settings, 'REQUEST_PROFILING_THRESHOLD_MS', 500):
+            self.store(profiler, request, user, response, elapsed_ms)
+        return response
+
+    @staticmethod
+    def caller(request):
+        """
+            the user sending the request, before the view runs: the session user or the owner of the token in the
+            Authorization header (a cached lookup, see accounts.authentication).
+        """
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user
+        try:
+            authenticated = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        return authenticated[0] if authenticated else None
+
+    @classmethod
+    def allowed_user(cls, request):
+        """
+            the caller if it may be profiled: staff users and the owner of the requested form, None otherwise.
+            anonymous requests are answered without a query.
+        """
+        user = cls.caller(request)
+        if user is None:
+            return None
+        if user.is_staff:
+            return user
+
+        try:
+            slug = resolve(request.path_info).kwargs.get('slug')
+        except Resolver404:
+            return None
+        business = getattr(user, 'business', None)
+        if slug is None or business is None:
+            return None
+        with use_shard(shard_for_form(slug)):
+            return user if Form.objects.filter(slug__exact=slug, business_id=business.pk).exists() else None
+
+    @staticmethod
+    def store(profiler, request, user, response, elapsed_ms):
+        directory = profiles_dir()
+        os.makedirs(directory, exist_ok=True)
+
+        name = f"{time.time_ns()}-{request.method.lower()}-{slugify(request.path)[:64] or 'root'}"
+        profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+        with open(os.path.join(directory, f'{name}.json'), 'w') as meta_file:
+            json.dump({
+                'method': request.method,
+                'path': request.path,
+                'user': user.username,
+                'status': response.status_code,
+                'elapsed_ms': round(elapsed_ms, 2),
+                'captured_at': time.time(),
+            }, meta_file)
+
+        max_files = getattr(settings, 'REQUEST_PROFILING_MAX_FILES', 50)
+        for stale in captured_profiles()[max_files:]:
+            for extension in ('prof', 'json'):
+                try:
+                    os.remove(os.path.join(directory, f'{stale}.{extension}'))
+                except FileNotFoundError:
+                    pass
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+        **gzip content-encoding for clients sending `Accept-Encoding: gzip`.**
+        streamed responses (exports, the listing of all responses of a form) are compressed chunk by chunk while
+        they are sent, so nothing is buffered for the compression. bodies in formats which are compressed already
+        (xlsx files are zip archives) are sent as they are.
+    """
+    compressed_types = ('application/vnd.openxmlformats-', 'application/zip', 'application/gzip', 'image/',
+                        'video/', 'audio/')
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith(self.compressed_types):
+            return response
+        return super().process_response(request, response)
+
+
+def profiles_dir():
+    return getattr(settings, 'REQUEST_PROFILING_DIR', settings.BASE_DIR / 'profiles')
+
+
+def captured_profiles():
+    """
+        names of the captured profiles (without extension), newest first.
+    """
+    try:
+        files = os.listdir(profiles_dir())
+    except FileNotFoundError:
+        return []
+    names = {file[:-len('.prof')] for file in files if file.endswith('.prof')}
+    return sorted(names, key=lambda name: int(name.split('-', 1)[0]), reverse=True)
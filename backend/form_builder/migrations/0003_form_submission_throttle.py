@@ -0,0 +1,23 @@
+# Generated by Django 3.2.9 on 2026-10-19 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0002_response_sent_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='submission_burst',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='submission_refill_rate',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
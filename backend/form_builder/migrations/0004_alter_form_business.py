@@ -0,0 +1,20 @@
+# Generated by Django 3.2.9 on 2026-10-19 09:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_shardassignment'),
+        ('form_builder', '0003_form_submission_throttle'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='form',
+            name='business',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='forms', to='accounts.business'),
+        ),
+    ]
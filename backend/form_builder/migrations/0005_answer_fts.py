@@ -0,0 +1,41 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:12
+
+from django.db import migrations, OperationalError
+
+FTS_TABLE = 'form_builder_answer_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    # sqlite only; other databases search with icontains scans (see form_builder.search).
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                              f"answer, response_id UNINDEXED, form_id UNINDEXED, question_id UNINDEXED, "
+                              f"tokenize = 'unicode61 remove_diacritics 2')")
+    except OperationalError:
+        # sqlite was built without FTS5.
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for table in ('form_builder_shortanswer', 'form_builder_longanswer'):
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (answer, response_id, form_id, question_id) "
+                           f"SELECT a.answer_field, a.related_response_id, q.form_id, a.related_question_id "
+                           f"FROM {table} a JOIN form_builder_question q ON q.id = a.related_question_id "
+                           f"WHERE a.answer_field IS NOT NULL AND a.answer_field != ''")
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0004_alter_form_business'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0005_answer_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailfieldanswer',
+            index=models.Index(fields=['related_question', 'answer_field'], name='form_builde_related_72db9b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='multiplechoiceanswer',
+            index=models.Index(fields=['related_question', 'answer_field'], name='form_builde_related_1c507f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='numberfieldanswer',
+            index=models.Index(fields=['related_question', 'answer_field'], name='form_builde_related_fce15d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phonenumberfieldanswer',
+            index=models.Index(fields=['related_question', 'answer_field'], name='form_builde_related_c8ac23_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shortanswer',
+            index=models.Index(fields=['related_question', 'answer_field'], name='form_builde_related_e0786f_idx'),
+        ),
+    ]
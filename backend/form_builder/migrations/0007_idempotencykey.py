@@ -0,0 +1,29 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:04
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0006_answer_value_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=128)),
+                ('status_code', models.PositiveSmallIntegerField(null=True)),
+                ('response_body', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('form', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to='form_builder.form')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('form', 'key'), name='unique_idempotency_key_per_form')],
+            },
+        ),
+    ]
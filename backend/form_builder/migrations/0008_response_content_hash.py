@@ -0,0 +1,37 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='duplicate_policy',
+            field=models.CharField(choices=[('allow', 'ALLOW'), ('flag', 'FLAG'), ('reject', 'REJECT')], default='allow', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='duplicate_window',
+            field=models.PositiveIntegerField(blank=True, default=86400, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='is_duplicate',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['related_form', 'content_hash', 'sent_date'], name='form_builde_related_3a7748_idx'),
+        ),
+    ]
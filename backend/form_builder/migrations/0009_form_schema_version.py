@@ -0,0 +1,23 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0008_response_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='schema_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='updated_date',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
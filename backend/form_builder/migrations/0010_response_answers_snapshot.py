@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0009_form_schema_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='answers_snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
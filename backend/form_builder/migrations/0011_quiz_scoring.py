@@ -0,0 +1,33 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0010_response_answers_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choices',
+            name='is_correct',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answer_key',
+            field=models.CharField(blank=True, max_length=256, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='points',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0011_quiz_scoring'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='deleted_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='is_deleted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='response',
+            name='related_form',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='form_builder.form'),
+        ),
+    ]
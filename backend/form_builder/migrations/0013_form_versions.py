@@ -0,0 +1,32 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0012_form_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='form_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='FormVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('questions', models.JSONField()),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('form', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='form_builder.form')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('form', 'version'), name='unique_version_per_form')],
+            },
+        ),
+    ]
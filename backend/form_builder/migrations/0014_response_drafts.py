@@ -0,0 +1,29 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0013_form_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseDraft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('answers', models.JSONField(default=list)),
+                ('owner_email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('form_version', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_date', models.DateTimeField(db_index=True)),
+                ('form', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drafts', to='form_builder.form')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('form', 'token'), name='unique_draft_token_per_form')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.9 on 2026-10-19 10:31
+
+import form_builder.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0014_response_drafts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='longanswer',
+            name='answer_field',
+            field=form_builder.fields.CompressedTextField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-19 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('form_builder', '0015_compressed_long_answers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='responses_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,12 +1,24 @@
+from itertools import islice
 from django.db import models, IntegrityError
 from django.utils.text import slugify
 from django.utils.timezone import timezone
 from django.db.models import F
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import ValidationError
 from accounts.models import Business
+from .fields import CompressedTextField
 from .utils import PhoneNumberValidator, QuestionTypes
 
 
+class LiveFormManager(models.Manager):
+    """
+        the forms which are not deleted. deleted forms stay until they are purged, see form_builder.purge
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class Form(models.Model):
     """
         a db table includes a business as foreignkey and some other details.
@@ -16,9 +28,20 @@ class Form(models.Model):
         slug : [unique, auto-generated] is being used for lookup_field to view each form and is auto generated.
         form_template: [restricted with defined choices] for specifying a form template and visuals.
         created_date: [auto-generated] is being set, whenever a form instance is created.
+        updated_date: [auto-generated] is being set, whenever a form instance is saved.
         owner_is_anonymous: [boolean] if true whoever fills this form, can do it anonymously; otherwise has to enter
         their email.
         is_closed: [boolean, default=false] if a form is closed, it will not accept any responses.
+        submission_burst, submission_refill_rate: [nullable] token bucket limits of this form's submissions
+        (bucket size and tokens per second). FORM_SUBMISSION_THROTTLE['form'] is used if they are null.
+        duplicate_policy: [restricted with defined choices] what happens to a response with the same answers as
+        another response of this form sent within duplicate_window seconds (null: at any time).
+        see form_builder.duplicates
+        schema_version: [auto-incremented] is increased whenever the form is changed, see form_builder.conditional
+        responses_version: [auto-incremented] is increased whenever responses of the form are edited after their
+        submission (their answers or owner_email), see form_builder.conditional
+        is_deleted: [boolean, default=false] deleted forms are hidden from Form.objects (use Form.all_objects) until
+        their rows are purged. deleted_date: [nullable] when the form was deleted. see form_builder.purge
     """
 
     class FormTemplates(models.TextChoices):
@@ -30,14 +53,36 @@ class Form(models.Model):
         QUIZ = 'quiz', "QUIZ"
         REGISTRATION = 'registration', "REGISTRATION"
 
+    class DuplicatePolicies(models.TextChoices):
+        """
+            allow: duplicates are saved as usual. flag: they are saved with is_duplicate set. reject: not saved.
+        """
+        ALLOW = 'allow', "ALLOW"
+        FLAG = 'flag', "FLAG"
+        REJECT = 'reject', "REJECT"
+
     title = models.CharField(max_length=128, default='Untitled Form')
     description = models.TextField()
-    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='forms')
+    # no database constraint: with sharding the form may live on another database than its business.
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='forms', db_constraint=False)
     slug = models.SlugField(max_length=256, unique=True)
     form_template = models.CharField(max_length=16, choices=FormTemplates.choices, default=FormTemplates.BLANK)
     created_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
     owner_is_anonymous = models.BooleanField(default=True)
     is_closed = models.BooleanField(default=False)
+    submission_burst = models.PositiveIntegerField(null=True, blank=True)
+    submission_refill_rate = models.FloatField(null=True, blank=True)
+    duplicate_policy = models.CharField(max_length=8, choices=DuplicatePolicies.choices,
+                                        default=DuplicatePolicies.ALLOW)
+    duplicate_window = models.PositiveIntegerField(null=True, blank=True, default=24 * 60 * 60)
+    schema_version = models.PositiveIntegerField(default=1)
+    responses_version = models.PositiveIntegerField(default=0)
+    is_deleted = models.BooleanField(default=False)
+    deleted_date = models.DateTimeField(null=True, blank=True)
+
+    objects = LiveFormManager()
+    all_objects = models.Manager()
 
     @property
     def question_bodies(self):
@@ -78,12 +123,17 @@ class Question(models.Model):
         form: [foreignkey] each question belongs to a form.
         question_body: the question text.
         related_image: [nullable] each question can have a attached image.
+        points: [default=0] what a correct answer is worth in a quiz, see form_builder.quiz
+        answer_key: [nullable] the correct answer of a non multiple choice quiz question; the correct choices of
+        multiple choice questions are marked with Choices.is_correct instead.
     """
     answer_type = models.CharField(max_length=20, choices=QuestionTypes.choices)
     is_required = models.BooleanField(default=False)
     form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='questions')
     question_body = models.CharField(max_length=256)
     related_image = models.ImageField(null=True, blank=True, upload_to='media/question_related_images')
+    points = models.PositiveIntegerField(default=0)
+    answer_key = models.CharField(max_length=256, null=True, blank=True)
 
     def __str__(self):
         return self.question_body
@@ -111,9 +161,14 @@ class Question(models.Model):
                         if delete_tag:
                             self.choices.get(title__exact=choice['title']).delete()
 
+                        elif 'is_correct' in choice and self.choices.filter(title__exact=choice['title']).exists():
+                            # marking an existing choice (in)correct, e.g. when the quiz key is edited.
+                            self.choices.filter(title__exact=choice['title']).update(is_correct=choice['is_correct'])
+
                         else:
                             try:
-                                Choices.objects.create(title=choice['title'], related_question=self)
+                                Choices.objects.create(title=choice['title'], related_question=self,
+                                                       is_correct=choice.get('is_correct', False))
                             except Exception as error:
                                 raise ValidationError({"error": error})
                 else:
@@ -125,9 +180,21 @@ class Question(models.Model):
 
 
 class Response(models.Model):
-    related_form = models.ForeignKey(Form, on_delete=models.SET('deleted-form'), related_name='responses')
+    related_form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='responses')
     owner_email = models.EmailField(null=True)
     sent_date = models.DateTimeField(auto_now_add=True)
+    # normalized hash of the answers, empty for responses sent before it was introduced.
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    is_duplicate = models.BooleanField(default=False)
+    # [[question id, answer], ...] of the answers, written with them; see form_builder.snapshots
+    answers_snapshot = models.JSONField(null=True, blank=True)
+    # points scored, for responses of quiz forms.
+    score = models.FloatField(null=True, blank=True)
+    # the form's schema_version the response was submitted against, see form_builder.versions
+    form_version = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['related_form', 'content_hash', 'sent_date'])]
 
     @property
     def all_answers(self):
@@ -161,6 +228,81 @@ class Response(models.Model):
                                          answer=F('answer_field'))
         return longs.union(shorts, multi_choices, emails, phone_nums, nums, files)
 
+    @property
+    def answers(self):
+        """
+            the answers in the all_answers format, read from the snapshot if there is one.
+        """
+        if self.answers_snapshot is None:
+            return Response.answers_from_tables([self.id])[self.id]
+        return Response.expand_snapshots({self.id: self.answers_snapshot})[self.id]
+
+    @staticmethod
+    def expand_snapshots(snapshots):
+        """
+            snapshots: dict of response id -> answers_snapshot. returns a dict of response id -> list of answers,
+            the question bodies and types are loaded in one query.
+        """
+        question_ids = {question_id for snapshot in snapshots.values() for question_id, _ in snapshot}
+        questions = {question_id: (body, answer_type) for question_id, body, answer_type in
+                     Question.objects.filter(id__in=question_ids).values_list('id', 'question_body', 'answer_type')}
+        return {response_id: [{'question_id': question_id, 'question': questions[question_id][0],
+                               'answer_type': questions[question_id][1], 'answer': answer}
+                              for question_id, answer in snapshot if question_id in questions]
+                for response_id, snapshot in snapshots.items()}
+
+    @staticmethod
+    def answers_of(response_ids):
+        """
+            the answers of many responses at once, in the all_answers format.
+            returns a dict of response id -> list of answers. the answers are read from the snapshots, only
+            responses without one (sent before snapshots and not backfilled yet) are read from the answer tables.
+        """
+        snapshots = dict(Response.objects.filter(id__in=response_ids, answers_snapshot__isnull=False).values_list(
+            'id', 'answers_snapshot'))
+        answers = Response.expand_snapshots(snapshots)
+        missing = [response_id for response_id in response_ids if response_id not in answers]
+        if missing:
+            answers.update(Response.answers_from_tables(missing))
+        return answers
+
+    @staticmethod
+    def answers_from_tables(response_ids):
+        """
+            the answers of many responses at once (one query per answer table), in the all_answers format.
+            returns a dict of response id -> list of answers.
+        """
+        answers = {response_id: [] for response_id in response_ids}
+        relations = ((LongAnswer, 'answer_field'), (ShortAnswer, 'answer_field'),
+                     (MultipleChoiceAnswer, 'answer_field__title'), (EmailFieldAnswer, 'answer_field'),
+                     (PhoneNumberFieldAnswer, 'answer_field'), (NumberFieldAnswer, 'answer_field'),
+                     (FileFieldAnswer, 'answer_field'))
+        for model, answer in relations:
+            rows = model.objects.filter(related_response_id__in=response_ids).values(
+                'related_response_id',
+                question_id=F('related_question_id'),
+                question=F('related_question__question_body'),
+                answer_type=F('related_question__answer_type'),
+                answer=F(answer))
+            for row in rows:
+                answers[row.pop('related_response_id')].append(row)
+        return answers
+
+    @staticmethod
+    def iter_with_answers(responses, chunk_size=500):
+        """
+            responses: response dicts (with an id), e.g. a values() queryset.
+            yields them with their all_answers, loading the answers chunk by chunk with answers_of.
+        """
+        responses = iter(responses)
+        while True:
+            chunk = list(islice(responses, chunk_size))
+            if not chunk:
+                return
+            answers = Response.answers_of([response['id'] for response in chunk])
+            for response in chunk:
+                yield {**response, 'all_answers': answers[response['id']]}
+
     @property
     def all_answered_questions_id(self):
         return self.all_answers.values_list('question', flat=True)
@@ -174,6 +316,67 @@ class Response(models.Model):
         return f"{self.owner_email}"
 
 
+class FormVersion(models.Model):
+    """
+        an immutable snapshot of the questions (with their choices) of a form, published whenever its
+        schema_version changes. see form_builder.versions
+        version: the form's schema_version when it was published.
+        questions: the questions payload of form_builder.readers, including the quiz answer keys.
+    """
+    form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='versions')
+    version = models.PositiveIntegerField()
+    questions = models.JSONField()
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['form', 'version'], name='unique_version_per_form')]
+
+    def __str__(self):
+        return f'{self.form_id} v{self.version}'
+
+
+class IdempotencyKey(models.Model):
+    """
+        the result of a response submission, stored under the Idempotency-Key header the client sent with it.
+        retries with the same key get the stored result instead of submitting again. see form_builder.idempotency
+        status_code: [nullable] null while the first request is still being processed.
+        created_date: [auto-generated] keys expire IDEMPOTENCY_KEY_TTL seconds after this.
+    """
+    form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=128)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_date = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['form', 'key'], name='unique_idempotency_key_per_form')]
+
+    def __str__(self):
+        return self.key
+
+
+class ResponseDraft(models.Model):
+    """
+        the partial answers of a respondent, autosaved under a token the client generates, until they are submitted.
+        see form_builder.drafts
+        answers: [{"related_question": ..., "answer_field": ...}, ...] as sent by the client.
+        form_version: the form's schema_version when the draft was last saved.
+        updated_date: drafts expire RESPONSE_DRAFT_TTL seconds after this.
+    """
+    form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='drafts')
+    token = models.CharField(max_length=64)
+    answers = models.JSONField(default=list)
+    owner_email = models.EmailField(null=True, blank=True)
+    form_version = models.PositiveIntegerField(null=True, blank=True)
+    updated_date = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['form', 'token'], name='unique_draft_token_per_form')]
+
+    def __str__(self):
+        return self.token
+
+
 class Answer(models.Model):
 
     def save(self, *args, **kwargs):
@@ -182,6 +385,9 @@ class Answer(models.Model):
         return super().save(*args, **kwargs)
 
     def is_valid(self):
+        if self.pk is not None and type(self).objects.filter(pk=self.pk,
+                                                             related_question_id=self.related_question_id).exists():
+            return True  # an edit of this answer (e.g. in the admin), not another answer to its question
         if self.related_question.id in self.related_response.all_answered_questions_id:
             return False  # it has been answered before in this response
         return True
@@ -193,7 +399,7 @@ class Answer(models.Model):
 class LongAnswer(Answer):
     related_question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='long_answers')
     related_response = models.ForeignKey(Response, on_delete=models.CASCADE, related_name='long_answers')
-    answer_field = models.TextField(null=True)
+    answer_field = CompressedTextField(null=True)
 
     def save(self, *args, **kwargs):
         if self.is_valid():
@@ -212,6 +418,10 @@ class ShortAnswer(Answer):
     related_response = models.ForeignKey(Response, on_delete=models.CASCADE, related_name='short_answers')
     answer_field = models.CharField(max_length=256, null=True)
 
+    class Meta:
+        # response filters look answers up by (question, value), see form_builder.filters
+        indexes = [models.Index(fields=['related_question', 'answer_field'])]
+
     def save(self, *args, **kwargs):
         if self.is_valid():
             if self.related_question.answer_type != QuestionTypes.Short:
@@ -230,6 +440,7 @@ class Choices(models.Model):
     related_question = models.ForeignKey(Question,
                                          on_delete=models.CASCADE,
                                          related_name='choices', null=True)
+    is_correct = models.BooleanField(default=False)
 
     def save(self, *args, **kwargs):
         if self.related_question.answer_type != QuestionTypes.MultipleChoice:
@@ -249,6 +460,10 @@ class MultipleChoiceAnswer(Answer):
     related_response = models.ForeignKey(Response, on_delete=models.CASCADE, related_name='multichoice_answers')
     answer_field = models.ForeignKey(Choices, on_delete=models.CASCADE, related_name='related_answers')
 
+    class Meta:
+        # response filters look answers up by (question, value), see form_builder.filters
+        indexes = [models.Index(fields=['related_question', 'answer_field'])]
+
     def save(self, *args, **kwargs):
         if self.is_valid():
             if not self.related_question.choices.filter(title__exact=self.answer_field).exists():
@@ -274,6 +489,10 @@ class EmailFieldAnswer(Answer):
     related_response = models.ForeignKey(Response, on_delete=models.CASCADE, related_name='email_answers')
     answer_field = models.EmailField(null=True)
 
+    class Meta:
+        # response filters look answers up by (question, value), see form_builder.filters
+        indexes = [models.Index(fields=['related_question', 'answer_field'])]
+
     def save(self, *args, **kwargs):
         if self.is_valid():
             if self.related_question.answer_type != QuestionTypes.Email:
@@ -291,6 +510,10 @@ class PhoneNumberFieldAnswer(Answer):
     related_response = models.ForeignKey(Response, on_delete=models.CASCADE, related_name='phonenum_answers')
     answer_field = models.CharField(validators=[PhoneNumberValidator.phone_regex], max_length=17, null=True)
 
+    class Meta:
+        # response filters look answers up by (question, value), see form_builder.filters
+        indexes = [models.Index(fields=['related_question', 'answer_field'])]
+
     def save(self, *args, **kwargs):
         if self.is_valid():
             if self.related_question.answer_type != QuestionTypes.Phone_Number:
@@ -308,6 +531,10 @@ class NumberFieldAnswer(Answer):
     related_response = models.ForeignKey(Response, on_delete=models.CASCADE, related_name='number_answers')
     answer_field = models.BigIntegerField(null=True)
 
+    class Meta:
+        # response filters look answers up by (question, value), see form_builder.filters
+        indexes = [models.Index(fields=['related_question', 'answer_field'])]
+
     def save(self, *args, **kwargs):
         if self.is_valid():
             if self.related_question.answer_type != QuestionTypes.Number:
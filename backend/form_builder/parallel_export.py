@@ -0,0 +1,88 @@
+"""
+    **parallel export of the responses of a form.**
+    the live responses are split into id ranges holding about the same number of responses; a process pool
+    renders each range into a part file (csv or jsonl, the concatenable backends) and the parts are joined in
+    id order after the header and the archived responses. every worker process sets django up and opens its own
+    database connection; processes are spawned, so they do not inherit the connections of the parent.
+    used by `manage.py export_responses` and `manage.py benchmark_export`, not by the web workers.
+"""
+
+import os, shutil, tempfile
+import django
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from django.conf import settings
+from django.db import router
+from config.sharding import use_shard
+from . import exporters
+from .archive import archived_responses
+from .filters import ResponseFilter
+from .models import Form, Response
+
+
+def workers():
+    return getattr(settings, 'EXPORT_WORKERS', None) or os.cpu_count() or 1
+
+
+def id_ranges(responses, parts):
+    """
+        (first id, last id) ranges of the responses queryset, splitting it into at most `parts` ranges with
+        about the same number of responses. one indexed query per boundary.
+    """
+    ids = responses.order_by('id').values_list('id', flat=True)
+    count = ids.count()
+    if not count:
+        return []
+    parts = max(min(parts, count), 1)
+    firsts = [ids[count * part // parts] for part in range(parts)]
+    lasts = [first - 1 for first in firsts[1:]] + [ids.reverse()[0]]
+    return list(zip(firsts, lasts))
+
+
+def render_part(using, form_id, params, export_format, columns, first_id, last_id, path):
+    """
+        renders the responses with first_id <= id <= last_id into the part file at path; runs in a worker.
+    """
+    with use_shard(using):
+        form = Form.objects.get(id=form_id)
+        rows = exporters.rows_of(form, ResponseFilter(form, params), archived=False, id_range=(first_id, last_id))
+        with open(path, 'wb') as part:
+            exporters.get_exporter(export_format, columns).write(rows, part, header=False, footer=False)
+    return path
+
+
+def export(form, export_format, stream, params=None, worker_count=None, parts=None):
+    """
+        writes the export of the form (archived responses only without filters, like the export view) to the
+        binary stream. with a single worker the parts are rendered in this process.
+    """
+    params = params or {}
+    exporter = exporters.get_exporter(export_format, exporters.columns_of(form))
+    if not exporter.concatenable:
+        raise ValueError(f'{export_format} exports can not be rendered in parts.')
+
+    worker_count = worker_count or workers()
+    response_filter = ResponseFilter(form, params)
+    ranges = id_ranges(response_filter.apply(form.responses.all()), parts or worker_count * 4)
+    using = router.db_for_read(Response)
+
+    archived = () if response_filter else map(exporters.flatten, archived_responses(form))
+    exporter.write(archived, stream, footer=False)
+
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = [(using, form.id, params, export_format, exporter.columns, first_id, last_id,
+                 os.path.join(directory, f'{index:06}.part')) for index, (first_id, last_id) in enumerate(ranges)]
+        if worker_count == 1:
+            paths = [render_part(*job) for job in jobs]
+        else:
+            # the workers inherit DJANGO_SETTINGS_MODULE; django is set up before render_part (and the models it
+            # imports) is unpickled.
+            with ProcessPoolExecutor(worker_count, mp_context=get_context('spawn'),
+                                     initializer=django.setup) as pool:
+                paths = list(pool.map(render_part, *zip(*jobs))) if jobs else []
+
+        for path in paths:
+            with open(path, 'rb') as part:
+                shutil.copyfileobj(part, stream)
+
+    exporter.write((), stream, header=False)
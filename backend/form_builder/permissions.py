@@ -1,9 +1,24 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
 
+def business_of(user):
+    """
+        the business of the user, None for anonymous users and users without a business.
+        with accounts.authentication.CachedTokenAuthentication the business is already cached on the user.
+    """
+    if not user.is_authenticated:
+        return None
+    return getattr(user, 'business', None)
+
+
+def is_form_owner(user, form):
+    business = business_of(user)
+    return business is not None and form.business_id == business.pk
+
+
 class IsFormOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.related_form.business.user == request.user
+        return is_form_owner(request.user, obj.related_form)
 
 
 class IsFormOwnerOrReadonly(BasePermission):
@@ -11,4 +26,4 @@ class IsFormOwnerOrReadonly(BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        return obj.business.user == request.user
+        return is_form_owner(request.user, obj)
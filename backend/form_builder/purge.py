@@ -0,0 +1,108 @@
+"""
+    **deletion of forms.**
+    deleting a form only marks it as deleted (`mark_deleted`): one update, after which Form.objects and every
+    view stop seeing it and its slug is free again. its rows are removed afterwards by `purge_form`, in a
+    background thread started when the deletion commits (FORM_PURGE_IN_BACKGROUND) and by
+    `manage.py purge_deleted_forms` for purges which were interrupted or not started.
+    the answers, responses, idempotency keys, versions, drafts, choices and questions are deleted in batches of
+    FORM_PURGE_BATCH_SIZE rows with plain DELETE ... WHERE id IN (...) statements (no collector, no signals), each
+    batch in its own short transaction, and the form row goes last. the uploaded files, search index entries,
+    archive and response matrix of the form are removed too.
+"""
+
+import shutil, threading
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connections, router, transaction
+from django.db.transaction import atomic
+from django.utils import timezone
+from config.sharding import form_shard_cache_key
+from . import archive, dashboard, matrix, search
+from .filters import ANSWER_MODELS
+from .models import (Form, FormVersion, Question, Choices, Response, ResponseDraft, IdempotencyKey,
+                     FileFieldAnswer)
+
+
+def batch_size():
+    return getattr(settings, 'FORM_PURGE_BATCH_SIZE', 1000)
+
+
+def mark_deleted(form):
+    """
+        hides the form at once and schedules its purge after the transaction commits.
+    """
+    using = router.db_for_write(Form, instance=form)
+    Form.all_objects.using(using).filter(id=form.id).update(
+        is_deleted=True, deleted_date=timezone.now(), slug=f'{form.slug}--deleted-{form.id}'[:256])
+    cache.delete(form_shard_cache_key(form.slug))
+    dashboard.invalidate_on_commit(using, form.business_id)
+    if getattr(settings, 'FORM_PURGE_IN_BACKGROUND', True):
+        transaction.on_commit(partial(purge_in_background, using, form.id), using=using)
+
+
+def purge_in_background(using, form_id):
+    def run():
+        try:
+            purge_form(using, form_id)
+        finally:
+            # the thread's own connections.
+            connections.close_all()
+
+    threading.Thread(target=run, name=f'purge-form-{form_id}', daemon=True).start()
+
+
+def _delete_in_batches(using, queryset, size, files_of=None):
+    """
+        deletes the rows of the queryset, `size` at a time; returns the number of deleted rows.
+        files_of: model field name of uploaded files to remove from the storage after each batch.
+    """
+    deleted = 0
+    while True:
+        if files_of is None:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:size])
+            names = []
+        else:
+            rows = list(queryset.order_by('id').values_list('id', files_of)[:size])
+            ids, names = [row[0] for row in rows], [row[1] for row in rows if row[1]]
+        if not ids:
+            return deleted
+
+        with atomic(using=using):
+            queryset.model._base_manager.using(using).filter(id__in=ids)._raw_delete(using)
+        for name in names:
+            default_storage.delete(name)
+        deleted += len(ids)
+
+
+def purge_form(using, form_id):
+    """
+        removes a deleted form with everything that belongs to it from the database `using`.
+        returns the number of deleted rows, 0 if there is no such deleted form.
+    """
+    form = Form.all_objects.using(using).filter(id=form_id, is_deleted=True).first()
+    if form is None:
+        return 0
+
+    size = batch_size()
+    question_ids = list(Question.objects.using(using).filter(form_id=form_id).values_list('id', flat=True))
+    deleted = 0
+    for model in ANSWER_MODELS.values():
+        deleted += _delete_in_batches(using, model.objects.using(using).filter(related_question_id__in=question_ids),
+                                      size, 'answer_field' if model is FileFieldAnswer else None)
+    deleted += _delete_in_batches(using, Response.objects.using(using).filter(related_form_id=form_id), size)
+    deleted += _delete_in_batches(using, IdempotencyKey.objects.using(using).filter(form_id=form_id), size)
+    deleted += _delete_in_batches(using, FormVersion.objects.using(using).filter(form_id=form_id), size)
+    deleted += _delete_in_batches(using, ResponseDraft.objects.using(using).filter(form_id=form_id), size)
+    deleted += _delete_in_batches(
+        using, Choices.objects.using(using).filter(related_question_id__in=question_ids), size)
+    deleted += _delete_in_batches(
+        using, Question.objects.using(using).filter(form_id=form_id), size, 'related_image')
+
+    search.remove_form(using, form_id)
+    shutil.rmtree(archive.form_archive_dir(form), ignore_errors=True)
+    shutil.rmtree(matrix.form_matrix_dir(form), ignore_errors=True)
+    with atomic(using=using):
+        Form.all_objects.using(using).filter(id=form_id)._raw_delete(using)
+    return deleted + 1
@@ -0,0 +1,131 @@
+"""
+    **grading of quiz responses.**
+    forms with the quiz template are graded: a question with points and an answer key (Question.answer_key, or
+    the choices marked Choices.is_correct for multiple choice questions) adds its points to Response.score when it
+    is answered correctly. answers are compared after trimming, collapsing whitespace and case folding, numbers
+    by value. the key is read from the form's current version (form_builder.versions). responses are scored at
+    submission; `manage.py regrade_quiz` rescores a form after its key changed, with one vectorized pass over the
+    form's response x question matrix.
+"""
+
+import re
+from . import versions
+from .filters import ANSWER_MODELS
+from .models import Form, Response, MultipleChoiceAnswer
+from .utils import QuestionTypes
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def is_quiz(form):
+    return form.form_template == Form.FormTemplates.QUIZ
+
+
+def normalize(answer_type, value):
+    if value is None:
+        return None
+    if answer_type == QuestionTypes.Number:
+        try:
+            return int(str(value).strip())
+        except ValueError:
+            return None
+    return WHITESPACE.sub(' ', str(value)).strip().casefold()
+
+
+def answer_key(form):
+    """
+        {question id: (answer type, points, set of accepted normalized answers)} of the graded questions of the form;
+        the accepted answers of multiple choice questions are the titles of their correct choices.
+        read from the form's current version, see form_builder.versions
+    """
+    key = {}
+    for question in versions.questions(form):
+        answer_type = question['answer_type']
+        if not question['points']:
+            continue
+        if answer_type == QuestionTypes.MultipleChoice:
+            accepted = {normalize(answer_type, choice['title']) for choice in question.get('choices', ())
+                        if choice['is_correct']}
+        elif question['answer_key'] is not None:
+            accepted = {normalize(answer_type, question['answer_key'])} - {None}
+        else:
+            accepted = None
+        if accepted:
+            key[question['id']] = (answer_type, question['points'], accepted)
+    return key
+
+
+def correct_choices(form):
+    """
+        ids of the correct choices of the graded multiple choice questions of the form's current version.
+    """
+    return [choice['id'] for question in versions.questions(form) if question['points']
+            for choice in question.get('choices', ()) if choice['is_correct']]
+
+
+def score(key, snapshot):
+    """
+        the score of a response given its answers snapshot ([[question id, answer], ...]).
+    """
+    total = 0
+    for question_id, answer in snapshot:
+        if question_id in key:
+            answer_type, points, accepted = key[question_id]
+            if normalize(answer_type, answer) in accepted:
+                total += points
+    return float(total)
+
+
+def max_score(key):
+    return float(sum(points for _, points, _ in key.values()))
+
+
+def regrade(form, batch_size=1000):
+    """
+        rescores all (live) responses of the form. the correctness of every answer to a graded question is put
+        into a responses x questions matrix, the scores are the matrix times the points vector.
+        returns the number of responses written.
+    """
+    import numpy
+
+    key = answer_key(form)
+    response_ids = numpy.fromiter(Response.objects.filter(related_form_id=form.id).order_by('id').values_list(
+        'id', flat=True).iterator(), dtype=numpy.int64)
+    if not response_ids.size:
+        return 0
+
+    question_ids = numpy.array(sorted(key), dtype=numpy.int64)
+    points = numpy.array([key[question_id][1] for question_id in question_ids], dtype=numpy.float64)
+    correct = numpy.zeros((response_ids.size, question_ids.size), dtype=bool)
+
+    for answer_type, model in ANSWER_MODELS.items():
+        graded = [question_id for question_id in question_ids.tolist() if key[question_id][0] == answer_type]
+        if not graded:
+            continue
+        answers = model.objects.filter(related_question_id__in=graded)
+        rows = list(answers.values_list('related_response_id', 'related_question_id', 'answer_field').iterator())
+        if not rows:
+            continue
+
+        responses = numpy.array([row[0] for row in rows], dtype=numpy.int64)
+        questions = numpy.array([row[1] for row in rows], dtype=numpy.int64)
+        if model is MultipleChoiceAnswer:
+            is_correct = numpy.isin(numpy.array([row[2] for row in rows], dtype=numpy.int64),
+                                    numpy.array(correct_choices(form), dtype=numpy.int64))
+        elif answer_type == QuestionTypes.Number:
+            expected = {question_id: next(iter(key[question_id][2])) for question_id in graded}
+            is_correct = numpy.array([row[2] for row in rows], dtype=numpy.float64) == numpy.array(
+                [expected[row[1]] for row in rows], dtype=numpy.float64)
+        else:
+            # text answers are normalized in python, the comparison with the key is one lookup per answer.
+            is_correct = numpy.array([normalize(answer_type, row[2]) in key[row[1]][2] for row in rows], dtype=bool)
+
+        row_index = numpy.searchsorted(response_ids, responses)
+        known = (row_index < response_ids.size) & (response_ids[numpy.minimum(row_index, response_ids.size - 1)]
+                                                   == responses)
+        correct[row_index[known], numpy.searchsorted(question_ids, questions[known])] |= is_correct[known]
+
+    scores = correct @ points if question_ids.size else numpy.zeros(response_ids.size)
+    Response.objects.bulk_update([Response(id=response_id, score=response_score) for response_id, response_score
+                                  in zip(response_ids.tolist(), scores.tolist())], ['score'], batch_size=batch_size)
+    return int(response_ids.size)
@@ -0,0 +1,86 @@
+"""
+    **read only payloads of forms, built from values() rows.**
+    the same json as FormSerializer (+ id, slug and is_closed) without instantiating model and serializer field
+    objects per row: one query for the forms, one for their questions and one for the choices, whatever the
+    number of forms. questions without choices do not get a choices key, like the views used to pop them.
+    the quiz answer keys (Question.answer_key, Choices.is_correct) are only included for the form's owner.
+    the forms are rendered from the cached questions of their current version, see form_builder.versions;
+    questions_of builds the questions from the tables when a version is published.
+"""
+
+from django.core.files.storage import default_storage
+from rest_framework.fields import DateTimeField
+from . import versions
+from .models import Question, Choices
+
+FORM_FIELDS = ('id', 'title', 'description', 'form_template', 'owner_is_anonymous', 'created_date', 'slug',
+               'is_closed', 'schema_version')
+QUESTION_FIELDS = ('id', 'form_id', 'answer_type', 'is_required', 'question_body', 'related_image', 'points',
+                   'answer_key')
+
+_datetime = DateTimeField()
+
+
+def questions_of(form_ids):
+    """
+        dict of form id -> questions payload of the form.
+    """
+    questions = list(Question.objects.filter(form_id__in=form_ids).order_by('id').values(*QUESTION_FIELDS))
+    choices = {}
+    for choice in Choices.objects.filter(related_question_id__in=[question['id'] for question in questions]) \
+            .order_by('id').values('id', 'title', 'related_question', 'is_correct'):
+        choices.setdefault(choice['related_question'], []).append(choice)
+
+    payloads = {form_id: [] for form_id in form_ids}
+    for question in questions:
+        payload = {'id': question['id']}
+        if question['id'] in choices:
+            payload['choices'] = choices[question['id']]
+        image = question['related_image']
+        payload.update({
+            'answer_type': question['answer_type'],
+            'is_required': question['is_required'],
+            'question_body': question['question_body'],
+            'related_image': default_storage.url(image) if image else None,
+            'points': question['points'],
+            'answer_key': question['answer_key'],
+        })
+        payloads[question['form_id']].append(payload)
+    return payloads
+
+
+def form_payloads(forms):
+    """
+        forms: a Form queryset. returns the forms in the FormListAPI.list format, in the queryset's order.
+    """
+    rows = list(forms.values(*FORM_FIELDS))
+    questions = versions.questions_of_versions([(row['id'], row['schema_version']) for row in rows])
+    return [{
+        'title': row['title'],
+        'description': row['description'],
+        'form_template': row['form_template'],
+        'questions': questions[row['id']],
+        'owner_is_anonymous': row['owner_is_anonymous'],
+        'created_date': _datetime.to_representation(row['created_date']),
+        'slug': row['slug'],
+        'id': row['id'],
+    } for row in rows]
+
+
+def form_payload(form, with_keys=True):
+    """
+        form: a Form instance. returns the form in the FormRUDAPI.retrieve format.
+        with_keys: whether the quiz answer keys are included, i.e. the form is read by its owner.
+    """
+    questions = versions.questions(form)
+    return {
+        'id': form.id,
+        'title': form.title,
+        'description': form.description,
+        'form_template': form.form_template,
+        'questions': questions if with_keys else versions.strip_keys(questions),
+        'owner_is_anonymous': form.owner_is_anonymous,
+        'created_date': _datetime.to_representation(form.created_date),
+        'slug': form.slug,
+        'is_closed': form.is_closed,
+    }
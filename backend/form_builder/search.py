@@ -0,0 +1,153 @@
+"""
+    **full text search over the text (short and long) answers.**
+    on sqlite the answers are indexed in the form_builder_answer_fts FTS5 table (see migration 0005),
+    which is filled in the submission transaction and can be rebuilt with `manage.py rebuild_search_index`.
+    other databases fall back to icontains scans.
+"""
+
+from django.db import connections
+from django.db.models import Q
+from .fields import MARKER
+from .models import LongAnswer, ShortAnswer
+
+FTS_TABLE = 'form_builder_answer_fts'
+INSERT_SQL = f'INSERT INTO {FTS_TABLE} (answer, response_id, form_id, question_id) VALUES (%s, %s, %s, %s)'
+SNIPPET_TOKENS = 12
+
+_fts_available = {}
+
+
+def fts_available(using):
+    if using not in _fts_available:
+        connection = connections[using]
+        _fts_available[using] = (connection.vendor == 'sqlite'
+                                 and FTS_TABLE in connection.introspection.table_names())
+    return _fts_available[using]
+
+
+def match_expression(term):
+    """
+        every word of the term has to appear; words are quoted, so FTS5 syntax in user input is not interpreted.
+        a trailing * keeps prefix matching for the last word.
+    """
+    words = term.split()
+    if not words:
+        return None
+    prefix = words[-1].endswith('*') and len(words[-1]) > 1
+    if prefix:
+        words[-1] = words[-1][:-1]
+    expression = ' '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+    return f'{expression}*' if prefix else expression
+
+
+def index_answers(using, form_id, response_id, answers):
+    """
+        answers: (question id, text) pairs of one response.
+    """
+    answers = [(text, response_id, form_id, question_id) for question_id, text in answers if text]
+    if answers and fts_available(using):
+        with connections[using].cursor() as cursor:
+            cursor.executemany(INSERT_SQL, answers)
+
+
+def remove_responses(using, response_ids):
+    if response_ids and fts_available(using):
+        with connections[using].cursor() as cursor:
+            placeholders = ', '.join(['%s'] * len(response_ids))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE response_id IN ({placeholders})', list(response_ids))
+
+
+def remove_form(using, form_id):
+    if fts_available(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE form_id = %s', [form_id])
+
+
+def rebuild(using, form_id=None, batch_size=1000):
+    """
+        re-indexes the text answers of a form (or all forms); returns the amount of indexed answers.
+    """
+    if not fts_available(using):
+        return 0
+
+    if form_id is not None:
+        remove_form(using, form_id)
+    with connections[using].cursor() as cursor:
+        if form_id is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+        indexed = 0
+        for model in (ShortAnswer, LongAnswer):
+            answers = model.objects.using(using).exclude(answer_field__isnull=True).exclude(answer_field='')
+            if form_id is not None:
+                answers = answers.filter(related_question__form_id=form_id)
+            rows = answers.values_list('answer_field', 'related_response_id', 'related_question__form_id',
+                                       'related_question_id')
+            batch = []
+            for row in rows.iterator():
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    cursor.executemany(INSERT_SQL, batch)
+                    indexed += len(batch)
+                    batch = []
+            cursor.executemany(INSERT_SQL, batch)
+            indexed += len(batch)
+    return indexed
+
+
+def search(using, form_id, term, page=1, page_size=20):
+    """
+        responses of the form with text answers matching the term, best matches first.
+        returns (count, [{"response_id", "snippets"}, ...]) of the requested page.
+    """
+    expression = match_expression(term)
+    if expression is None:
+        return 0, []
+    if not fts_available(using):
+        return _scan(using, form_id, term, page, page_size)
+
+    offset = (page - 1) * page_size
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'SELECT count(DISTINCT response_id) FROM {FTS_TABLE} '
+                       f'WHERE {FTS_TABLE} MATCH %s AND form_id = %s', [expression, form_id])
+        count = cursor.fetchone()[0]
+
+        cursor.execute(f'SELECT response_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND form_id = %s '
+                       f'GROUP BY response_id ORDER BY min(rank) LIMIT %s OFFSET %s',
+                       [expression, form_id, page_size, offset])
+        response_ids = [row[0] for row in cursor.fetchall()]
+        if not response_ids:
+            return count, []
+
+        # snippet() can not be used in grouped queries, so the snippets of the page are fetched separately.
+        placeholders = ', '.join(['%s'] * len(response_ids))
+        cursor.execute(f"SELECT response_id, question_id, snippet({FTS_TABLE}, 0, '[', ']', '...', {SNIPPET_TOKENS}) "
+                       f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND response_id IN ({placeholders}) "
+                       f"ORDER BY rank", [expression, *response_ids])
+        snippets = {response_id: [] for response_id in response_ids}
+        for response_id, question_id, snippet in cursor.fetchall():
+            snippets[response_id].append({'question_id': question_id, 'snippet': snippet})
+
+    return count, [{'response_id': response_id, 'snippets': snippets[response_id]} for response_id in response_ids]
+
+
+def _scan(using, form_id, term, page, page_size):
+    snippets = {}
+    words = term.rstrip('*').split()
+    for model in (ShortAnswer, LongAnswer):
+        condition = Q()
+        for word in words:
+            condition &= Q(answer_field__icontains=word)
+        if model is LongAnswer:
+            # compressed long answers (see form_builder.fields) are only matched once they are read.
+            condition |= Q(answer_field__startswith=MARKER)
+        rows = model.objects.using(using).filter(condition, related_question__form_id=form_id).values_list(
+            'related_response_id', 'related_question_id', 'answer_field')
+        for response_id, question_id, answer in rows:
+            if model is LongAnswer and not all(word.lower() in answer.lower() for word in words):
+                continue
+            snippets.setdefault(response_id, []).append({'question_id': question_id, 'snippet': answer[:256]})
+
+    response_ids = sorted(snippets)[(page - 1) * page_size:page * page_size]
+    return len(snippets), [{'response_id': response_id, 'snippets': snippets[response_id]}
+                           for response_id in response_ids]
@@ -1,8 +1,11 @@
 from abc import ABC
+from functools import partial
 
 from rest_framework import serializers
 from .models import *
-from django.db.transaction import atomic
+from . import duplicates, live, quiz, search, versions
+from .filters import ANSWER_MODELS
+from django.db import router, transaction
 
 
 class FormSerializer(serializers.ModelSerializer):
@@ -73,7 +76,8 @@ class FormRUDSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Form
-        fields = ['title', 'description', 'form_template', 'is_closed', 'questions', 'owner_is_anonymous']
+        fields = ['title', 'description', 'form_template', 'is_closed', 'questions', 'owner_is_anonymous',
+                  'duplicate_policy', 'duplicate_window']
 
     def update(self, instance: Form, validated_data):
         if 'questions' in validated_data:
@@ -87,7 +91,10 @@ class FormRUDSerializer(serializers.ModelSerializer):
                     question_id = question.pop('q_id')
                     changing_question = instance.questions.get(id=question_id)
                     changing_question.change(**question)
-        return super().update(instance, validated_data)
+        instance.schema_version += 1
+        instance = super().update(instance, validated_data)
+        versions.publish(instance)
+        return instance
 
 
 class ResponseSerializer(serializers.ModelSerializer):
@@ -103,73 +110,119 @@ class ResponseSerializer(serializers.ModelSerializer):
         fields = ('related_form', 'owner_email', 'all_answers')
 
     def validate(self, attrs):
+        """
+            checked against the cached questions of the form's current version, see form_builder.versions
+        """
         try:
             related_form: Form = attrs['related_form']
-            required_questions = related_form.required_questions
-            answered_question = attrs['all_answers']
-            answered_question_ids = [answer['related_question'] for answer in answered_question]
-            if all([question_id in answered_question_ids for question_id in
-                    required_questions.values_list('id', flat=True)]):
+            questions = versions.questions(related_form)
+            answered_question_ids = [answer['related_question'] for answer in attrs['all_answers']]
+            if not set(answered_question_ids) <= {question['id'] for question in questions}:
+                raise serializers.ValidationError('some answered questions do not belong to this form')
+            if all([question['id'] in answered_question_ids for question in questions if question['is_required']]):
                 return attrs
             else:
                 raise serializers.ValidationError('some required questions has not been answered in this response')
         except Exception as error:
             raise serializers.ValidationError(error)
 
-    @atomic
     def save(self, **kwargs):
         """
         save method has been defined atomic, to avoid saving responses that do not contain valid answers.
         and in case an answers creation process raises an exception, the response and other answers do not create as well.
+        the transaction takes the write lock up front (BEGIN IMMEDIATE) in the high concurrency sqlite mode,
+        and runs on the database (shard) the response is written to.
         """
+        with transaction.atomic(using=router.db_for_write(Response)):
+            return self.__create_response()
 
+    def __create_response(self):
         if self.is_valid(raise_exception=True):
             data = self.validated_data
             answers = data.pop('all_answers')
-            related_response = Response.objects.create(**data)
+            response_hash = duplicates.content_hash(answers)
+            related_response = Response.objects.create(
+                **data, content_hash=response_hash, form_version=data['related_form'].schema_version,
+                is_duplicate=duplicates.is_duplicate(data['related_form'], response_hash))
+            snapshot, text_answers = self.__create_answers(related_response, answers)
+
+            related_response.answers_snapshot = snapshot
+            if quiz.is_quiz(data['related_form']):
+                related_response.score = quiz.score(quiz.answer_key(data['related_form']), snapshot)
+            Response.objects.filter(id=related_response.id).update(answers_snapshot=snapshot,
+                                                                   score=related_response.score)
+            using = router.db_for_write(Response)
+            search.index_answers(using, related_response.related_form_id, related_response.id, text_answers)
+            transaction.on_commit(partial(live.publish_response, using, related_response.related_form_id,
+                                          related_response.id), using=using)
+            return related_response
 
+    @staticmethod
+    def __create_answers(related_response, answers):
+        """
+            creates the answers with one insert per answer table: the questions and choices are read from the form's
+            cached version (see form_builder.versions), so no answer makes queries of its own, and no signals are sent.
+            returns the snapshot of the answers and the (question id, text) pairs to index for search.
+        """
+        questions = {question['id']: question for question in versions.questions(related_response.related_form)}
+        rows = {answer_type: [] for answer_type in ANSWER_MODELS}
+        snapshot, text_answers, files = [], [], []
+        try:
             for answer in answers:
-                try:
-                    related_question = Question.objects.get(id=int(answer['related_question']))
-                    if related_question.answer_type == QuestionTypes.MultipleChoice:
-                        # in multi choice answers, the answer field has to be the choice id
-                        if related_question.choices.filter(id=int(answer['answer_field'])):
-                            MultipleChoiceAnswer.objects.create(related_response=related_response,
-                                                                related_question=related_question,
-                                                                answer_field_id=int(answer['answer_field']))
-                        else:
-                            raise ValidationError("selected choice does not exist in the specific question choices")
-
-                    elif related_question.answer_type == QuestionTypes.Short:
-                        ShortAnswer.objects.create(related_response=related_response,
-                                                   related_question=related_question,
-                                                   answer_field=answer['answer_field'])
-                    elif related_question.answer_type == QuestionTypes.Long:
-                        LongAnswer.objects.create(related_response=related_response,
-                                                  related_question=related_question,
-                                                  answer_field=answer['answer_field'])
-                    elif related_question.answer_type == QuestionTypes.Email:
-                        EmailFieldAnswer.objects.create(related_response=related_response,
-                                                        related_question=related_question,
-                                                        answer_field=answer['answer_field'])
-                    elif related_question.answer_type == QuestionTypes.Number:
-                        NumberFieldAnswer.objects.create(related_response=related_response,
-                                                         related_question=related_question,
-                                                         answer_field=int(answer['answer_field']))
-                    elif related_question.answer_type == QuestionTypes.Phone_Number:
-                        PhoneNumberFieldAnswer.objects.create(related_response=related_response,
-                                                              related_question=related_question,
-                                                              answer_field=answer['answer_field'])
-                    elif related_question.answer_type == QuestionTypes.File:
-                        FileFieldAnswer.objects.create(related_response=related_response,
-                                                       related_question=related_question,
-                                                       answer_field=answer['answer_file'])
-                    else:
-                        raise serializers.ValidationError("wrong question type. check the typo.")
-
-                except Exception as err:
-                    raise serializers.ValidationError({"error": f"{err} is required"})
-            return related_response
+                related_question = questions[int(answer['related_question'])]
+                answer_type = related_question['answer_type']
+                if any(question_id == related_question['id'] for question_id, _ in snapshot):
+                    raise ValidationError('this question has been answered before in this response.')
+
+                if answer_type == QuestionTypes.MultipleChoice:
+                    # in multi choice answers, the answer field has to be the choice id
+                    choice = next((choice for choice in related_question.get('choices', ())
+                                   if choice['id'] == int(answer['answer_field'])), None)
+                    if choice is None:
+                        raise ValidationError("selected choice does not exist in the specific question choices")
+                    fields, value = {'answer_field_id': choice['id']}, choice['title']
+                elif answer_type == QuestionTypes.Number:
+                    value = int(answer['answer_field'])
+                    fields = {'answer_field': value}
+                elif answer_type == QuestionTypes.File:
+                    fields, value = {'answer_field': answer['answer_file']}, None
+                elif answer_type in ANSWER_MODELS:
+                    value = answer['answer_field']
+                    fields = {'answer_field': value}
+                    if answer_type in (QuestionTypes.Short, QuestionTypes.Long):
+                        text_answers.append((related_question['id'], value))
+                else:
+                    raise serializers.ValidationError("wrong question type. check the typo.")
+
+                row = ANSWER_MODELS[answer_type](related_response=related_response,
+                                                 related_question_id=related_question['id'], **fields)
+                rows[answer_type].append(row)
+                snapshot.append([related_question['id'], value])
+                if answer_type == QuestionTypes.File:
+                    files.append((snapshot[-1], row))
+
+            for answer_type, answer_rows in rows.items():
+                if answer_rows:
+                    ANSWER_MODELS[answer_type].objects.bulk_create(answer_rows)
+        except Exception as err:
+            raise serializers.ValidationError({"error": f"{err} is required"})
+
+        # the names of the files are known once they are stored.
+        for entry, row in files:
+            entry[1] = row.answer_field.name
+        return snapshot, text_answers
+
+
+class DraftSerializer(serializers.Serializer):
+    """
+        a draft of a response, see form_builder.drafts. files can only be sent when the draft is submitted.
+    """
+    class DraftAnswerSerializer(serializers.Serializer):
+        related_question = serializers.IntegerField(required=True)
+        answer_field = serializers.CharField(max_length=1024, allow_blank=True)
+
+    all_answers = DraftAnswerSerializer(many=True, required=False)
+    owner_email = serializers.EmailField(required=False, allow_null=True)
 
 
 class DownloadSerializer(serializers.Serializer):
@@ -0,0 +1,106 @@
+"""
+    **denormalized answers of a response.**
+    Response.answers_snapshot holds the answers of the response as [[question id, answer], ...] (the choice title
+    for multiple choice questions, the file name for file questions), so reading a response takes its row and the
+    questions instead of the seven answer tables. it is written by ResponseSerializer in the submission
+    transaction; answers (or choices) changed later refresh the snapshots of their responses once the transaction
+    is committed. `manage.py backfill_answer_snapshots` fills them in for older responses and
+    `manage.py check_answer_snapshots` compares them with the answer tables.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import router, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from config.sharding import use_shard
+from . import conditional
+from .models import *
+
+ANSWER_MODELS = (LongAnswer, ShortAnswer, MultipleChoiceAnswer, EmailFieldAnswer, PhoneNumberFieldAnswer,
+                 NumberFieldAnswer, FileFieldAnswer)
+
+_deferred = ContextVar('snapshots_deferred', default=False)
+
+
+@contextmanager
+def deferred():
+    """
+        answer changes made meanwhile do not refresh the snapshots, the caller writes them itself.
+    """
+    token = _deferred.set(True)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+
+
+def snapshot_of(answers):
+    """
+        answers: answers in the all_answers format.
+    """
+    return [[answer['question_id'], answer['answer']] for answer in answers]
+
+
+def refresh(using, response_ids):
+    """
+        rewrites the snapshots of the given responses from the answer tables.
+    """
+    with use_shard(using):
+        forms = dict(Response.objects.filter(id__in=response_ids).values_list('id', 'related_form_id'))
+        response_ids = list(forms)
+        if not response_ids:
+            return 0
+        answers = Response.answers_from_tables(response_ids)
+        Response.objects.bulk_update([Response(id=response_id, answers_snapshot=snapshot_of(answers[response_id]))
+                                      for response_id in response_ids], ['answers_snapshot'])
+        conditional.responses_edited(set(forms.values()))
+        return len(response_ids)
+
+
+class PendingRefresh:
+    """
+        on commit callback refreshing the snapshots of the responses changed in a transaction.
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.response_ids = set()
+
+    def __call__(self):
+        refresh(self.using, self.response_ids)
+
+
+def schedule_refresh(using, response_ids):
+    """
+        refreshes the snapshots once the current transaction is committed, all changes of a transaction at once.
+    """
+    if _deferred.get():
+        return
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        refresh(using, response_ids)
+        return
+
+    pending = getattr(connection, 'pending_snapshot_refresh', None)
+    # the callback of a rolled back transaction is not registered anymore.
+    if pending is None or not any(callback[1] is pending for callback in connection.run_on_commit):
+        pending = connection.pending_snapshot_refresh = PendingRefresh(using)
+        transaction.on_commit(pending, using=using)
+    pending.response_ids.update(response_ids)
+
+
+def answer_changed(sender, instance, **kwargs):
+    schedule_refresh(router.db_for_write(sender, instance=instance), [instance.related_response_id])
+
+
+for answer_model in ANSWER_MODELS:
+    post_save.connect(answer_changed, sender=answer_model, dispatch_uid=f'snapshot-{answer_model.__name__}-save')
+    post_delete.connect(answer_changed, sender=answer_model, dispatch_uid=f'snapshot-{answer_model.__name__}-delete')
+
+
+@receiver(post_save, sender=Choices)
+def choice_changed(sender, instance, created, **kwargs):
+    if not created:
+        schedule_refresh(router.db_for_write(sender, instance=instance),
+                         instance.related_answers.values_list('related_response_id', flat=True))
@@ -0,0 +1,1573 @@
+import asyncio, base64, csv, gzip, io, json, os, tempfile, threading, time
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections, models, router
+from django.db.models import Q
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ValidationError
+from rest_framework.test import APIClient
+from accounts.models import Business, ShardAssignment
+from config import sharding
+from config.routers import REPLICA_DB_ALIAS, in_view_context
+from . import archive, drafts, exporters, fields, filters, live, matrix, parallel_export, purge, quiz, search, versions
+from .models import (Form, FormVersion, Question, Choices, Response, ResponseDraft, IdempotencyKey,
+                     FileFieldAnswer, LongAnswer, PhoneNumberFieldAnswer, ShortAnswer)
+from .serializers import FormSerializer, ResponseSerializer
+from .throttling import FormSubmissionThrottle
+
+FORM = {'title': 'Survey', 'description': 'd', 'form_template': 'blank', 'owner_is_anonymous': True, 'questions': [
+    {'answer_type': 'short', 'question_body': 'name', 'is_required': True},
+    {'answer_type': 'long', 'question_body': 'essay'},
+    {'answer_type': 'multi', 'question_body': 'color', 'choices': [{'title': 'red'}, {'title': 'blue'}]},
+    {'answer_type': 'number', 'question_body': 'age'},
+    {'answer_type': 'email', 'question_body': 'mail'},
+]}
+
+
+class FormBuilderTestCase(TestCase):
+    """
+        a business owner with a logged in client and helpers to create forms and submit responses through the api.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client, self.token = self.make_owner('acme')
+        self.anonymous = APIClient()
+
+    @staticmethod
+    def make_owner(name):
+        client = APIClient()
+        response = client.post('/accounts/register/', {
+            'user': {'username': name, 'password': 'secret-pass-1', 'email': f'{name}@x.com'}, 'label': name},
+            format='json')
+        assert response.status_code == 200, response.content
+        token = client.post('/accounts/login/', {'username': name, 'password': 'secret-pass-1'},
+                            format='json').data['token']
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return client, token
+
+    def make_form(self, data=FORM, client=None):
+        response = (client or self.client).post('/form_builder/forms/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    @staticmethod
+    def answers(form, name='bob', essay='hello world', color=0, age=30, mail='a@b.com'):
+        questions = {question['question_body']: question for question in form['questions']}
+        return {'all_answers': [
+            {'related_question': questions['name']['id'], 'answer_field': name},
+            {'related_question': questions['essay']['id'], 'answer_field': essay},
+            {'related_question': questions['color']['id'],
+             'answer_field': str(questions['color']['choices'][color]['id'])},
+            {'related_question': questions['age']['id'], 'answer_field': str(age)},
+            {'related_question': questions['mail']['id'], 'answer_field': mail},
+        ]}
+
+    def submit(self, form, client=None, **answers):
+        return (client or self.anonymous).post(f"/form_builder/responses/{form['slug']}/",
+                                               self.answers(form, **answers), format='json')
+
+
+@override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_THRESHOLD_MS=0)
+class SlowRequestProfilerTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+
+    def profiled(self, client, path):
+        with mock.patch('form_builder.middleware.cProfile.Profile') as profile, \
+                mock.patch('form_builder.middleware.SlowRequestProfilerMiddleware.store') as store:
+            client.get(path)
+        return profile.called, store.called
+
+    def test_anonymous_requests_are_not_profiled(self):
+        self.assertEqual(self.profiled(self.anonymous, f"/form_builder/forms/{self.form['slug']}/"), (False, False))
+
+    def test_other_users_are_not_profiled(self):
+        other, _ = self.make_owner('other')
+        self.assertEqual(self.profiled(other, f"/form_builder/forms/{self.form['slug']}/"), (False, False))
+
+    def test_form_owner_is_profiled(self):
+        self.assertEqual(self.profiled(self.client, f"/form_builder/forms/{self.form['slug']}/"), (True, True))
+
+
+class FormSubmissionThrottleTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+
+    def test_client_bucket(self):
+        statuses = [self.submit(self.form, name=f'respondent {number}').status_code for number in range(11)]
+        self.assertEqual(statuses, [200] * 10 + [429])
+
+    @override_settings(FORM_SUBMISSION_THROTTLE={'form': {'burst': 5, 'refill_rate': 0},
+                                                 'client': {'burst': 100, 'refill_rate': 1.0}})
+    def test_concurrent_submissions_do_not_spend_the_same_token(self):
+        slug = self.form['slug']
+        view = mock.Mock(kwargs={'slug': slug})
+        get = LocMemCache.get
+
+        def slow_get(*args, **kwargs):
+            # widens the window between reading and writing a bucket.
+            time.sleep(0.002)
+            return get(*args, **kwargs)
+
+        class Throttle(FormSubmissionThrottle):
+            lock_wait = 5
+
+        Throttle().form_limits(slug)
+        barrier = threading.Barrier(20)
+        allowed = []
+
+        def submit(number):
+            request = RequestFactory().post('/', REMOTE_ADDR=f'10.0.0.{number}')
+            barrier.wait()
+            allowed.append(Throttle().allow_request(request, view))
+
+        # each thread has its own cache instance (sharing the same locmem storage).
+        with mock.patch.object(LocMemCache, 'get', slow_get):
+            threads = [threading.Thread(target=submit, args=(number,)) for number in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(allowed.count(True), 5)
+
+
+class IdempotencyTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+
+    def submit_with_key(self, key, client=None, **answers):
+        return (client or self.anonymous).post(f"/form_builder/responses/{self.form['slug']}/",
+                                               self.answers(self.form, **answers), format='json',
+                                               HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_get_the_first_result(self):
+        first = self.submit_with_key('key-1')
+        retry = self.submit_with_key('key-1', name='changed')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((retry.status_code, retry.data, retry['Idempotent-Replayed']), (200, first.data, 'true'))
+        self.assertEqual(Response.objects.count(), 1)
+
+    def test_crash_between_save_and_completion_releases_the_key(self):
+        client = APIClient(raise_request_exception=False)
+        with mock.patch('form_builder.idempotency.complete', side_effect=SystemError('worker died')):
+            self.assertEqual(self.submit_with_key('key-1', client=client).status_code, 500)
+        self.assertEqual((Response.objects.count(), IdempotencyKey.objects.count()), (0, 0))
+
+        retry = self.submit_with_key('key-1')
+        self.assertEqual(retry.status_code, 200)
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+        self.assertEqual(Response.objects.count(), 1)
+
+    def test_key_left_without_result_can_be_claimed(self):
+        IdempotencyKey.objects.create(form_id=self.form['id'], key='key-1')
+        self.assertEqual(self.submit_with_key('key-1').status_code, 200)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+
+    def test_retry_during_the_first_request_gets_its_result(self):
+        cache.clear()
+        owner, _ = FormBuilderTestCase.make_owner('acme')
+        form = owner.post('/form_builder/forms/', FORM, format='json').data
+        data = FormBuilderTestCase.answers(form)
+        url = f"/form_builder/responses/{form['slug']}/"
+        saved, results = threading.Event(), {}
+        save = ResponseSerializer.save
+
+        def slow_save(serializer, **kwargs):
+            response = save(serializer, **kwargs)
+            # the retry arrives while the first request's transaction is still open.
+            saved.set()
+            time.sleep(0.5)
+            return response
+
+        def post(name):
+            try:
+                results[name] = APIClient().post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(ResponseSerializer, 'save', slow_save):
+            first = threading.Thread(target=post, args=('first',))
+            first.start()
+            self.assertTrue(saved.wait(5))
+            retry = threading.Thread(target=post, args=('retry',))
+            retry.start()
+            first.join()
+            retry.join()
+
+        self.assertEqual(results['first'].status_code, 200)
+        self.assertEqual(results['retry'].status_code, 200)
+        self.assertEqual(results['retry']['Idempotent-Replayed'], 'true')
+        self.assertEqual(results['retry'].data, results['first'].data)
+        self.assertEqual(Response.objects.count(), 1)
+
+
+class DuplicateFlagTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+        self.client.patch(f"/form_builder/forms/{self.form['slug']}/", {'duplicate_policy': 'flag'}, format='json')
+        for _ in range(2):
+            self.assertEqual(self.submit(self.form).status_code, 200)
+
+    def test_listing_shows_flagged_responses(self):
+        url = f"/form_builder/responses/{self.form['slug']}/"
+        listed = json.loads(b''.join(self.client.get(url).streaming_content))
+        self.assertEqual([response['is_duplicate'] for response in listed], [False, True])
+        paged = self.client.get(url, {'page': 1}).data['results']
+        self.assertEqual([response['is_duplicate'] for response in paged], [False, True])
+
+    def test_export_has_the_flag(self):
+        response = self.client.post(f"/form_builder/export-responses/{self.form['slug']}/", {'format': 'csv'},
+                                    format='json')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['is_duplicate'] for row in rows], ['False', 'True'])
+
+
+class ConditionalListingTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+        for number in range(2):
+            self.submit(self.form, name=f'respondent {number}')
+        self.url = f"/form_builder/responses/{self.form['slug']}/"
+
+    def test_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Response.objects.order_by('id').last().delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since_alone_is_not_answered_with_304(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        Response.objects.order_by('id').last().delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def admin(self):
+        admin = Client()
+        admin.force_login(User.objects.create_superuser('admin', 'admin@x.com', 'secret-pass-1'))
+        return admin
+
+    def test_admin_edits_change_the_etag(self):
+        response = Response.objects.order_by('id').last()
+        answer = ShortAnswer.objects.get(related_response_id=response.id)
+        admin = self.admin()
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            edited = admin.post(f'/admin/form_builder/shortanswer/{answer.id}/change/', {
+                'related_question': answer.related_question_id, 'related_response': response.id,
+                'answer_field': 'renamed'})
+        self.assertEqual(edited.status_code, 302)
+        listed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(listed.status_code, 200)
+        self.assertIn('renamed', listed.getvalue().decode())
+
+        etag = listed['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            edited = admin.post(f'/admin/form_builder/response/{response.id}/change/', {
+                'related_form': response.related_form_id, 'owner_email': 'new@x.com',
+                'form_version': response.form_version})
+        self.assertEqual(edited.status_code, 302)
+        listed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(listed.status_code, 200)
+        self.assertIn('new@x.com', listed.getvalue().decode())
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=listed['ETag']).status_code, 304)
+
+
+class LiveFeedTicketTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+
+    def ticket(self, client=None, slug=None):
+        return (client or self.client).post(f"/form_builder/live-tickets/{slug or self.form['slug']}/")
+
+    def connect(self, query):
+        """
+            the status the feed answers a GET with this query string (without Authorization header) with.
+        """
+        sent = []
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        # closing the connection would end the test's transaction, as in django's test client.
+        with mock.patch('form_builder.live.close_old_connections'), \
+                mock.patch('form_builder.live.feed.subscribe', side_effect=RuntimeError('connected')):
+            try:
+                async_to_sync(live.response_feed)({
+                    'type': 'http', 'method': 'GET', 'path': f"/form_builder/live/{self.form['slug']}/",
+                    'headers': [], 'query_string': query.encode()}, receive, send)
+            except RuntimeError:
+                return 200
+        return sent[0]['status']
+
+    def test_ticket_is_issued_to_the_owner_only(self):
+        other, _ = self.make_owner('other')
+        self.assertEqual(self.ticket(other).status_code, 404)
+        self.assertEqual(self.ticket(self.anonymous).status_code, 401)
+        self.assertEqual(self.ticket().status_code, 200)
+
+    def test_feed_accepts_tickets_and_not_tokens_in_the_url(self):
+        self.assertEqual(self.connect(f'token={self.token}'), 401)
+        self.assertEqual(self.connect(f"ticket={self.ticket().data['ticket']}"), 200)
+
+    def test_ticket_of_another_form_is_rejected(self):
+        other_form = self.make_form({**FORM, 'title': 'Other'})
+        self.assertEqual(self.connect(f"ticket={self.ticket(slug=other_form['slug']).data['ticket']}"), 401)
+
+    def test_expired_ticket_is_rejected(self):
+        ticket = self.ticket().data['ticket']
+        with override_settings(LIVE_FEED_TICKET_MAX_AGE=-1):
+            self.assertEqual(self.connect(f'ticket={ticket}'), 401)
+
+
+
+class LiveFeedTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+        self.assertEqual(self.submit(self.form, name='before').status_code, 200)
+
+    def watch(self, during, headers=()):
+        """
+            the events the feed sends while `during` runs (sync, in the test's thread), until the first response.
+        """
+        sent = []
+
+        async def run():
+            connected, disconnect = asyncio.Event(), asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if message.get('body', b'').startswith(b'retry'):
+                    connected.set()
+                if b'event: response' in message.get('body', b''):
+                    disconnect.set()
+
+            task = asyncio.ensure_future(live.response_feed({
+                'type': 'http', 'method': 'GET', 'path': f"/form_builder/live/{self.form['slug']}/",
+                'headers': [(b'authorization', f'Token {self.token}'.encode()), *headers], 'query_string': b''},
+                receive, send))
+            await asyncio.wait_for(connected.wait(), 5)
+            await sync_to_async(during)()
+            await asyncio.wait_for(task, 5)
+
+        # closing the connection would end the test's transaction, as in django's test client.
+        with mock.patch('form_builder.live.close_old_connections'):
+            async_to_sync(run)()
+        return [json.loads(message['body'].split(b'data: ', 1)[1]) for message in sent
+                if b'event: response' in message.get('body', b'')]
+
+    @override_settings(LIVE_FEED_POLL_SECONDS=0.05)
+    def test_responses_of_other_processes_are_polled(self):
+        # nothing is published in process: the test's transaction is never committed.
+        events = self.watch(lambda: self.submit(self.form, name='elsewhere'))
+        self.assertEqual([event['all_answers'][0]['answer'] for event in events], ['elsewhere'])
+
+    @override_settings(LIVE_FEED_POLL_SECONDS=60)
+    def test_responses_of_this_process_wake_the_feed_up(self):
+        def submit():
+            response = self.submit(self.form, name='here')
+            live.publish_response('default', self.form['id'], response.data['id'])
+
+        started = time.monotonic()
+        events = self.watch(submit)
+        self.assertEqual(len(events), 1)
+        self.assertLess(time.monotonic() - started, 5)
+
+    @override_settings(LIVE_FEED_POLL_SECONDS=60)
+    def test_reconnecting_client_gets_the_missed_responses(self):
+        first = Response.objects.get(related_form_id=self.form['id']).id
+        events = self.watch(lambda: None, headers=[(b'last-event-id', str(first - 1).encode())])
+        self.assertEqual([event['id'] for event in events], [first])
+
+class FormPayloadParityTests(FormBuilderTestCase):
+    """
+        form_builder.readers builds the same json as the FormSerializer path the views used before.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.created = self.client.post('/form_builder/forms/', FORM, format='json')
+        self.form = Form.objects.get(id=self.created.data['id'])
+        question = self.form.questions.get(question_body='essay')
+        question.related_image = SimpleUploadedFile('essay.png', b'not really a png', content_type='image/png')
+        question.save()
+        versions.bump(self.form.id)
+        self.form.refresh_from_db()
+        self.make_form({**FORM, 'title': 'Second'})
+
+    @staticmethod
+    def legacy_payload(form, with_state=True):
+        payload = FormSerializer(form).data
+        for question in payload['questions']:
+            if not question['choices']:
+                question.pop('choices')
+        return {'id': form.id, **payload, 'slug': form.slug, **({'is_closed': form.is_closed} if with_state else {})}
+
+    @staticmethod
+    def rendered(data):
+        return json.loads(JSONRenderer().render(data))
+
+    def test_list(self):
+        forms = Form.objects.filter(business=self.form.business).order_by('created_date')
+        self.assertEqual(json.loads(self.client.get('/form_builder/forms/').content),
+                         self.rendered([self.legacy_payload(form, with_state=False) for form in forms]))
+
+    def test_retrieve(self):
+        payload = json.loads(self.client.get(f'/form_builder/forms/{self.form.slug}/').content)
+        self.assertEqual(payload, self.rendered(self.legacy_payload(self.form)))
+        self.assertTrue(any(question['related_image'] for question in payload['questions']))
+        self.assertTrue(any('choices' in question for question in payload['questions']))
+
+    def test_create_echo(self):
+        echo = self.client.post('/form_builder/forms/', {**FORM, 'title': 'Third'}, format='json')
+        created = Form.objects.get(id=echo.data['id'])
+        self.assertEqual(json.loads(echo.content), self.rendered(self.legacy_payload(created)))
+
+
+@override_settings(FORM_PURGE_IN_BACKGROUND=False, FORM_PURGE_BATCH_SIZE=2)
+class SoftDeleteAndPurgeTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        directories = override_settings(MEDIA_ROOT=f'{self.directory.name}/media',
+                                        RESPONSE_ARCHIVE_DIR=f'{self.directory.name}/archive',
+                                        RESPONSE_MATRIX_DIR=f'{self.directory.name}/matrix')
+        directories.enable()
+        self.addCleanup(directories.disable)
+
+        self.form = self.make_form({**FORM, 'questions': FORM['questions'] + [
+            {'answer_type': 'file', 'question_body': 'cv'}]})
+        self.url = f"/form_builder/forms/{self.form['slug']}/"
+        self.instance = Form.objects.get(id=self.form['id'])
+
+    def fill(self):
+        """
+            a bit of everything purge_form removes: files, search entries, archive, matrix, versions and drafts.
+        """
+        self.assertEqual(self.submit(self.form, essay='archived answer').status_code, 200)
+        call_command('archive_responses', '--older-than', '0', '--form', self.form['slug'], stdout=io.StringIO())
+        for number in range(3):
+            self.assertEqual(self.submit(self.form, name=f'respondent {number}', essay='searchable').status_code, 200)
+
+        question = self.instance.questions.get(question_body='cv')
+        question.related_image = SimpleUploadedFile('cv.png', b'image')
+        question.save()
+        FileFieldAnswer.objects.bulk_create([FileFieldAnswer(
+            related_question=question, related_response=response,
+            answer_field=SimpleUploadedFile(f'cv-{response.id}.pdf', b'pdf'))
+            for response in self.instance.responses.all()])
+        versions.bump(self.instance.id)
+        versions.publish(Form.objects.get(id=self.instance.id))
+        matrix.load(self.instance)
+        self.anonymous.put(f"/form_builder/drafts/{self.form['slug']}/{'t' * 20}/", {'all_answers': []}, format='json')
+
+        files = [question.related_image.name] + list(FileFieldAnswer.objects.values_list('answer_field', flat=True))
+        self.assertTrue(all(default_storage.exists(name) for name in files))
+        self.assertTrue(os.path.isdir(archive.form_archive_dir(self.instance)))
+        self.assertTrue(os.path.isdir(matrix.form_matrix_dir(self.instance)))
+        # the name and essay of the responses which are not archived.
+        self.assertEqual(self.fts_rows(), 6)
+        self.assertGreater(FormVersion.objects.filter(form_id=self.instance.id).count(), 1)
+        self.assertEqual(ResponseDraft.objects.filter(form_id=self.instance.id).count(), 1)
+        return files
+
+    def fts_rows(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.FTS_TABLE} WHERE form_id = %s', [self.instance.id])
+            return cursor.fetchone()[0]
+
+    def test_deleted_form_is_hidden_and_its_slug_is_free(self):
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertFalse(Form.objects.filter(id=self.form['id']).exists())
+        self.assertTrue(Form.all_objects.get(id=self.form['id']).is_deleted)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(f"/form_builder/responses/{self.form['slug']}/").status_code, 404)
+        self.assertEqual(self.submit(self.form).status_code, 404)
+        self.assertEqual(self.anonymous.get(f"/form_builder/drafts/{self.form['slug']}/{'t' * 20}/").status_code, 404)
+        self.assertEqual(self.make_form({**FORM, 'title': self.form['title']})['slug'], self.form['slug'])
+
+    @override_settings(FORM_PURGE_IN_BACKGROUND=True)
+    def test_purge_is_scheduled_when_the_deletion_commits(self):
+        with mock.patch('form_builder.purge.purge_in_background') as run:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(self.url)
+        run.assert_called_once_with('default', self.form['id'])
+
+    def test_purge_removes_everything_of_the_form(self):
+        files = self.fill()
+        other = self.make_form({**FORM, 'title': 'Other'})
+        self.assertEqual(self.submit(other).status_code, 200)
+        question_ids = list(self.instance.questions.values_list('id', flat=True))
+        self.client.delete(self.url)
+
+        self.assertGreater(purge.purge_form('default', self.instance.id), 0)
+        self.assertFalse(Form.all_objects.filter(id=self.instance.id).exists())
+        for model in (Question, Choices, *filters.ANSWER_MODELS.values()):
+            field = 'related_question_id__in' if model is not Question else 'id__in'
+            self.assertFalse(model.objects.filter(**{field: question_ids}).exists(), model)
+        for model, field in ((Response, 'related_form_id'), (IdempotencyKey, 'form_id'), (FormVersion, 'form_id'),
+                             (ResponseDraft, 'form_id')):
+            self.assertFalse(model.objects.filter(**{field: self.instance.id}).exists(), model)
+        self.assertFalse(any(default_storage.exists(name) for name in files))
+        self.assertFalse(os.path.exists(archive.form_archive_dir(self.instance)))
+        self.assertFalse(os.path.exists(matrix.form_matrix_dir(self.instance)))
+        self.assertEqual(self.fts_rows(), 0)
+        # other forms are left alone.
+        self.assertEqual(Response.objects.filter(related_form_id=other['id']).count(), 1)
+
+    def test_live_forms_are_not_purged(self):
+        self.assertEqual(self.submit(self.form).status_code, 200)
+        self.assertEqual(purge.purge_form('default', self.instance.id), 0)
+        self.assertEqual(Response.objects.filter(related_form_id=self.instance.id).count(), 1)
+
+    def test_purge_deleted_forms_command(self):
+        self.assertEqual(self.submit(self.form).status_code, 200)
+        self.client.delete(self.url)
+        out = io.StringIO()
+        call_command('purge_deleted_forms', stdout=out)
+        self.assertIn('purged', out.getvalue())
+        self.assertFalse(Form.all_objects.filter(id=self.instance.id).exists())
+
+    def test_responses_cascade_with_their_form(self):
+        self.assertIs(Response._meta.get_field('related_form').remote_field.on_delete, models.CASCADE)
+        self.assertEqual(self.submit(self.form).status_code, 200)
+        Form.all_objects.filter(id=self.instance.id).delete()
+        self.assertFalse(Response.objects.filter(related_form_id=self.instance.id).exists())
+
+
+class ResponseFilterTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+        self.questions = {question['question_body']: question for question in self.form['questions']}
+        for name, color, age, mail in (('ann', 0, 20, 'ann@example.com'), ('ben', 1, 40, 'ben@other.org'),
+                                       ('cy', 1, 60, 'cy@example.com')):
+            self.assertEqual(self.submit(self.form, name=name, color=color, age=age, mail=mail).status_code, 200)
+        self.assertEqual(self.submit(self.form, name='cy', color=1, age=60, mail='cy@example.com').status_code, 200)
+
+    def names(self, **params):
+        response = self.client.get(f"/form_builder/responses/{self.form['slug']}/", {'page': 1, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [answer['answer'] for listed in response.data['results'] for answer in listed['all_answers']
+                if answer['question'] == 'name']
+
+    def q(self, body, operator=None):
+        return f"q{self.questions[body]['id']}" + (f'__{operator}' if operator else '')
+
+    def test_question_operators(self):
+        blue = str(self.questions['color']['choices'][1]['id'])
+        red = str(self.questions['color']['choices'][0]['id'])
+        self.assertEqual(self.names(**{self.q('color'): blue}), ['ben', 'cy', 'cy'])
+        self.assertEqual(self.names(**{self.q('color', 'in'): f'{red},{blue}'}), ['ann', 'ben', 'cy', 'cy'])
+        self.assertEqual(self.names(**{self.q('age', 'gt'): '20', self.q('age', 'lte'): '40'}), ['ben'])
+        self.assertEqual(self.names(**{self.q('mail', 'domain'): 'example.com'}), ['ann', 'cy', 'cy'])
+        self.assertEqual(self.names(**{self.q('name'): 'ann'}), ['ann'])
+        self.assertEqual(self.names(**{self.q('essay', 'not_empty'): 'true'}), ['ann', 'ben', 'cy', 'cy'])
+        self.assertEqual(self.names(**{self.q('essay', 'empty'): 'true'}), [])
+
+    def test_sent_date_and_duplicates(self):
+        today = timezone.localdate().isoformat()
+        self.assertEqual(self.names(sent_date__on=today, collapse_duplicates='true'), ['ann', 'ben', 'cy'])
+        self.assertEqual(self.names(sent_date__before=today), [])
+
+    def test_invalid_filters_are_rejected(self):
+        url = f"/form_builder/responses/{self.form['slug']}/"
+        for params in ({'q999999': '1'}, {self.q('essay', 'gt'): '1'}, {self.q('age', 'gt'): 'old'},
+                       {'sent_date__after': 'yesterday'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+@override_settings(RESPONSE_DRAFT_WRITE_INTERVAL=60)
+class ResponseDraftTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+        self.url = f"/form_builder/drafts/{self.form['slug']}/{'d' * 20}/"
+        self.all_answers = self.answers(self.form)['all_answers']
+
+    def save(self, all_answers):
+        response = self.anonymous.put(self.url, {'all_answers': all_answers}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_saves_are_coalesced(self):
+        self.save(self.all_answers[:1])
+        self.save(self.all_answers[:2])
+        self.assertEqual(len(ResponseDraft.objects.get(form_id=self.form['id']).answers), 1)
+        self.assertEqual(len(self.anonymous.get(self.url).data['answers']), 2)
+
+    def test_submit_creates_the_response_and_deletes_the_draft(self):
+        self.save(self.all_answers[:-1])
+        response = self.anonymous.post(self.url, {'all_answers': self.all_answers[-1:]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.data['all_answers']), len(self.all_answers))
+        self.assertEqual(Response.objects.filter(related_form_id=self.form['id']).count(), 1)
+        self.assertFalse(ResponseDraft.objects.filter(form_id=self.form['id']).exists())
+        self.assertEqual(self.anonymous.get(self.url).status_code, 404)
+
+    def test_tokens_and_missing_drafts(self):
+        self.assertEqual(self.anonymous.get(f"/form_builder/drafts/{self.form['slug']}/short/").status_code, 400)
+        self.assertEqual(self.anonymous.get(self.url).status_code, 404)
+        self.assertEqual(self.anonymous.post(self.url, {}, format='json').status_code, 400)
+
+    def test_expired_drafts_are_purged(self):
+        self.save(self.all_answers)
+        ResponseDraft.objects.update(updated_date=timezone.now() - timedelta(seconds=drafts.ttl() + 1))
+        cache.clear()
+        self.assertEqual(self.anonymous.get(self.url).status_code, 404)
+        self.assertEqual(drafts.purge_expired(), 1)
+
+    def question_id(self, body):
+        return next(question['id'] for question in self.form['questions'] if question['question_body'] == body)
+
+    def test_blank_answers_are_left_out_of_the_response(self):
+        essay = self.question_id('essay')
+        self.save([answer if answer['related_question'] != essay else {**answer, 'answer_field': ''}
+                   for answer in self.all_answers])
+        response = self.anonymous.post(self.url, {}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn(essay, [answer[0] for answer in Response.objects.get().answers_snapshot])
+
+    def test_blank_required_answers_are_missing(self):
+        name = self.question_id('name')
+        self.save([{**answer, 'answer_field': ''} if answer['related_question'] == name else answer
+                   for answer in self.all_answers])
+        self.assertEqual(self.anonymous.post(self.url, {}, format='json').status_code, 400)
+        self.assertTrue(ResponseDraft.objects.filter(form_id=self.form['id']).exists())
+
+
+
+class ResponseSubmissionTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+
+    def save(self, form, all_answers):
+        serializer = ResponseSerializer(data={'related_form': form['id'], 'all_answers': all_answers})
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = serializer.save()
+        return response, len(queries)
+
+    def test_answers_are_inserted_in_one_batch_per_table(self):
+        # publishes and caches the form's version.
+        self.save(self.form, self.answers(self.form)['all_answers'][:1])
+        _, few = self.save(self.form, self.answers(self.form)['all_answers'][:1])
+        response, many = self.save(self.form, self.answers(self.form)['all_answers'])
+        self.assertEqual(many, few + 4)
+        in_tables = Response.answers_from_tables([response.id])[response.id]
+        self.assertEqual(sorted(response.answers_snapshot), sorted([answer['question_id'], answer['answer']]
+                                                                   for answer in in_tables))
+        self.assertEqual(dict(response.answers_snapshot)[self.form['questions'][2]['id']], 'red')
+
+    def test_invalid_answers_are_rejected(self):
+        all_answers = self.answers(self.form)['all_answers']
+        color = all_answers[2]
+        for answers in (all_answers + [all_answers[0]], all_answers[:2] + [{**color, 'answer_field': '999999'}],
+                        all_answers[:3] + [{**all_answers[3], 'answer_field': 'old'}]):
+            serializer = ResponseSerializer(data={'related_form': self.form['id'], 'all_answers': answers})
+            serializer.is_valid(raise_exception=True)
+            with self.assertRaises(ValidationError):
+                serializer.save()
+        self.assertFalse(Response.objects.exists())
+
+    def test_file_answers(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            form = self.make_form({**FORM, 'title': 'Files',
+                                   'questions': [{'answer_type': 'file', 'question_body': 'cv'}]})
+            question_id = form['questions'][0]['id']
+            response, _ = self.save(form, [{'related_question': question_id,
+                                            'answer_file': SimpleUploadedFile('cv.pdf', b'pdf')}])
+            name = FileFieldAnswer.objects.get(related_response=response).answer_field.name
+            self.assertEqual(response.answers_snapshot, [[question_id, name]])
+            self.assertTrue(default_storage.exists(name))
+
+@override_settings(DATABASE_SHARDS=['default', 'shard_1'])
+class ShardingTests(FormBuilderTestCase):
+    """
+        the test database has no second shard, so the businesses are assigned to the default one.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.get(user__username='acme')
+        ShardAssignment.objects.update_or_create(business_id=self.business.pk, defaults={'database': 'default'})
+
+    def test_businesses_keep_their_shard(self):
+        self.assertEqual(sharding.shard_for_business(self.business.pk), 'default')
+        ShardAssignment.objects.all().delete()
+        # cached until move_business reassigns it.
+        self.assertEqual(sharding.shard_for_business(self.business.pk), 'default')
+        cache.clear()
+        assigned = sharding.shard_for_business(self.business.pk)
+        self.assertIn(assigned, ['default', 'shard_1'])
+        self.assertEqual(ShardAssignment.objects.get(business_id=self.business.pk).database, assigned)
+
+    def test_router_follows_the_active_shard(self):
+        self.assertEqual(router.db_for_write(Form), 'default')
+        with sharding.use_shard('shard_1'):
+            self.assertEqual(router.db_for_write(Response), 'shard_1')
+            self.assertEqual(router.db_for_read(Question), 'shard_1')
+            self.assertEqual(router.db_for_write(ShardAssignment), 'default')
+        self.assertEqual(list(sharding.each_shard()), ['default', 'shard_1'])
+
+    def test_forms_are_found_on_their_shard(self):
+        form = self.make_form()
+        self.assertEqual(sharding.shard_for_form(form['slug']), 'default')
+        self.assertEqual(cache.get(sharding.form_shard_cache_key(form['slug'])), 'default')
+        self.assertEqual(self.submit(form).status_code, 200)
+        listed = self.client.get(f"/form_builder/responses/{form['slug']}/", {'page': 1})
+        self.assertEqual(len(listed.data['results']), 1)
+
+    def test_crashing_request_leaves_no_shard_active(self):
+        form = self.make_form()
+        with mock.patch('form_builder.views.ResponseOfAFormAPIView._ResponseOfAFormAPIView__submit',
+                        side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                self.submit(form)
+        self.assertIsNone(sharding.current_shard())
+
+    @override_settings(DATABASE_SHARDS=['default'])
+    def test_single_database_is_not_sharded(self):
+        self.assertIsNone(sharding.shard_for_business(self.business.pk))
+        self.assertIsNone(sharding.shard_for_form('anything'))
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+        with a replica alias configured like DATABASE_REPLICA_NAME does (a test mirror of the default database, a
+        second connection to it), so the queries of each alias can be told apart.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        default = connections['default'].settings_dict
+        connections.databases[REPLICA_DB_ALIAS] = {**default, 'TEST': {**default['TEST'], 'MIRROR': 'default'}}
+        cls.addClassCleanup(cls.remove_replica)
+        # only set now: the test runner sets up the databases of the test classes before the alias exists.
+        cls.databases = {'default', REPLICA_DB_ALIAS}
+        super().setUpClass()
+
+    @staticmethod
+    def remove_replica():
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.databases[REPLICA_DB_ALIAS]
+
+    def setUp(self):
+        cache.clear()
+        self.owner, _ = FormBuilderTestCase.make_owner('acme')
+        self.form = self.owner.post('/form_builder/forms/', FORM, format='json').data
+        self.assertEqual(APIClient().post(f"/form_builder/responses/{self.form['slug']}/",
+                                          FormBuilderTestCase.answers(self.form), format='json').status_code, 200)
+        # the writes above pinned the owner and the anonymous client to the primary.
+        cache.clear()
+        self.listing = f"/form_builder/responses/{self.form['slug']}/"
+
+    def read(self, request):
+        """
+            the aliases request() read forms and responses from, and its response. form versions are read from the
+            primary on a cache miss, since they are published there, see form_builder.versions.
+        """
+        tables = (Form._meta.db_table, Response._meta.db_table)
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica:
+            response = request()
+        aliases = {alias for alias, queries in (('default', default), (REPLICA_DB_ALIAS, replica))
+                   if any(f'FROM "{table}"' in query['sql'] for query in queries for table in tables)}
+        return aliases, response
+
+    def test_decorated_views_read_from_the_replica(self):
+        aliases, response = self.read(lambda: self.owner.get(self.listing, {'page': 1}))
+        self.assertEqual(aliases, {REPLICA_DB_ALIAS})
+        self.assertEqual(response.data['count'], 1)
+
+        aliases, response = self.read(lambda: APIClient().get(f"/form_builder/forms/{self.form['slug']}/"))
+        self.assertEqual(aliases, {REPLICA_DB_ALIAS})
+        self.assertEqual(response.data['slug'], self.form['slug'])
+        # outside of the views reads go to the primary.
+        self.assertEqual(router.db_for_read(Response), 'default')
+
+    def test_client_reads_from_the_primary_after_a_write(self):
+        self.assertEqual(self.owner.post('/form_builder/forms/', {**FORM, 'title': 'Other'},
+                                         format='json').status_code, 200)
+        self.assertEqual(self.read(lambda: self.owner.get(self.listing, {'page': 1}))[0], {'default'})
+        # other clients are not pinned.
+        self.assertEqual(self.read(lambda: APIClient().get(f"/form_builder/forms/{self.form['slug']}/"))[0],
+                         {REPLICA_DB_ALIAS})
+
+        # the pin expires after REPLICA_PIN_SECONDS.
+        cache.clear()
+        self.assertEqual(self.read(lambda: self.owner.get(self.listing, {'page': 1}))[0], {REPLICA_DB_ALIAS})
+
+    def test_anonymous_submission_pins_the_address(self):
+        anonymous = APIClient()
+        self.assertEqual(anonymous.post(f"/form_builder/responses/{self.form['slug']}/",
+                                        FormBuilderTestCase.answers(self.form, name='alice'),
+                                        format='json').status_code, 200)
+        self.assertEqual(self.read(lambda: anonymous.get(f"/form_builder/forms/{self.form['slug']}/"))[0], {'default'})
+
+    def test_read_only_and_failed_posts_do_not_pin(self):
+        response = self.owner.post(f"/form_builder/export-responses/{self.form['slug']}/", {'format': 'csv'},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.read(lambda: self.owner.get(self.listing, {'page': 1}))[0], {REPLICA_DB_ALIAS})
+
+        anonymous = APIClient()
+        self.assertEqual(anonymous.post(f"/form_builder/responses/{self.form['slug']}/", {'all_answers': []},
+                                        format='json').status_code, 400)
+        self.assertEqual(self.read(lambda: anonymous.get(f"/form_builder/forms/{self.form['slug']}/"))[0],
+                         {REPLICA_DB_ALIAS})
+
+
+@override_settings(FORM_SUBMISSION_THROTTLE={'form': {'burst': 1000, 'refill_rate': 0},
+                                             'client': {'burst': 1000, 'refill_rate': 0}})
+class AdminQueryCountTests(FormBuilderTestCase):
+    """
+        the admin pages make the same number of queries however many rows their tables hold.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.admin = Client()
+        self.admin.force_login(User.objects.create_superuser('admin', 'admin@x.com', 'secret-pass-1'))
+        self.owners = 0
+
+    def add_rows(self, responses):
+        """
+            another business with a form of every question type and `responses` responses.
+        """
+        self.owners += 1
+        client, _ = self.make_owner(f'owner{self.owners}')
+        form = self.make_form({**FORM, 'questions': FORM['questions'] + [
+            {'answer_type': 'phone-no', 'question_body': 'phone'}, {'answer_type': 'file', 'question_body': 'cv'}]},
+            client=client)
+        for number in range(responses):
+            self.assertEqual(self.submit(form, name=f'respondent {number}').status_code, 200)
+
+        questions = {question.question_body: question for question in Question.objects.filter(form_id=form['id'])}
+        sent = Response.objects.filter(related_form_id=form['id'])
+        PhoneNumberFieldAnswer.objects.bulk_create([PhoneNumberFieldAnswer(
+            related_question=questions['phone'], related_response=response, answer_field='+123456789')
+            for response in sent])
+        FileFieldAnswer.objects.bulk_create([FileFieldAnswer(
+            related_question=questions['cv'], related_response=response, answer_field=f'cv-{response.id}.pdf')
+            for response in sent])
+        return Form.objects.get(id=form['id'])
+
+    def queries(self, url):
+        # the first request of the session makes a few queries of its own.
+        self.admin.get(url)
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.admin.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def changelists(self):
+        return {model: reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+                for model in admin.site._registry if model._meta.app_label == 'form_builder'}
+
+    def test_changelists(self):
+        self.add_rows(1)
+        few = {model: self.queries(url) for model, url in self.changelists().items()}
+        for _ in range(3):
+            self.add_rows(4)
+        for model, url in self.changelists().items():
+            with self.subTest(model=model.__name__):
+                self.assertGreater(model.objects.count(), 1)
+                with self.assertNumQueries(few[model], using='default'):
+                    self.assertEqual(self.admin.get(url).status_code, 200)
+
+    def test_form_change_page(self):
+        form = self.add_rows(1)
+        url = reverse('admin:form_builder_form_change', args=[form.id])
+        few = self.queries(url)
+        for _ in range(3):
+            self.add_rows(4)
+        form.questions.create(question_body='another', answer_type='short')
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.assertEqual(self.admin.get(url).status_code, 200)
+        self.assertEqual(len(queries), few)
+        # the business is a raw id input, not a <select> of every business.
+        self.assertEqual([query['sql'] for query in queries if 'WHERE' not in query['sql']], [])
+
+
+class FormVersionTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = Form.objects.get(id=self.make_form()['id'])
+
+    def test_unpublished_version_is_cached_under_the_published_one(self):
+        versions.bump(self.form.id)
+        versions.bump(self.form.id)
+        current = Form.objects.get(id=self.form.id).schema_version
+        cache.clear()
+
+        questions = versions.questions_of_versions([(self.form.id, current - 1)])[self.form.id]
+        self.assertEqual(FormVersion.objects.get(form_id=self.form.id, version=current).questions, questions)
+        self.assertFalse(FormVersion.objects.filter(form_id=self.form.id, version=current - 1).exists())
+        self.assertIsNone(cache.get(versions.cache_key('default', self.form.id, current - 1)))
+        self.assertEqual(cache.get(versions.cache_key('default', self.form.id, current)), questions)
+
+    def test_admin_changes_bump_the_version(self):
+        request = RequestFactory().post('/')
+        request.user = User.objects.create_superuser('admin', 'admin@x.com', 'secret-pass-1')
+        other = Form.objects.get(id=self.make_form({**FORM, 'title': 'Other'})['id'])
+        choices = Choices.objects.filter(related_question__form_id__in=[self.form.id, other.id])
+
+        with CaptureQueriesContext(connections['default']) as queries:
+            admin.site._registry[Choices].delete_queryset(request, choices)
+        # the form ids are read with the choices, not per choice.
+        self.assertEqual([query['sql'] for query in queries if 'FROM "form_builder_question"' in query['sql']], [])
+        self.assertEqual(dict(Form.objects.filter(id__in=[self.form.id, other.id]).values_list('id', 'schema_version')),
+                         {self.form.id: self.form.schema_version + 1, other.id: other.schema_version + 1})
+
+        question = Question.objects.filter(form_id=self.form.id).first()
+        admin.site._registry[Question].delete_model(request, question)
+        self.assertEqual(Form.objects.get(id=self.form.id).schema_version, self.form.schema_version + 2)
+
+
+
+class StreamingTests(FormBuilderTestCase):
+    """
+        the listing of all responses and the csv export are streamed under wsgi and asgi.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+        for number in range(3):
+            self.assertEqual(self.submit(self.form, name=f'respondent {number}').status_code, 200)
+        self.async_client = AsyncClient()
+        self.headers = {'Authorization': f'Token {self.token}'}
+
+    @staticmethod
+    async def body(response):
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    def test_listing_is_an_async_stream_under_asgi(self):
+        url = f"/form_builder/responses/{self.form['slug']}/"
+        streamed = async_to_sync(self.async_client.get)(url, headers=self.headers)
+        self.assertTrue(streamed.is_async)
+        self.assertEqual(json.loads(async_to_sync(self.body)(streamed)),
+                         json.loads(b''.join(self.client.get(url).streaming_content)))
+
+    def test_export_is_an_async_stream_under_asgi(self):
+        url = f"/form_builder/export-responses/{self.form['slug']}/"
+        streamed = async_to_sync(self.async_client.post)(url, {'format': 'csv'}, content_type='application/json',
+                                                         headers=self.headers)
+        self.assertTrue(streamed.is_async)
+        rows = list(csv.DictReader(io.StringIO(async_to_sync(self.body)(streamed).decode())))
+        self.assertEqual(len(rows), 3)
+
+        gzipped = async_to_sync(self.async_client.post)(url, {'format': 'csv'}, content_type='application/json',
+                                                        headers={**self.headers, 'Accept-Encoding': 'gzip'})
+        self.assertTrue(gzipped.is_async)
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(
+            gzip.decompress(async_to_sync(self.body)(gzipped)).decode())))), 3)
+
+    def test_items_are_made_in_the_view_context(self):
+        def shards():
+            for _ in range(2):
+                yield sharding.current_shard()
+
+        request = mock.Mock(_request=mock.Mock(spec=ASGIRequest))
+        with sharding.use_shard('shard_1'):
+            wsgi_body, asgi_body = in_view_context(shards()), in_view_context(shards(), request)
+
+        async def consume():
+            return [shard async for shard in asgi_body]
+
+        self.assertEqual(list(wsgi_body), ['shard_1', 'shard_1'])
+        self.assertEqual(async_to_sync(consume)(), ['shard_1', 'shard_1'])
+
+
+class CompressedTextFieldTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+
+    def long_answer(self, text):
+        self.assertEqual(self.submit(self.form, name=f'respondent {LongAnswer.objects.count()}',
+                                     essay=text).status_code, 200)
+        return LongAnswer.objects.latest('id')
+
+    @staticmethod
+    def raw(answer):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT answer_field FROM form_builder_longanswer WHERE id = %s', [answer.id])
+            return cursor.fetchone()[0]
+
+    def test_round_trip(self):
+        text = 'a long answer, ' * 60 + 'end'
+        answer = self.long_answer(text)
+        self.assertTrue(self.raw(answer).startswith(fields.MARKER))
+        self.assertLess(len(self.raw(answer)), len(text))
+        self.assertEqual(LongAnswer.objects.get(id=answer.id).answer_field, text)
+        self.assertEqual(LongAnswer.objects.filter(id=answer.id).values_list('answer_field', flat=True).get(), text)
+        in_tables = Response.answers_from_tables([answer.related_response_id])[answer.related_response_id]
+        self.assertEqual([row['answer'] for row in in_tables if row['answer_type'] == 'long'], [text])
+
+    @override_settings(TEXT_COMPRESSION_THRESHOLD=100)
+    def test_threshold(self):
+        self.assertEqual(self.raw(self.long_answer('x' * 99)), 'x' * 99)
+        self.assertTrue(self.raw(self.long_answer('x' * 100)).startswith(fields.MARKER))
+        # not compressed when that is not shorter.
+        incompressible = base64.b64encode(os.urandom(120)).decode()
+        self.assertEqual(self.raw(self.long_answer(incompressible)), incompressible)
+
+    def test_texts_looking_compressed_are_escaped(self):
+        for text in (fields.MARKER, fields.MARKER + 'not base64', fields.compress('inner')):
+            answer = self.long_answer(text)
+            self.assertNotEqual(self.raw(answer), text)
+            self.assertEqual(LongAnswer.objects.get(id=answer.id).answer_field, text)
+
+    def test_compression_can_be_turned_off(self):
+        text = 'a long answer, ' * 60 + 'end'
+        compressed = self.long_answer(text)
+        with override_settings(TEXT_COMPRESSION=False):
+            plain = self.long_answer(text)
+            self.assertEqual(self.raw(plain), text)
+            self.assertEqual(LongAnswer.objects.get(id=compressed.id).answer_field, text)
+
+
+class CompressLongAnswersCommandTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+        self.texts = ['a long answer, ' * 60 + 'end', 'short', 'another long answer. ' * 40 + 'end']
+        with override_settings(TEXT_COMPRESSION=False):
+            for number, text in enumerate(self.texts):
+                self.assertEqual(self.submit(self.form, name=f'respondent {number}', essay=text).status_code, 200)
+
+    def raw_answers(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT answer_field FROM form_builder_longanswer ORDER BY id')
+            return [row[0] for row in cursor.fetchall()]
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command('compress_long_answers', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_compress_and_decompress(self):
+        self.assertEqual(self.raw_answers(), self.texts)
+
+        self.assertIn('compressed 2 long answers', self.run_command())
+        raw = self.raw_answers()
+        self.assertEqual([value.startswith(fields.MARKER) for value in raw], [True, False, True])
+        self.assertEqual(list(LongAnswer.objects.order_by('id').values_list('answer_field', flat=True)), self.texts)
+        # nothing is left to compress.
+        self.assertIn('compressed 0 long answers', self.run_command())
+
+        self.assertIn('decompressed 2 long answers', self.run_command('--decompress'))
+        self.assertEqual(self.raw_answers(), self.texts)
+
+    def test_threshold_option(self):
+        self.run_command('--threshold', '100000')
+        self.assertEqual(self.raw_answers(), self.texts)
+
+
+class ArchivedResponseTests(FormBuilderTestCase):
+    """
+        listings and exports read the archived segments before the live responses, in one id order.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        directory = override_settings(RESPONSE_ARCHIVE_DIR=self.directory.name)
+        directory.enable()
+        self.addCleanup(directory.disable)
+
+        self.form = self.make_form()
+        self.url = f"/form_builder/responses/{self.form['slug']}/"
+        for number in range(5):
+            if number == 3:
+                call_command('archive_responses', '--older-than', '0', '--chunk-size', '2', stdout=io.StringIO())
+            self.assertEqual(self.submit(self.form, name=f'respondent {number}').status_code, 200)
+        self.names = [f'respondent {number}' for number in range(5)]
+
+    @staticmethod
+    def names_of(listed):
+        return [answer['answer'] for response in listed for answer in response['all_answers']
+                if answer['question'] == 'name']
+
+    def test_segments_are_archived(self):
+        instance = Form.objects.get(id=self.form['id'])
+        self.assertEqual(archive.archived_count(instance), 3)
+        self.assertEqual(len(archive.read_index(instance)['segments']), 2)
+        self.assertEqual(Response.objects.filter(related_form_id=self.form['id']).count(), 2)
+
+    def test_listing_and_pages(self):
+        self.assertEqual(self.names_of(json.loads(b''.join(self.client.get(self.url).streaming_content))), self.names)
+        pages = [self.client.get(self.url, {'page': page, 'page_size': 2}).data for page in (1, 2, 3)]
+        self.assertEqual([page['count'] for page in pages], [5, 5, 5])
+        self.assertEqual(self.names_of(result for page in pages for result in page['results']), self.names)
+
+    def test_export_formats_archived_and_live_dates_alike(self):
+        for export_format in ('csv', 'jsonl'):
+            response = self.client.post(f"/form_builder/export-responses/{self.form['slug']}/",
+                                        {'format': export_format}, format='json')
+            body = b''.join(response.streaming_content).decode()
+            if export_format == 'csv':
+                rows = list(csv.DictReader(io.StringIO(body)))
+            else:
+                rows = [json.loads(line) for line in body.splitlines()]
+            self.assertEqual([row['name'] for row in rows], self.names)
+            for row in rows:
+                self.assertRegex(row['sent_date'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z$')
+
+
+QUIZ = {**FORM, 'title': 'Quiz', 'form_template': 'quiz', 'questions': [
+    {'answer_type': 'short', 'question_body': 'name', 'is_required': True, 'points': 2, 'answer_key': 'Paris'},
+    {'answer_type': 'long', 'question_body': 'essay'},
+    {'answer_type': 'multi', 'question_body': 'color', 'points': 3,
+     'choices': [{'title': 'red', 'is_correct': True}, {'title': 'blue'}]},
+    {'answer_type': 'number', 'question_body': 'age', 'points': 1, 'answer_key': '30'},
+    {'answer_type': 'email', 'question_body': 'mail'},
+]}
+
+
+class QuizTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form(QUIZ)
+        self.url = f"/form_builder/quiz-scores/{self.form['slug']}/"
+        # (name, color, age) -> score: 2 for the city, 3 for red, 1 for 30.
+        for name, color, age in (('  PARIS ', 0, 30), ('paris', 1, 30), ('Rome', 0, 31), ('rome', 1, 40)):
+            self.assertEqual(self.submit(self.form, name=name, color=color, age=age).status_code, 200)
+
+    def scores(self):
+        return list(Response.objects.filter(related_form_id=self.form['id']).order_by('id').values_list(
+            'score', flat=True))
+
+    def test_responses_are_graded_at_submission(self):
+        self.assertEqual(self.scores(), [6.0, 3.0, 3.0, 0.0])
+
+    def test_regrade_matches_the_submission_grading(self):
+        submitted = self.scores()
+        form = Form.objects.get(id=self.form['id'])
+        self.assertEqual(quiz.regrade(form), 4)
+        self.assertEqual(self.scores(), submitted)
+
+        # blue is correct now, the age key is 40 and the city is worth 5 points.
+        Choices.objects.filter(related_question__form_id=form.id).update(is_correct=Q(title='blue'))
+        Question.objects.filter(form_id=form.id, question_body='age').update(answer_key='40')
+        Question.objects.filter(form_id=form.id, question_body='name').update(points=5)
+        versions.bump(form.id)
+        out = io.StringIO()
+        call_command('regrade_quiz', self.form['slug'], '--batch-size', '3', stdout=out)
+        self.assertIn('regraded 4 responses, max score 9.0', out.getvalue())
+
+        form = Form.objects.get(id=form.id)
+        key = quiz.answer_key(form)
+        self.assertEqual(self.scores(), [quiz.score(key, response.answers_snapshot) for response in
+                                         Response.objects.filter(related_form_id=form.id).order_by('id')])
+        self.assertEqual(self.scores(), [5.0, 8.0, 0.0, 4.0])
+
+    def test_score_distribution(self):
+        payload = self.client.get(self.url).data
+        self.assertEqual({key: payload[key] for key in ('count', 'mean', 'min', 'max', 'max_score')},
+                         {'count': 4, 'mean': 3.0, 'min': 0.0, 'max': 6.0, 'max_score': 6.0})
+        self.assertEqual(payload['histogram'], [{'score': 0.0, 'count': 1}, {'score': 3.0, 'count': 2},
+                                                {'score': 6.0, 'count': 1}])
+
+    def test_scores_of_other_forms(self):
+        other, _ = self.make_owner('other')
+        self.assertEqual(other.get(self.url).status_code, 404)
+        blank = self.make_form()
+        self.assertEqual(self.client.get(f"/form_builder/quiz-scores/{blank['slug']}/").status_code, 400)
+
+    def test_answer_keys_are_only_shown_to_the_owner(self):
+        url = f"/form_builder/forms/{self.form['slug']}/"
+        for client, shown in ((self.client, True), (self.anonymous, False), (self.make_owner('other')[0], False)):
+            questions = {question['question_body']: question for question in client.get(url).data['questions']}
+            self.assertEqual('answer_key' in questions['name'], shown)
+            self.assertEqual(all('is_correct' in choice for choice in questions['color']['choices']), shown)
+        self.assertEqual(questions['color']['choices'][0]['title'], 'red')
+
+
+CROSSTAB = {**FORM, 'title': 'Crosstab', 'questions': FORM['questions'] + [
+    {'answer_type': 'multi', 'question_body': 'size', 'choices': [{'title': 'S'}, {'title': 'L'}]}]}
+
+
+class CrosstabTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        directory = override_settings(RESPONSE_MATRIX_DIR=self.directory.name)
+        directory.enable()
+        self.addCleanup(directory.disable)
+
+        self.form = self.make_form(CROSSTAB)
+        self.url = f"/form_builder/crosstab/{self.form['slug']}/"
+        self.questions = {question['question_body']: question for question in self.form['questions']}
+        for color, size, age in ((0, 0, 30), (0, 1, 40), (1, 0, 20), (0, None, None)):
+            self.assertEqual(self.send(color, size, age).status_code, 200)
+
+    def send(self, color, size=None, age=None):
+        # a response without the size and age answers when they are None.
+        answers = [answer for answer in self.answers(self.form, color=color)['all_answers']
+                   if age is not None or answer['related_question'] != self.questions['age']['id']]
+        if age is not None:
+            answers = [{**answer, 'answer_field': str(age)} if answer['related_question'] ==
+                       self.questions['age']['id'] else answer for answer in answers]
+        if size is not None:
+            answers.append({'related_question': self.questions['size']['id'],
+                            'answer_field': str(self.questions['size']['choices'][size]['id'])})
+        return self.anonymous.post(f"/form_builder/responses/{self.form['slug']}/", {'all_answers': answers},
+                                   format='json')
+
+    def crosstab(self, client=None, **params):
+        return (client or self.client).get(self.url, {name: self.questions[question]['id'] if question in
+                                                      self.questions else question
+                                                      for name, question in params.items()})
+
+    def test_contingency_table(self):
+        payload = self.crosstab(rows='color').data
+        self.assertEqual(payload['count'], 4)
+        self.assertEqual([label['title'] for label in payload['rows']['labels']], [None, 'red', 'blue'])
+        self.assertEqual(payload['table'], [0, 3, 1])
+
+        payload = self.crosstab(rows='color', columns='size').data
+        self.assertEqual(payload['columns']['question'], self.questions['size']['id'])
+        self.assertEqual([label['title'] for label in payload['columns']['labels']], [None, 'S', 'L'])
+        self.assertEqual(payload['table'], [[0, 0, 0], [1, 1, 1], [0, 1, 0]])
+
+    def test_grouped_stats(self):
+        payload = self.crosstab(rows='color', values='age').data
+        self.assertEqual(payload['values'], {'question': self.questions['age']['id']})
+        self.assertEqual(payload['stats'], {'count': [0, 2, 1], 'mean': [None, 35.0, 20.0], 'std': [None, 5.0, 0.0],
+                                            'min': [None, 30.0, 20.0], 'max': [None, 40.0, 20.0]})
+
+        stats = self.crosstab(rows='color', columns='size', values='age').data['stats']
+        self.assertEqual(stats['count'], [[0, 0, 0], [0, 1, 1], [0, 1, 0]])
+        self.assertEqual(stats['mean'], [[None, None, None], [None, 30.0, 40.0], [None, 20.0, None]])
+
+    def test_matrix_is_extended_after_a_new_submission(self):
+        self.assertEqual(self.crosstab(rows='color').data['table'], [0, 3, 1])
+        form = Form.objects.get(id=self.form['id'])
+        generation = matrix._read_meta(matrix.form_matrix_dir(form))['generation']
+
+        self.assertEqual(self.send(1, 1, 50).status_code, 200)
+        payload = self.crosstab(rows='color', values='age').data
+        self.assertEqual(payload['count'], 5)
+        self.assertEqual(payload['stats']['count'], [0, 2, 2])
+        self.assertEqual(payload['stats']['max'], [None, 40.0, 50.0])
+
+        response_matrix = matrix.load(form)
+        self.assertEqual(list(response_matrix.ids), list(Response.objects.filter(
+            related_form_id=form.id).order_by('id').values_list('id', flat=True)))
+        self.assertEqual(matrix._read_meta(matrix.form_matrix_dir(form))['generation'], generation)
+
+    def test_matrix_is_rebuilt_after_a_schema_change(self):
+        self.crosstab(rows='color')
+        form = Form.objects.get(id=self.form['id'])
+        generation = matrix._read_meta(matrix.form_matrix_dir(form))['generation']
+        versions.bump(form.id)
+        self.assertEqual(self.crosstab(rows='color', columns='size').data['table'], [[0, 0, 0], [1, 1, 1], [0, 1, 0]])
+        self.assertNotEqual(matrix._read_meta(matrix.form_matrix_dir(form))['generation'], generation)
+
+    def test_invalid_questions(self):
+        for params in ({}, {'rows': 'abc'}, {'rows': 'age'}, {'rows': '999999'}, {'rows': 'color', 'columns': 'name'},
+                       {'rows': 'color', 'values': 'size'}, {'rows': 'color', 'values': 'mail'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.crosstab(**params).status_code, 400)
+
+    def test_crosstab_of_other_forms(self):
+        other, _ = self.make_owner('other')
+        self.assertEqual(self.crosstab(other, rows='color').status_code, 404)
+        self.assertEqual(self.anonymous.get(self.url, {'rows': self.questions['color']['id']}).status_code, 401)
+
+
+@override_settings(FORM_SUBMISSION_THROTTLE={'form': {'burst': 100, 'refill_rate': 0},
+                                             'client': {'burst': 100, 'refill_rate': 0}})
+class ParallelExportTests(FormBuilderTestCase):
+    """
+        the parts of a parallel export (rendered in this process with one worker) join into the single process
+        export.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        directory = override_settings(RESPONSE_ARCHIVE_DIR=self.directory.name)
+        directory.enable()
+        self.addCleanup(directory.disable)
+
+        self.form = self.make_form()
+        for number in range(13):
+            self.assertEqual(self.submit(self.form, name=f'respondent {number}', age=number).status_code, 200)
+        # gaps in the ids.
+        Response.objects.filter(related_form_id=self.form['id'], id__in=Response.objects.filter(
+            related_form_id=self.form['id']).order_by('id').values_list('id', flat=True)[2:5]).delete()
+        self.ids = list(Response.objects.filter(related_form_id=self.form['id']).order_by('id').values_list(
+            'id', flat=True))
+
+    def test_id_ranges_cover_every_response_once(self):
+        responses = Response.objects.filter(related_form_id=self.form['id'])
+        for parts in range(1, len(self.ids) + 3):
+            with self.subTest(parts=parts):
+                ranges = parallel_export.id_ranges(responses, parts)
+                self.assertEqual(len(ranges), min(parts, len(self.ids)))
+                self.assertEqual([first <= last for first, last in ranges], [True] * len(ranges))
+                self.assertEqual([response_id for first, last in ranges for response_id in
+                                  responses.filter(id__gte=first, id__lte=last).order_by('id').values_list(
+                                      'id', flat=True)], self.ids)
+                sizes = [responses.filter(id__gte=first, id__lte=last).count() for first, last in ranges]
+                self.assertLessEqual(max(sizes) - min(sizes), 1)
+        self.assertEqual(parallel_export.id_ranges(responses.none(), 4), [])
+
+    def exports(self, export_format, params=None, parts=1):
+        form = Form.objects.get(id=self.form['id'])
+        single = io.BytesIO()
+        exporters.get_exporter(export_format, exporters.columns_of(form)).write(
+            exporters.rows_of(form, filters.ResponseFilter(form, params or {})), single)
+        parallel = io.BytesIO()
+        parallel_export.export(form, export_format, parallel, params, worker_count=1, parts=parts)
+        return single.getvalue(), parallel.getvalue()
+
+    def test_parts_join_into_the_single_process_export(self):
+        for export_format in ('csv', 'jsonl'):
+            for parts in (1, 3, 4, len(self.ids), len(self.ids) + 5):
+                with self.subTest(export_format=export_format, parts=parts):
+                    single, parallel = self.exports(export_format, parts=parts)
+                    self.assertEqual(parallel, single)
+                    self.assertEqual(len(single.decode().splitlines()), len(self.ids) + (export_format == 'csv'))
+
+    def test_archived_and_filtered_exports(self):
+        call_command('archive_responses', '--older-than', '0', '--chunk-size', '2', stdout=io.StringIO())
+        self.assertEqual(archive.archived_count(Form.objects.get(id=self.form['id'])), len(self.ids))
+        for number in range(13, 16):
+            self.assertEqual(self.submit(self.form, name=f'respondent {number}', age=number).status_code, 200)
+        age = next(question['id'] for question in self.form['questions'] if question['question_body'] == 'age')
+        for export_format in ('csv', 'jsonl'):
+            for params in (None, {f'q{age}__gt': '13'}):
+                with self.subTest(export_format=export_format, params=params):
+                    single, parallel = self.exports(export_format, params, parts=2)
+                    self.assertEqual(parallel, single)
+                    rows = len(single.decode().splitlines()) - (export_format == 'csv')
+                    self.assertEqual(rows, 2 if params else len(self.ids) + 3)
+
+    def test_formats_that_can_not_be_joined(self):
+        with self.assertRaises(ValueError):
+            parallel_export.export(Form.objects.get(id=self.form['id']), 'json', io.BytesIO(), worker_count=1)
+
+
+class SearchTests(FormBuilderTestCase):
+
+    # bm25 ranks a match in a shorter answer higher, so the third essay is the longest.
+    ESSAYS = ('the quick brown fox jumps over the lazy dog', 'fox fox fox fox',
+              'AND "quoted" text about foxes, which is a lot longer than the other texts about them', 'nothing here')
+
+    def setUp(self):
+        super().setUp()
+        self.form = self.make_form()
+        self.url = f"/form_builder/search/{self.form['slug']}/"
+        self.essay = next(question['id'] for question in self.form['questions'] if question['question_body'] == 'essay')
+        for name, essay in zip(('alice', 'bob', 'carol', 'dave'), self.ESSAYS):
+            self.assertEqual(self.submit(self.form, name=name, essay=essay).status_code, 200)
+        self.ids = list(Response.objects.filter(related_form_id=self.form['id']).order_by('id').values_list(
+            'id', flat=True))
+
+    def found(self, term, **params):
+        response = self.client.get(self.url, {'q': term, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [self.ids.index(result['response_id']) for result in response.data['results']]
+
+    def test_best_matches_first(self):
+        self.assertEqual(self.found('fox'), [1, 0])
+        self.assertEqual(self.found('fox*'), [1, 0, 2])
+        self.assertEqual(self.found('lazy dog'), [0])
+        self.assertEqual(self.found('alice'), [0])
+        self.assertEqual(self.found('lazy alice'), [])
+
+    def test_snippets(self):
+        result = self.client.get(self.url, {'q': 'brown'}).data['results'][0]
+        self.assertEqual(result['response_id'], self.ids[0])
+        self.assertEqual(len(result['snippets']), 1)
+        self.assertEqual(result['snippets'][0]['question_id'], self.essay)
+        self.assertIn('[brown]', result['snippets'][0]['snippet'])
+
+    def test_paging(self):
+        payload = self.client.get(self.url, {'q': 'fox*', 'page': 2, 'page_size': 2}).data
+        self.assertEqual({key: payload[key] for key in ('count', 'page', 'page_size')},
+                         {'count': 3, 'page': 2, 'page_size': 2})
+        self.assertEqual([result['response_id'] for result in payload['results']], [self.ids[2]])
+        self.assertEqual(self.found('fox*', page=3, page_size=2), [])
+        self.assertEqual(self.client.get(self.url, {'q': 'fox', 'page': 'x'}).status_code, 400)
+
+    def test_search_syntax_in_the_term_is_not_interpreted(self):
+        self.assertEqual(self.found('AND'), [2])
+        self.assertEqual(self.found('"quoted'), [2])
+        self.assertEqual(self.found('fox OR dog'), [])
+        for term in ('NEAR(fox', 'fox)', '*', '-', 'essay:fox', '"'):
+            with self.subTest(term=term):
+                self.found(term)
+
+    def test_term_is_required(self):
+        for params in ({}, {'q': '  '}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_other_forms_and_owners(self):
+        self.make_form({**FORM, 'title': 'Other'})
+        other = self.make_form({**FORM, 'title': 'Another'})
+        self.assertEqual(self.submit(other, essay='a fox').status_code, 200)
+        self.assertEqual(self.found('fox'), [1, 0])
+        self.assertEqual(self.make_owner('other')[0].get(self.url, {'q': 'fox'}).status_code, 404)
+
+    def test_scan_without_the_index(self):
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            self.assertEqual(self.found('fox'), [0, 1, 2])
+            self.assertEqual(self.found('lazy dog'), [0])
+
+    def test_rebuild_search_index(self):
+        search.remove_form('default', self.form['id'])
+        self.assertEqual(self.found('fox'), [])
+
+        out = io.StringIO()
+        call_command('rebuild_search_index', '--form', self.form['slug'], stdout=out)
+        # the name and essay of every response.
+        self.assertEqual(out.getvalue().strip(), 'default: indexed 8 answers.')
+        self.assertEqual(self.found('fox'), [1, 0])
+
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'default: indexed 8 answers.')
+        self.assertEqual(self.found('fox*'), [1, 0, 2])
+
+
+class DashboardTests(FormBuilderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        directory = override_settings(RESPONSE_ARCHIVE_DIR=self.directory.name)
+        directory.enable()
+        self.addCleanup(directory.disable)
+
+        self.form = self.make_form()
+        self.other = self.make_form({**FORM, 'title': 'Other'})
+        for number in range(3):
+            self.assertEqual(self.submit(self.form, name=f'respondent {number}').status_code, 200)
+        last_date = Response.objects.filter(related_form_id=self.form['id']).latest('id').sent_date
+        # archived dates keep milliseconds, see form_builder.archive.
+        self.last_date = last_date.replace(microsecond=last_date.microsecond // 1000 * 1000)
+
+    def dashboard(self):
+        payload = self.client.get('/form_builder/dashboard/').data
+        return payload['totals'], {form['slug']: form for form in payload['forms']}
+
+    @staticmethod
+    def archive():
+        call_command('archive_responses', '--older-than', '0', '--chunk-size', '2', stdout=io.StringIO())
+        cache.clear()
+
+    def test_counts_live_and_archived_responses(self):
+        self.archive()
+        self.assertEqual(self.submit(self.form, name='live').status_code, 200)
+        self.assertEqual(self.submit(self.other, name='live').status_code, 200)
+        cache.clear()
+
+        totals, forms = self.dashboard()
+        self.assertEqual(totals, {'forms': 2, 'open_forms': 2, 'responses': 5})
+        self.assertEqual(forms[self.form['slug']]['responses'], 4)
+        self.assertEqual(forms[self.other['slug']]['responses'], 1)
+
+    def test_last_response_date_of_archived_responses(self):
+        self.archive()
+        totals, forms = self.dashboard()
+        self.assertEqual(totals['responses'], 3)
+        self.assertEqual(forms[self.form['slug']]['last_response_date'],
+                         DateTimeField().to_representation(self.last_date))
+        self.assertIsNone(forms[self.other['slug']]['last_response_date'])
+
+    def test_last_response_date_of_segments_indexed_without_it(self):
+        self.archive()
+        form = Form.objects.get(id=self.form['id'])
+        index = archive.read_index(form)
+        for segment in index['segments']:
+            del segment['last_sent_date']
+        with open(os.path.join(archive.form_archive_dir(form), 'index.json'), 'w') as index_file:
+            json.dump(index, index_file)
+        self.assertEqual(archive.archived_stats(form), (3, self.last_date))
+
+    def test_submission_drops_the_cached_dashboard(self):
+        self.assertEqual(self.dashboard()[0]['responses'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.submit(self.other).status_code, 200)
+        totals, forms = self.dashboard()
+        self.assertEqual(totals['responses'], 4)
+        self.assertEqual(forms[self.other['slug']]['last_response_date'], DateTimeField().to_representation(
+            Response.objects.get(related_form_id=self.other['id']).sent_date))
+
+    def test_dashboard_is_cached_until_a_change_is_committed(self):
+        self.assertEqual(self.dashboard()[0]['responses'], 3)
+        # the submission's transaction is not committed in a TestCase, so the cache is kept.
+        self.assertEqual(self.submit(self.other).status_code, 200)
+        self.assertEqual(self.dashboard()[0]['responses'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Form.objects.get(id=self.other['id']).save()
+        self.assertEqual(self.dashboard()[0]['responses'], 4)
@@ -0,0 +1,99 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+from .models import Form
+
+
+class FormSubmissionThrottle(BaseThrottle):
+    """
+        **token bucket throttling of response submissions.**
+        each form has a bucket shared by all of its respondents and each (form, client) pair has its own bucket.
+        a submission takes a token from both buckets and is rejected (429 with Retry-After) if either is empty.
+        buckets refill with `refill_rate` tokens per second up to `burst` tokens. the per form limits come from
+        Form.submission_burst / Form.submission_refill_rate and default to FORM_SUBMISSION_THROTTLE.
+        buckets live in the default cache, which has to be shared between workers in production. a bucket is
+        updated under a lock (a cache.add of `<bucket>:lock`), so concurrent submissions can not spend the same
+        token; a submission which can not get the locks within lock_wait seconds is throttled as well.
+    """
+    form_limits_timeout = 60
+    # seconds: a lock expires on its own if its holder dies, it is held for a few cache operations only.
+    lock_timeout = 1
+    lock_wait = 0.05
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def lock(self, key):
+        deadline = time.monotonic() + self.lock_wait
+        while not cache.add(f'{key}:lock', True, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.002)
+        return True
+
+    def form_limits(self, slug):
+        key = f'throttle-limits:{slug}'
+        limits = cache.get(key)
+        if limits is None:
+            limits = Form.objects.filter(slug__exact=slug).values_list(
+                'submission_burst', 'submission_refill_rate').first()
+            if limits is None:
+                return None
+            cache.set(key, limits, self.form_limits_timeout)
+        return limits
+
+    def allow_request(self, request, view):
+        if request.method != 'POST':
+            return True
+
+        slug = view.kwargs.get('slug')
+        form_limits = self.form_limits(slug)
+        if form_limits is None:
+            # unknown form, the view answers that.
+            return True
+
+        form_burst, form_refill_rate = form_limits
+        defaults = settings.FORM_SUBMISSION_THROTTLE
+        buckets = [
+            (f'throttle:form:{slug}',
+             form_burst if form_burst is not None else defaults['form']['burst'],
+             form_refill_rate if form_refill_rate is not None else defaults['form']['refill_rate']),
+            (f'throttle:form:{slug}:client:{self.get_ident(request)}',
+             defaults['client']['burst'],
+             defaults['client']['refill_rate']),
+        ]
+
+        locked = []
+        try:
+            for key, _, _ in buckets:
+                if not self.lock(key):
+                    self.wait_seconds = self.lock_wait
+                    return False
+                locked.append(key)
+            return self.take_tokens(buckets)
+        finally:
+            cache.delete_many([f'{key}:lock' for key in locked])
+
+    def take_tokens(self, buckets):
+        """
+            takes a token from each of the (locked) buckets, or none if one of them is empty.
+        """
+        now = time.time()
+        states = []
+        for key, burst, refill_rate in buckets:
+            tokens, updated_at = cache.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * refill_rate)
+            if tokens < 1:
+                self.wait_seconds = (1 - tokens) / refill_rate if refill_rate > 0 else None
+                return False
+            states.append((key, tokens, burst, refill_rate))
+
+        for key, tokens, burst, refill_rate in states:
+            # after `burst / refill_rate` seconds the bucket is full again, so the entry can expire.
+            timeout = int(burst / refill_rate) + 1 if refill_rate > 0 else None
+            cache.set(key, (tokens - 1, now), timeout)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
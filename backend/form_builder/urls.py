@@ -1,5 +1,7 @@
 from django.urls import path
-from .views import FormListAPI, FormRUDAPI, ResponseOfAFormAPIView, DownloadAPIView
+from .views import FormListAPI, FormRUDAPI, ResponseOfAFormAPIView, DownloadAPIView, SearchAPIView, \
+    QuizScoresAPIView, CrosstabAPIView, DashboardAPIView, \
+    ResponseDraftAPIView, LiveTicketAPIView
 
 app_name = 'form_builder'
 
@@ -7,5 +9,11 @@ urlpatterns = [
     path('forms/', FormListAPI.as_view(), name="forms"),
     path('forms/<slug:slug>/', FormRUDAPI.as_view(), name="form-RUD"),
     path('responses/<slug:slug>/', ResponseOfAFormAPIView.as_view(), name='response'),
-    path('export-responses/<slug:slug>/', DownloadAPIView.as_view(), name='export')
+    path('drafts/<slug:slug>/<str:token>/', ResponseDraftAPIView.as_view(), name='draft'),
+    path('export-responses/<slug:slug>/', DownloadAPIView.as_view(), name='export'),
+    path('search/<slug:slug>/', SearchAPIView.as_view(), name='search'),
+    path('quiz-scores/<slug:slug>/', QuizScoresAPIView.as_view(), name='quiz-scores'),
+    path('crosstab/<slug:slug>/', CrosstabAPIView.as_view(), name='crosstab'),
+    path('dashboard/', DashboardAPIView.as_view(), name='dashboard'),
+    path('live-tickets/<slug:slug>/', LiveTicketAPIView.as_view(), name='live-ticket'),
 ]
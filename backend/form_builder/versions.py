@@ -0,0 +1,99 @@
+"""
+    **immutable versions of the questions of a form.**
+    Form.schema_version points to the current version of a form. whenever it changes (the form is created or updated
+    through FormRUDSerializer, or a question or choice is changed in the admin) the questions and choices are
+    published as a FormVersion: the questions payload of form_builder.readers, quiz keys included, which is never
+    changed afterwards. responses record the version they were submitted against in Response.form_version.
+    since a version never changes, it is cached without expiry under `form-version:<database>:<form id>:<version>`
+    and used to render the form, validate submissions and grade quizzes; invalidating the cached structure of a form
+    is bumping its schema_version. versions of forms created before versioning are published on first use.
+"""
+
+from django.core.cache import cache
+from django.db import router
+from django.db.models import F
+from . import readers
+from .models import Form, FormVersion
+
+# keys a reader without the quiz keys does not get, see strip_keys.
+QUESTION_KEYS = ('answer_key',)
+CHOICE_KEYS = ('is_correct',)
+
+
+def cache_key(using, form_id, version):
+    return f'form-version:{using}:{form_id}:{version}'
+
+
+def publish(form):
+    """
+        the FormVersion of the form's current schema_version, published from the question tables if there is none.
+    """
+    using = router.db_for_write(Form, instance=form)
+    version, _ = FormVersion.objects.using(using).get_or_create(
+        form_id=form.id, version=form.schema_version,
+        defaults={'questions': readers.questions_of([form.id])[form.id]})
+    return version
+
+
+def bump(form_id):
+    """
+        moves the form to a new version, which is published on first use.
+    """
+    Form.all_objects.filter(id=form_id).update(schema_version=F('schema_version') + 1)
+
+
+def questions_of_versions(forms):
+    """
+        forms: (form id, schema_version) pairs of forms on the current database.
+        returns a dict of form id -> questions of that version, with one cache lookup for all of them.
+    """
+    using = router.db_for_write(Form)
+    keys = {cache_key(using, form_id, version): (form_id, version) for form_id, version in forms}
+    found = {keys[key][0]: questions for key, questions in cache.get_many(list(keys)).items()}
+    missing = {form_id: version for form_id, version in keys.values() if form_id not in found}
+    if not missing:
+        return found
+
+    loaded = {}
+    for form_id, version, questions in FormVersion.objects.using(using).filter(
+            form_id__in=list(missing)).values_list('form_id', 'version', 'questions'):
+        if missing[form_id] == version:
+            loaded[form_id] = (version, questions)
+    for form in Form.all_objects.using(using).filter(id__in=[form_id for form_id in missing if form_id not in loaded]):
+        # the requested version was never published, the form has been bumped since: its current version is
+        # published and cached under its own number.
+        version = publish(form)
+        loaded[form.id] = (version.version, version.questions)
+
+    cache.set_many({cache_key(using, form_id, version): questions for form_id, (version, questions) in loaded.items()},
+                   None)
+    return {**found, **{form_id: questions for form_id, (_, questions) in loaded.items()}}
+
+
+def questions(form):
+    """
+        the questions of the form's current version.
+    """
+    return questions_of_versions([(form.id, form.schema_version)])[form.id]
+
+
+def strip_keys(questions):
+    """
+        the questions without the quiz answer keys, for readers other than the form's owner.
+    """
+    return [{**{key: value for key, value in question.items() if key not in QUESTION_KEYS},
+             **({'choices': [{key: value for key, value in choice.items() if key not in CHOICE_KEYS}
+                             for choice in question['choices']]} if 'choices' in question else {})}
+            for question in questions]
+
+
+def remap(questions, question_ids, choice_ids):
+    """
+        the questions of a version with the question and choice ids of another database (see move_business).
+        questions and choices deleted since the version was published are not there anymore, their id is None.
+    """
+    return [{**question, 'id': question_ids.get(question['id']),
+             **({'choices': [{**choice, 'id': choice_ids.get(choice['id']),
+                              'related_question': question_ids.get(choice['related_question'])}
+                             for choice in question['choices']]} if 'choices' in question else {})}
+            for question in questions]
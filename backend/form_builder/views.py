@@ -1,59 +1,130 @@
-import json, os, mimetypes
+from itertools import chain, islice
+from tempfile import SpooledTemporaryFile
+from django.db import router
+from django.db.models import Avg, Count, Max, Min
 from django.db.transaction import atomic
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView, GenericAPIView
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
 from rest_framework.serializers import ValidationError
 from rest_framework.response import Response as API_Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.viewsets import ReadOnlyModelViewSet
-from wsgiref.util import FileWrapper
+from config.routers import in_view_context, reads_from_replica
+from config.sharding import shard_for_business, shard_for_form, use_shard
 from .models import Form, Question, Business, Choices, Response
-from .serializers import FormSerializer, FormRUDSerializer, ResponseSerializer, DownloadSerializer
-from .permissions import IsFormOwnerOrReadonly, IsFormOwner
-from .utils import JSONConvertor
+from .serializers import FormSerializer, FormRUDSerializer, ResponseSerializer, DownloadSerializer, DraftSerializer
+from .permissions import IsFormOwnerOrReadonly, IsFormOwner, business_of, is_form_owner
+from .archive import archived_responses, archived_count
+from .conditional import ChangeToken
+from .readers import form_payload, form_payloads
+from .filters import ResponseFilter
+from . import dashboard, drafts, exporters, idempotency, live, matrix, purge, quiz, search, versions
+from .throttling import FormSubmissionThrottle
+
+_json = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def page_params(params, default_page_size=20, max_page_size=100):
+    try:
+        page = max(int(params.get('page', 1)), 1)
+        page_size = min(max(int(params.get('page_size', default_page_size)), 1), max_page_size)
+    except ValueError:
+        raise ValidationError({'error': 'page and page_size have to be integers.'})
+    return page, page_size
+
+
+def listed_response(response):
+    return {
+        "related_form": response['related_form_id'],
+        "owner_email": response['owner_email'],
+        "is_duplicate": response['is_duplicate'],
+        "all_answers": response['all_answers']
+    }
+
+
+def json_array(items, chunk_items=200):
+    """
+        the items as the chunks of a json array, for streamed responses.
+    """
+    items = iter(items)
+    separator = '['
+    while True:
+        chunk = list(islice(items, chunk_items))
+        if not chunk:
+            break
+        yield separator + ','.join(_json.encode(item) for item in chunk)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+def submitted_response(instance):
+    return {
+        "id": instance.id,
+        "related_form": instance.related_form_id,
+        "owner_email": instance.owner_email,
+        "all_answers": instance.answers
+    }
+
+
+class ShardRoutingMixin:
+    """
+        activates the database shard of the requested form (slug in the url) or of the user's business
+        for the whole request, see config.sharding.
+    """
+    _shard = None
+
+    def dispatch(self, request, *args, **kwargs):
+        # left in a finally: exceptions other than APIExceptions are raised past finalize_response.
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._shard is not None:
+                self._shard.__exit__(None, None, None)
+                self._shard = None
+
+    def initial(self, request, *args, **kwargs):
+        # the user is only authenticated here, after dispatch started.
+        if 'slug' in kwargs:
+            shard = shard_for_form(kwargs['slug'])
+        else:
+            business = business_of(request.user)
+            shard = shard_for_business(business.pk) if business is not None else None
 
+        self._shard = use_shard(shard)
+        self._shard.__enter__()
+        super().initial(request, *args, **kwargs)
 
-class FormListAPI(ListCreateAPIView):
+
+class FormListAPI(ShardRoutingMixin, ListCreateAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = FormSerializer
 
     def get_queryset(self):
         order_by = self.request.GET.get('order_by') or 'created_date'  # default: created_date
-        return Form.objects.filter(business__user=self.request.user).order_by(order_by)
+        return Form.objects.filter(business=business_of(self.request.user)).order_by(order_by)
 
     def __view_data(self, form_id):
-        form = self.get_queryset().get(id=form_id)
-        form_data = FormSerializer(form).data
-
-        for question in form_data['questions']:
-            if not question['choices']:
-                question.pop('choices')
-
-        return {"id": form.id, **form_data, "slug": form.slug, "is_closed": form.is_closed}
+        return form_payload(self.get_queryset().get(id=form_id))
 
     def list(self, request, *args, **kwargs):
-        forms = self.get_queryset()
-        form_data = FormSerializer(forms, many=True).data
-
-        for form in form_data:
-            for question in form['questions']:
-                if not question['choices']:
-                    question.pop('choices')
-            form['slug'] = forms.get(title=form['title']).slug
-            form['id'] = forms.get(slug=form['slug']).id
+        return API_Response(form_payloads(self.get_queryset()))
 
-        return API_Response(form_data)
-
-    @atomic
     def create(self, request, *args, **kwargs):
+        with atomic(using=router.db_for_write(Form)):
+            return self.__create(request)
+
+    def __create(self, request):
         serializer = FormSerializer(data=request.data)
 
         if serializer.is_valid(raise_exception=True):
             try:
-                business_id = Business.objects.get(user=request.user)
+                business = request.user.business
                 questions = serializer.validated_data.pop('questions')
-                form = Form(**serializer.validated_data, business_id=business_id)
+                form = Form(**serializer.validated_data, business=business)
                 form.save()
             except Exception as error:
                 error = list(error)[0]
@@ -74,16 +145,18 @@ class FormListAPI(ListCreateAPIView):
 
                     if choices:
                         for choice in choices:
-                            Choices.objects.create(title=choice['title'], related_question=created_question)
+                            Choices.objects.create(title=choice['title'], related_question=created_question,
+                                                   is_correct=choice.get('is_correct', False))
                 except Exception as error:
                     raise error
 
+            versions.publish(form)
             return API_Response(self.__view_data(form.id))
 
         raise ValidationError(f'form is not valid due to {serializer.errors}')
 
 
-class FormRUDAPI(RetrieveUpdateDestroyAPIView):
+class FormRUDAPI(ShardRoutingMixin, RetrieveUpdateDestroyAPIView):
     permission_classes = (IsFormOwnerOrReadonly,)
     serializer_class = FormRUDSerializer
     lookup_field = 'slug'
@@ -93,14 +166,9 @@ class FormRUDAPI(RetrieveUpdateDestroyAPIView):
 
     def __view_data(self):
         form = self.get_object()
-        form_data = FormSerializer(form).data
-
-        for question in form_data['questions']:
-            if not question['choices']:
-                question.pop('choices')
-
-        return {"id": form.id, **form_data, "slug": form.slug, "is_closed": form.is_closed}
+        return form_payload(form, with_keys=is_form_owner(self.request.user, form))
 
+    @reads_from_replica
     def retrieve(self, request, *args, **kwargs):
         return API_Response(self.__view_data())
 
@@ -111,9 +179,14 @@ class FormRUDAPI(RetrieveUpdateDestroyAPIView):
         super().patch(request, *args, **kwargs)
         return API_Response(self.__view_data())
 
+    def perform_destroy(self, instance):
+        # the rows are purged in the background, see form_builder.purge
+        purge.mark_deleted(instance)
 
-class ResponseOfAFormAPIView(GenericAPIView):
+
+class ResponseOfAFormAPIView(ShardRoutingMixin, GenericAPIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (FormSubmissionThrottle,)
     lookup_field = 'slug'
 
     def get_serializer_class(self):
@@ -122,85 +195,309 @@ class ResponseOfAFormAPIView(GenericAPIView):
     def get_queryset(self):
         return Response.objects.all()
 
+    @reads_from_replica
     def get(self, request, slug):
-        related_form = Form.objects.get(slug__exact=slug)
-        responses = self.get_queryset().filter(related_form_id=related_form.id)
-        responses_list = []
-
-        if request.user.is_authenticated and (related_form.business.user == request.user):
-            for response in responses:
-                responses_list.append({
-                    "related_form": response.related_form.id,
-                    "owner_email": response.owner_email,
-                    "all_answers": response.all_answers
-                })
-            return API_Response(responses_list)
-        return API_Response({"details": "permission denied"})
+        """
+            the form's responses (owner only), archived ones first.
+            query params: response filters (see form_builder.filters.ResponseFilter) and page, page_size.
+            without page all responses are listed, otherwise {count, page, page_size, results} is returned.
+        """
+        # deleted forms are not found either.
+        related_form = get_object_or_404(Form, slug__exact=slug)
+        if not is_form_owner(request.user, related_form):
+            return API_Response({"details": "permission denied"})
+
+        change_token = ChangeToken(related_form, sorted(request.query_params.lists()))
+        if change_token.matches(request):
+            return change_token.not_modified()
+
+        response_filter = ResponseFilter(related_form, request.query_params)
+        responses = response_filter.apply(self.get_queryset().filter(related_form_id=related_form.id))
+        # archived responses can not be filtered, so they are only listed without filters.
+        archived_total = 0 if response_filter else archived_count(related_form)
+
+        if 'page' in request.query_params:
+            page, page_size = page_params(request.query_params)
+            offset, limit = (page - 1) * page_size, page_size
+        else:
+            offset, limit = 0, None
+
+        if limit is None:
+            # all the responses are streamed, without holding them in memory.
+            live = responses.order_by('id').values('id', 'related_form_id', 'owner_email', 'is_duplicate').iterator()
+            archived = archived_responses(related_form) if archived_total else ()
+            rows = chain(archived, Response.iter_with_answers(live))
+            streamed = StreamingHttpResponse(in_view_context(json_array(map(listed_response, rows)), request),
+                                             content_type='application/json')
+            return change_token.set_headers(streamed)
+
+        rows = []
+        if offset < archived_total:
+            rows = list(islice(archived_responses(related_form, offset), limit))
+        if len(rows) < limit:
+            live_offset = max(offset - archived_total, 0)
+            live = responses.order_by('id').values('id', 'related_form_id', 'owner_email', 'is_duplicate')
+            rows += Response.iter_with_answers(live[live_offset:live_offset + limit - len(rows)])
+
+        return change_token.set_headers(API_Response({
+            'count': archived_total + responses.count(), 'page': page, 'page_size': page_size,
+            'results': [listed_response(response) for response in rows]}))
 
     def post(self, request, slug):
-        related_form = Form.objects.get(slug__exact=slug)
-        try:
-            serializer = ResponseSerializer(data={**request.data, "related_form": related_form.pk})
-            if serializer.is_valid(raise_exception=True):
-                instance = serializer.save()
-                return API_Response({
-                    "id": instance.id,
-                    "related_form": instance.related_form.id,
-                    "owner_email": instance.owner_email,
-                    "all_answers": instance.all_answers
-                })
-
-        except Exception as error:
-            raise error
-
-
-class DownloadAPIView(GenericAPIView):
+        """
+            submits a response. with an Idempotency-Key header, retries with the same key get the result of the
+            first submission (see form_builder.idempotency).
+        """
+        related_form = get_object_or_404(Form, slug__exact=slug)
+        key = request.headers.get(idempotency.HEADER)
+        if key is None:
+            return API_Response(self.__submit(request, related_form))
+
+        if not key or len(key) > idempotency.MAX_KEY_LENGTH:
+            raise ValidationError({idempotency.HEADER: f'must be 1 to {idempotency.MAX_KEY_LENGTH} characters.'})
+        record, replayed = idempotency.submit_once(related_form, key, lambda: self.__submit(request, related_form))
+        if replayed:
+            return API_Response(record.response_body, status=record.status_code,
+                                headers={'Idempotent-Replayed': 'true'})
+        return API_Response(record.response_body)
+
+    @staticmethod
+    def __submit(request, related_form):
+        serializer = ResponseSerializer(data={**request.data, "related_form": related_form.pk})
+        serializer.is_valid(raise_exception=True)
+        return submitted_response(serializer.save())
+
+
+class ResponseDraftAPIView(ShardRoutingMixin, GenericAPIView):
+    """
+        autosaved draft of a response under a token the respondent's client generated (16 to 64 letters, digits,
+        - or _), see form_builder.drafts.
+        GET: the draft. PUT: saves {all_answers, owner_email}, as often as the client likes. DELETE: discards it.
+        POST: submits the draft as a response, with the answers (e.g. files) and owner_email sent along, and
+        deletes it; answers like a submission to ResponseOfAFormAPIView.
+    """
+    permission_classes = (AllowAny,)
+    throttle_classes = (FormSubmissionThrottle,)
+    serializer_class = DraftSerializer
+
+    @staticmethod
+    def __form(slug, token):
+        if not drafts.TOKEN.match(token):
+            raise ValidationError({'token': 'has to be 16 to 64 letters, digits, - or _.'})
+        return get_object_or_404(Form, slug__exact=slug)
+
+    def get(self, request, slug, token):
+        draft = drafts.load(self.__form(slug, token), token)
+        if draft is None:
+            return API_Response({'error': 'there is no draft with this token.'}, status=404)
+        return API_Response(draft)
+
+    def put(self, request, slug, token):
+        form = self.__form(slug, token)
+        serializer = DraftSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        draft, _ = drafts.save(form, token, serializer.data.get('all_answers', []),
+                               serializer.data.get('owner_email'))
+        return API_Response(draft)
+
+    def delete(self, request, slug, token):
+        drafts.discard(self.__form(slug, token), token)
+        return API_Response(status=204)
+
+    def post(self, request, slug, token):
+        form = self.__form(slug, token)
+        answers = ResponseSerializer.AnswerSerializer(data=request.data.get('all_answers') or [], many=True)
+        answers.is_valid(raise_exception=True)
+        response = drafts.submit(form, token, answers.validated_data, request.data.get('owner_email'))
+        return API_Response(submitted_response(response))
+
+
+class DownloadAPIView(ShardRoutingMixin, GenericAPIView):
     permission_classes = (IsAuthenticated,)
     lookup_field = 'slug'
     serializer_class = DownloadSerializer
 
     def get_queryset(self):
-        return Form.objects.filter(business__user=self.request.user)
+        return Form.objects.filter(business=business_of(self.request.user))
 
+    @reads_from_replica
     def post(self, request, slug):
         try:
             form = self.get_queryset().get(slug__exact=slug)
         except Exception as err:
             return API_Response({'error': f'this user({request.user}) does not have a form with this slug({slug}).'}, status=404)
 
-        result = []
         export_to = request.data.get("format") or "excel"
+        try:
+            exporter = exporters.get_exporter(export_to, exporters.columns_of(form))
+        except KeyError:
+            raise ValidationError({'format': f'the {export_to} format is not supported. '
+                                             f'Supported formats = [{", ".join(exporters.formats())}]'})
+
+        # the export is a read, so a matching If-None-Match is answered with 304 although this is a POST.
+        change_token = ChangeToken(form, export_to, sorted(request.query_params.lists()))
+        if change_token.matches(request):
+            return change_token.not_modified()
+
+        filename = f'{form.slug}.{exporter.extension}'
+        rows = exporters.rows_of(form, ResponseFilter(form, request.query_params))
+        if exporter.concatenable:
+            # sent while it is written.
+            streamed = StreamingHttpResponse(in_view_context(exporters.chunks(exporter, rows), request),
+                                             content_type=exporter.content_type)
+            streamed['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return change_token.set_headers(streamed)
+
+        # kept in memory up to EXPORT_SPOOL_SIZE bytes, in a temporary file beyond that.
+        stream = SpooledTemporaryFile(max_size=getattr(settings, 'EXPORT_SPOOL_SIZE', 8 * 1024 * 1024))
+        exporter.write(rows, stream)
+        stream.seek(0)
+
+        file_response = FileResponse(stream, as_attachment=True, filename=filename,
+                                     content_type=exporter.content_type)
+        return change_token.set_headers(file_response)
+
+
+class SearchAPIView(ShardRoutingMixin, GenericAPIView):
+    """
+        full text search over the text answers of a form (owner only).
+        query params: q (search term, every word has to match; a trailing * matches prefixes), page, page_size.
+    """
+    permission_classes = (IsAuthenticated,)
+    lookup_field = 'slug'
 
-        for response in form.responses.values():
-            answers = Response.objects.get(id=response['id']).all_answers.values()
-            answers_dict = {answer['question']: answer['answer'] for answer in answers}
-            result.append({**response, **answers_dict})
+    def get_queryset(self):
+        return Form.objects.filter(business=business_of(self.request.user))
 
+    @reads_from_replica
+    def get(self, request, slug):
         try:
-            if export_to == "excel":
-                file_name = JSONConvertor.convert(
-                    json_input=json.dumps(result, indent=4, sort_keys=True, default=str),
-                    saving_name=f'{form.slug}.xlsx',
-                    export_to=export_to
-                )
-
-            elif export_to in ('csv', 'json', 'html'):
-                file_name = JSONConvertor.convert(
-                    json_input=json.dumps(result, indent=4, sort_keys=True, default=str),
-                    saving_name=f'{form.slug}.{export_to}',
-                    export_to=export_to
-                )
-
-            else:
-                raise ValidationError(
-                    'the <export_to> format is not supported. Supported formats = [csv, json, html, excel]')
-
-        except Exception as error:
-            return API_Response(error.args)
+            form = self.get_queryset().get(slug__exact=slug)
+        except Form.DoesNotExist:
+            return API_Response({'error': f'this user({request.user}) does not have a form with this slug({slug}).'}, status=404)
+
+        term = request.GET.get('q', '').strip()
+        if not term:
+            raise ValidationError({'q': 'a search term is required.'})
+        page, page_size = page_params(request.query_params)
+
+        count, results = search.search(router.db_for_read(Response), form.id, term, page, page_size)
+        return API_Response({'count': count, 'page': page, 'page_size': page_size, 'results': results})
 
+
+class QuizScoresAPIView(ShardRoutingMixin, GenericAPIView):
+    """
+        score distribution of the graded responses of a quiz form (owner only): count, mean, min, max, the maximum
+        reachable score and the number of responses per score.
+    """
+    permission_classes = (IsAuthenticated,)
+    lookup_field = 'slug'
+
+    def get_queryset(self):
+        return Form.objects.filter(business=business_of(self.request.user))
+
+    @reads_from_replica
+    def get(self, request, slug):
+        try:
+            form = self.get_queryset().get(slug__exact=slug)
+        except Form.DoesNotExist:
+            return API_Response({'error': f'this user({request.user}) does not have a form with this slug({slug}).'}, status=404)
+        if not quiz.is_quiz(form):
+            raise ValidationError({'error': f'the form({slug}) is not a quiz.'})
+
+        scores = Response.objects.filter(related_form_id=form.id, score__isnull=False)
+        summary = scores.aggregate(count=Count('id'), mean=Avg('score'), min=Min('score'), max=Max('score'))
+        histogram = scores.order_by('score').values('score').annotate(count=Count('id'))
+        return API_Response({**summary, 'max_score': quiz.max_score(quiz.answer_key(form)),
+                             'histogram': [{'score': row['score'], 'count': row['count']} for row in histogram]})
+
+
+class CrosstabAPIView(ShardRoutingMixin, GenericAPIView):
+    """
+        cross tabulation of the live responses of a form (owner only), computed from its response matrix
+        (see form_builder.matrix).
+        query params: rows (id of a multiple choice question), columns (optional, id of another multiple choice
+        question) and values (optional, id of a number question).
+        returns the number of responses per choice of rows (x choice of columns) as table, or with values the
+        count, mean, std, min and max of the numbers per group as stats. the first label of rows and columns
+        ({"id": null, "title": null}) stands for "not answered".
+    """
+    permission_classes = (IsAuthenticated,)
+    lookup_field = 'slug'
+
+    def get_queryset(self):
+        return Form.objects.filter(business=business_of(self.request.user))
+
+    @staticmethod
+    def __question(params, param, is_valid):
+        if param not in params:
+            return None
+        try:
+            question_id = int(params[param])
+        except ValueError:
+            raise ValidationError({param: 'has to be a question id.'})
+        if not is_valid(question_id):
+            raise ValidationError({param: f'question {question_id} can not be used as {param}.'})
+        return question_id
+
+    @staticmethod
+    def __labels(response_matrix, question_id, titles):
+        return {'question': question_id, 'labels': [{'id': None, 'title': None}] + [
+            {'id': choice_id, 'title': titles.get(choice_id)} for choice_id in response_matrix.choices[question_id]]}
+
+    @reads_from_replica
+    def get(self, request, slug):
+        try:
+            form = self.get_queryset().get(slug__exact=slug)
+        except Form.DoesNotExist:
+            return API_Response({'error': f'this user({request.user}) does not have a form with this slug({slug}).'}, status=404)
+        if 'rows' not in request.query_params:
+            raise ValidationError({'rows': 'a multiple choice question id is required.'})
+
+        response_matrix = matrix.load(form)
+        rows = self.__question(request.query_params, 'rows', response_matrix.is_categorical)
+        columns = self.__question(request.query_params, 'columns', response_matrix.is_categorical)
+        values = self.__question(request.query_params, 'values', response_matrix.is_numeric)
+
+        titles = dict(Choices.objects.filter(related_question_id__in=[rows, columns]).values_list('id', 'title'))
+        result = {'count': response_matrix.count, 'rows': self.__labels(response_matrix, rows, titles)}
+        if columns is not None:
+            result['columns'] = self.__labels(response_matrix, columns, titles)
+        if values is None:
+            result['table'] = matrix.as_list(response_matrix.counts(rows, columns))
         else:
-            file_handle = open(file_name, 'rb')
-            mimetype, _ = mimetypes.guess_type(file_name)
-            file_response = HttpResponse(FileWrapper(file_handle), content_type=mimetype)
-            file_response['Content-Disposition'] = u'attachment; filename="%s"' % file_name
-            return file_response
+            result['values'] = {'question': values}
+            result['stats'] = {name: matrix.as_list(table) for name, table in
+                               response_matrix.stats(values, rows, columns).items()}
+        return API_Response(result)
+
+
+class LiveTicketAPIView(ShardRoutingMixin, GenericAPIView):
+    """
+        a short-lived ticket for the live feed of a form (owner only), for clients that can not send the
+        Authorization header (EventSource): GET /form_builder/live/<slug>/?ticket=<ticket>, see form_builder.live
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Form.objects.filter(business=business_of(self.request.user))
+
+    def post(self, request, slug):
+        form = get_object_or_404(self.get_queryset(), slug__exact=slug)
+        return API_Response({'ticket': live.issue_ticket(request.user, form), 'expires_in': live.ticket_max_age()})
+
+
+class DashboardAPIView(ShardRoutingMixin, GenericAPIView):
+    """
+        the stats of all forms of the user's business: responses (live and archived), last response date and
+        open/closed state per form, and their totals. cached for DASHBOARD_CACHE_TTL seconds, see
+        form_builder.dashboard
+    """
+    permission_classes = (IsAuthenticated,)
+
+    @reads_from_replica
+    def get(self, request):
+        business = business_of(request.user)
+        if business is None:
+            return API_Response({'error': f'this user({request.user}) does not have a business.'}, status=404)
+        return API_Response(dashboard.dashboard_of(business))